@@ -9,6 +9,9 @@ from .base import (
     GoogleConfig,
     SecurityConfig,
     ApiConfig,
+    SpoolConfig,
+    TranscriptConfig,
+    GreetingConfig,
 )
 from .constants import (
     SESSION_TYPE_CALL,
@@ -22,7 +25,52 @@ from .constants import (
     SESSION_STATE_SAVING,
     SESSION_STATE_SAVED,
     SESSION_STATE_FAILED,
+    SESSION_SAVED_MESSAGE,
+    SESSION_STATE_TOPIC,
     TIME_CHECK_INTERVAL_SECONDS,
+    QUOTA_POLL_BASELINE_SECONDS,
+    TIME_WARNING_SECONDS_BEFORE_DEADLINE,
+    SPOOL_FLUSH_BATCH_SIZE,
+    SPOOL_FLUSH_INTERVAL_SECONDS,
+    SPOOL_MAX_ATTEMPTS,
+    SPOOL_RETRY_MAX_SECONDS,
+    SPOOL_SAVE_WAIT_SECONDS,
+    OUTBOX_CHANGED_CHANNEL,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_POLL_SECONDS,
+    OUTBOX_OWNER_GRACE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    PROFILE_CACHE_MAX_ENTRIES,
+    PROFILE_CACHE_TTL_SECONDS,
+    ONBOARDING_CHANGED_CHANNEL,
+    SUBSCRIPTION_CACHE_MAX_ENTRIES,
+    SUBSCRIPTION_CACHE_TTL_SECONDS,
+    SUBSCRIPTION_CHANGED_CHANNEL,
+    PLAN_CACHE_TTL_SECONDS,
+    SUBSCRIPTION_PLANS_CHANGED_CHANNEL,
+    GREETING_POOL_SIZE,
+    GREETING_FRESH_SECONDS,
+    GREETING_MAX_AGE_SECONDS,
+    GREETING_MAX_KEYS,
+    GREETING_RELOAD_SECONDS,
+    FIRST_LINE_BUDGET_SECONDS,
+    FIRST_LINE_HEDGE_DEFAULT_SECONDS,
+    FIRST_LINE_HEDGE_MIN_SAMPLES,
+    FIRST_LINE_LATENCY_WINDOW,
+    SESSION_EVENT_QUEUE_MAX,
+    SESSION_EVENT_MAX_ATTEMPTS,
+    SESSION_EVENT_RETRY_BASE_SECONDS,
+    SESSION_EVENT_RETRY_MAX_SECONDS,
+    SESSION_EVENT_BREAKER_THRESHOLD,
+    SESSION_EVENT_BREAKER_RESET_SECONDS,
+    SESSION_EVENT_DRAIN_SECONDS,
+    EVENT_CHANNEL_ACK_TIMEOUT_SECONDS,
+    EVENT_CHANNEL_MAX_BACKOFF_SECONDS,
+    EVENT_CHANNEL_MAX_FRAME_BYTES,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY_SECONDS,
     SPEAKING_COMPLETION_THRESHOLD_SECONDS,
     PLAN_TYPE_PRO,
     PLAN_TYPE_BASIC,
@@ -41,6 +89,9 @@ __all__ = [
     "GoogleConfig",
     "SecurityConfig",
     "ApiConfig",
+    "SpoolConfig",
+    "TranscriptConfig",
+    "GreetingConfig",
     # Constants
     "SESSION_TYPE_CALL",
     "SESSION_TYPE_PRACTICE",
@@ -53,7 +104,52 @@ __all__ = [
     "SESSION_STATE_SAVING",
     "SESSION_STATE_SAVED",
     "SESSION_STATE_FAILED",
+    "SESSION_SAVED_MESSAGE",
+    "SESSION_STATE_TOPIC",
     "TIME_CHECK_INTERVAL_SECONDS",
+    "QUOTA_POLL_BASELINE_SECONDS",
+    "TIME_WARNING_SECONDS_BEFORE_DEADLINE",
+    "SPOOL_FLUSH_BATCH_SIZE",
+    "SPOOL_FLUSH_INTERVAL_SECONDS",
+    "SPOOL_MAX_ATTEMPTS",
+    "SPOOL_RETRY_MAX_SECONDS",
+    "SPOOL_SAVE_WAIT_SECONDS",
+    "OUTBOX_CHANGED_CHANNEL",
+    "OUTBOX_BATCH_SIZE",
+    "OUTBOX_LEASE_SECONDS",
+    "OUTBOX_POLL_SECONDS",
+    "OUTBOX_OWNER_GRACE_SECONDS",
+    "OUTBOX_MAX_ATTEMPTS",
+    "PROFILE_CACHE_MAX_ENTRIES",
+    "PROFILE_CACHE_TTL_SECONDS",
+    "ONBOARDING_CHANGED_CHANNEL",
+    "SUBSCRIPTION_CACHE_MAX_ENTRIES",
+    "SUBSCRIPTION_CACHE_TTL_SECONDS",
+    "SUBSCRIPTION_CHANGED_CHANNEL",
+    "PLAN_CACHE_TTL_SECONDS",
+    "SUBSCRIPTION_PLANS_CHANGED_CHANNEL",
+    "GREETING_POOL_SIZE",
+    "GREETING_FRESH_SECONDS",
+    "GREETING_MAX_AGE_SECONDS",
+    "GREETING_MAX_KEYS",
+    "GREETING_RELOAD_SECONDS",
+    "FIRST_LINE_BUDGET_SECONDS",
+    "FIRST_LINE_HEDGE_DEFAULT_SECONDS",
+    "FIRST_LINE_HEDGE_MIN_SAMPLES",
+    "FIRST_LINE_LATENCY_WINDOW",
+    "SESSION_EVENT_QUEUE_MAX",
+    "SESSION_EVENT_MAX_ATTEMPTS",
+    "SESSION_EVENT_RETRY_BASE_SECONDS",
+    "SESSION_EVENT_RETRY_MAX_SECONDS",
+    "SESSION_EVENT_BREAKER_THRESHOLD",
+    "SESSION_EVENT_BREAKER_RESET_SECONDS",
+    "SESSION_EVENT_DRAIN_SECONDS",
+    "EVENT_CHANNEL_ACK_TIMEOUT_SECONDS",
+    "EVENT_CHANNEL_MAX_BACKOFF_SECONDS",
+    "EVENT_CHANNEL_MAX_FRAME_BYTES",
+    "HTTP_MAX_CONNECTIONS_PER_HOST",
+    "HTTP_MAX_KEEPALIVE_CONNECTIONS",
+    "HTTP_KEEPALIVE_EXPIRY_SECONDS",
     "SPEAKING_COMPLETION_THRESHOLD_SECONDS",
     "PLAN_TYPE_PRO",
     "PLAN_TYPE_BASIC",
@@ -7,6 +7,8 @@ import os
 from dataclasses import dataclass
 from typing import Optional
 
+from .constants import FIRST_LINE_BUDGET_SECONDS
+
 
 @dataclass
 class DatabaseConfig:
@@ -102,12 +104,70 @@ class ApiConfig:
     """External API configuration."""
     
     node_api_url: str
+    http2_enabled: bool = False
+    event_socket: str = ""
+    event_secret: str = ""
+    room_events_enabled: bool = False
     
     @classmethod
     def from_env(cls) -> 'ApiConfig':
         """Load API configuration from environment."""
         return cls(
             node_api_url=os.getenv("API_URL", "http://localhost:8082"),
+            http2_enabled=os.getenv("HTTP2_ENABLED", "false").lower() == "true",
+            event_socket=os.getenv("AGENT_EVENT_SOCKET", ""),
+            event_secret=os.getenv("AGENT_EVENT_SECRET", ""),
+            room_events_enabled=os.getenv("SESSION_STATE_VIA_ROOM", "false").lower() == "true",
+        )
+
+
+@dataclass
+class SpoolConfig:
+    """Local write-behind spool configuration."""
+    
+    transcript_dir: str
+    
+    @classmethod
+    def from_env(cls) -> 'SpoolConfig':
+        """Load spool configuration from environment."""
+        return cls(
+            transcript_dir=os.getenv("TRANSCRIPT_SPOOL_DIR", "./spool/transcripts"),
+        )
+
+
+@dataclass
+class TranscriptConfig:
+    """Transcript storage configuration."""
+    
+    archive_enabled: bool = False
+    
+    @classmethod
+    def from_env(cls) -> 'TranscriptConfig':
+        """Load transcript storage configuration from environment."""
+        return cls(
+            archive_enabled=os.getenv("TRANSCRIPT_ARCHIVE", "false").lower() == "true",
+        )
+
+
+@dataclass
+class GreetingConfig:
+    """First-line greeting configuration (cache, latency budget, hedging)."""
+    
+    cache_enabled: bool = True
+    cache_path: str = "./cache/greetings.json"
+    budget_seconds: float = FIRST_LINE_BUDGET_SECONDS
+    hedge_enabled: bool = True
+    
+    @classmethod
+    def from_env(cls) -> 'GreetingConfig':
+        """Load greeting configuration from environment."""
+        return cls(
+            cache_enabled=os.getenv("GREETING_CACHE", "true").lower() == "true",
+            cache_path=os.getenv("GREETING_CACHE_PATH", "./cache/greetings.json"),
+            budget_seconds=int(
+                os.getenv("FIRST_LINE_BUDGET_MS", str(int(FIRST_LINE_BUDGET_SECONDS * 1000)))
+            ) / 1000,
+            hedge_enabled=os.getenv("FIRST_LINE_HEDGE", "true").lower() == "true",
         )
 
 
@@ -119,6 +179,9 @@ class Config:
     google: GoogleConfig
     security: SecurityConfig
     api: ApiConfig
+    spool: SpoolConfig
+    transcript: TranscriptConfig
+    greeting: GreetingConfig
     
     @classmethod
     def from_env(cls) -> 'Config':
@@ -128,4 +191,7 @@ class Config:
             google=GoogleConfig.from_env(),
             security=SecurityConfig.from_env(),
             api=ApiConfig.from_env(),
+            spool=SpoolConfig.from_env(),
+            transcript=TranscriptConfig.from_env(),
+            greeting=GreetingConfig.from_env(),
         )
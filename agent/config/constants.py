@@ -23,9 +23,76 @@ ROLEPLAY_PRO_CAP_SECONDS = 10 * 60    # 10 minutes per day for Pro plan (separat
 SESSION_STATE_SAVING = "SAVING_CONVERSATION"
 SESSION_STATE_SAVED = "SESSION_SAVED"
 SESSION_STATE_FAILED = "SESSION_SAVE_FAILED"
+SESSION_SAVED_MESSAGE = "Conversation saved successfully!"
+SESSION_STATE_TOPIC = "session_state"  # LiveKit data topic (same payload as the Socket.IO event)
 
 # Time Check Interval
-TIME_CHECK_INTERVAL_SECONDS = 10  # Check remaining time every 10 seconds
+TIME_CHECK_INTERVAL_SECONDS = 10  # Retry delay after a failed time check
+QUOTA_POLL_BASELINE_SECONDS = 10  # Interval of the per-session quota poll the ledgers replaced (for reads_avoided)
+
+# Pre-deadline warnings (seconds before the session's time runs out)
+TIME_WARNING_SECONDS_BEFORE_DEADLINE = (30,)
+
+# Transcript Spool (write-behind saves)
+SPOOL_FLUSH_BATCH_SIZE = 50           # Records written per batch save
+SPOOL_FLUSH_INTERVAL_SECONDS = 5      # Idle delay between flusher passes
+SPOOL_RETRY_MAX_SECONDS = 5 * 60      # Cap on the retry backoff while Postgres is failing
+SPOOL_SAVE_WAIT_SECONDS = 10          # How long the session waits for its own record to land
+SPOOL_MAX_ATTEMPTS = 20               # Failed saves before a record is moved to the segment's .dead file
+
+# Session state outbox (events committed with transcript saves)
+OUTBOX_CHANGED_CHANNEL = "agent_outbox"  # NOTIFY on insert (migration 061)
+OUTBOX_BATCH_SIZE = 100               # Events claimed per relay pass
+OUTBOX_LEASE_SECONDS = 30             # Claimed events not delivered by then are claimed again
+OUTBOX_POLL_SECONDS = 10              # Relay pass interval when no NOTIFY arrives
+OUTBOX_OWNER_GRACE_SECONDS = 5        # New events are left to the saving process (after its SAVING) this long
+OUTBOX_MAX_ATTEMPTS = 3               # Claims per event before it is abandoned (each claim retries in the dispatcher)
+
+# Read caches (per process, invalidated via Postgres LISTEN/NOTIFY)
+PROFILE_CACHE_MAX_ENTRIES = 2000
+PROFILE_CACHE_TTL_SECONDS = 30 * 60
+ONBOARDING_CHANGED_CHANNEL = "onboarding_data_changed"
+SUBSCRIPTION_CACHE_MAX_ENTRIES = 5000
+SUBSCRIPTION_CACHE_TTL_SECONDS = 10 * 60  # Upper bound; entries also expire at the subscription's end_date
+SUBSCRIPTION_CHANGED_CHANNEL = "subscription_changed"
+PLAN_CACHE_TTL_SECONDS = 60 * 60
+SUBSCRIPTION_PLANS_CHANGED_CHANNEL = "subscription_plans_changed"
+
+# Greeting cache (pre-generated first lines per session type and topic)
+GREETING_POOL_SIZE = 5                   # Variants kept per key, served in rotation
+GREETING_FRESH_SECONDS = 6 * 60 * 60     # Older variants are still served but get replaced in the background
+GREETING_MAX_AGE_SECONDS = 7 * 24 * 60 * 60  # Variants older than this are never served
+GREETING_MAX_KEYS = 500                  # Pools kept; the least recently used are dropped
+GREETING_RELOAD_SECONDS = 30             # How often a process looks for variants other processes persisted
+
+# First line latency budget (template fallback) and hedged requests.
+# Every hedge is a second billed LLM request; it only pays off when it can still
+# answer before the budget. With the p90 as delay about 1 in 10 first lines costs
+# two requests; before enough latencies are known the delay equals the budget,
+# so nothing is hedged blindly. FIRST_LINE_HEDGE=false turns hedging off.
+FIRST_LINE_BUDGET_SECONDS = 0.8          # Default budget for the LLM first line
+FIRST_LINE_HEDGE_DEFAULT_SECONDS = FIRST_LINE_BUDGET_SECONDS  # Hedge delay until enough latencies are observed (no hedge)
+FIRST_LINE_HEDGE_MIN_SAMPLES = 10        # Latencies needed before the p90 is used as hedge delay
+FIRST_LINE_LATENCY_WINDOW = 100          # Recent latencies kept per process
+
+# Session state event dispatcher (events to Node, delivered in the background)
+SESSION_EVENT_QUEUE_MAX = 1000               # Queued events across users before the oldest is dropped
+SESSION_EVENT_MAX_ATTEMPTS = 6               # Delivery attempts per event
+SESSION_EVENT_RETRY_BASE_SECONDS = 0.5       # First retry delay (doubles per attempt, full jitter)
+SESSION_EVENT_RETRY_MAX_SECONDS = 15         # Cap on the retry delay
+SESSION_EVENT_BREAKER_THRESHOLD = 5          # Consecutive failures that open the circuit breaker
+SESSION_EVENT_BREAKER_RESET_SECONDS = 30     # Open time before a probe is let through
+SESSION_EVENT_DRAIN_SECONDS = 5              # Bounded wait for queued events at job shutdown
+
+# Persistent session event channel to Node (AGENT_EVENT_SOCKET)
+EVENT_CHANNEL_ACK_TIMEOUT_SECONDS = 2        # Unacked frames past this fall back to HTTP
+EVENT_CHANNEL_MAX_BACKOFF_SECONDS = 30       # Cap on the reconnect delay
+EVENT_CHANNEL_MAX_FRAME_BYTES = 64 * 1024    # Longest ack line accepted
+
+# Shared HTTP clients (per origin: Gemini REST, Node API)
+HTTP_MAX_CONNECTIONS_PER_HOST = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 60
 
 # Course Progress Threshold
 SPEAKING_COMPLETION_THRESHOLD_SECONDS = 5 * 60  # 5 minutes required for daily completion
@@ -0,0 +1,231 @@
+"""
+Session bootstrap helpers for the Talktivity voice assistant.
+Stage timings, the admission signal and the speculative greeting used by the
+concurrent bootstrap in the entrypoint.
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+from config import Config
+from services import get_logger
+from .first_line import generate_first_line, first_line_within_budget, template_first_line
+from .greeting_cache import get_greeting_cache
+
+logger = get_logger(__name__)
+
+
+class AdmissionDenied(Exception):
+    """Raised inside the bootstrap task group to cancel speculative work when a session is refused."""
+
+
+class StageTimings:
+    """
+    Records when each stage (of the bootstrap, of a transcript save) started
+    and finished, relative to a common origin, so overlapping stages stay
+    readable.
+    """
+
+    def __init__(self):
+        """Initialize timings; offsets are measured from now."""
+        self._origin = time.perf_counter()
+        self.stages: Dict[str, Tuple[float, Optional[float]]] = {}
+
+    def _offset(self) -> float:
+        return time.perf_counter() - self._origin
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a block (sync or containing awaits) as a named stage.
+
+        A stage cancelled or failed half way is still recorded up to that point.
+        """
+        started = self._offset()
+        self.stages[name] = (started, None)
+        try:
+            yield
+        finally:
+            self.stages[name] = (started, self._offset())
+
+    def hidden_ms(self, name: str, before: str) -> Tuple[float, float]:
+        """
+        Measure how much of a stage ran before another stage finished.
+
+        Returns:
+            (hidden_ms, total_ms) of stage `name`; zeros if either stage is unfinished
+        """
+        stage, other = self.stages.get(name), self.stages.get(before)
+        if not stage or not other or stage[1] is None or other[1] is None:
+            return 0.0, 0.0
+        started, ended = stage
+        hidden = max(min(ended, other[1]) - started, 0.0)
+        return hidden * 1000, (ended - started) * 1000
+
+    def mark(self, name: str) -> None:
+        """Record a point in time (e.g. the greeting being queued)."""
+        offset = self._offset()
+        self.stages[name] = (offset, offset)
+
+    def summary(self) -> str:
+        """Format stages as 'name=start→end' offsets in milliseconds, in start order."""
+        parts = []
+        for name, (started, ended) in sorted(self.stages.items(), key=lambda item: item[1][0]):
+            end = f"{ended * 1000:.0f}" if ended is not None else "?"
+            if ended == started:
+                parts.append(f"{name}@{started * 1000:.0f}ms")
+            else:
+                parts.append(f"{name}={started * 1000:.0f}→{end}ms")
+        return " ".join(parts)
+
+
+async def prepare_first_line(
+    config: Config,
+    session_type: str,
+    prompt: "asyncio.Future[str]",
+    timings: StageTimings,
+    topic_prompt: str = "",
+    topic: str = "",
+) -> Optional[str]:
+    """
+    Get the greeting from the greeting cache, or generate it once the
+    (profile-enriched) prompt is available.
+
+    Generation is bounded by the greeting budget, including the wait for the
+    profile: past it, a templated line for the session type and topic is used.
+
+    Args:
+        config: Application configuration
+        session_type: "call" | "practice" | "roleplay"
+        prompt: Task giving the enriched custom prompt (never cancelled here)
+        timings: Bootstrap timings to record the first_line stage in
+        topic_prompt: Prompt from the session metadata, used as the cache key
+        topic: Topic title from the session metadata, used by the template
+
+    Returns:
+        The first line, or None if it could not be produced
+    """
+    cache = get_greeting_cache(config)
+    if cache is not None:
+        with timings.stage("first_line"):
+            # Pool variants are generated from the topic prompt alone, never the profile
+            cached = cache.get(
+                session_type,
+                topic_prompt,
+                lambda: generate_first_line(
+                    api_key=config.google.api_key,
+                    session_type=session_type,
+                    custom_prompt=topic_prompt,
+                ),
+            )
+        if cached:
+            logger.info("Using cached greeting for %s session", session_type)
+            return cached
+
+    budget = config.greeting.budget_seconds
+    started = time.perf_counter()
+    try:
+        with timings.stage("first_line"):
+            try:
+                # The profile task is shared with the session; only stop waiting for it
+                custom_prompt = await asyncio.wait_for(asyncio.shield(prompt), budget)
+            except asyncio.TimeoutError:
+                logger.info("Profile not ready within the greeting budget, using the topic prompt")
+                custom_prompt = topic_prompt
+
+            first_line, source = await first_line_within_budget(
+                api_key=config.google.api_key,
+                session_type=session_type,
+                custom_prompt=custom_prompt,
+                topic=topic,
+                budget_seconds=max(budget - (time.perf_counter() - started), 0.0),
+                hedge=config.greeting.hedge_enabled,
+            )
+        timings.mark(f"first_line_{source}")
+        return first_line
+    except Exception as e:
+        # A missing greeting must not tear down the bootstrap
+        logger.warning("Could not generate initial greeting: %s", e)
+        return template_first_line(session_type, topic)
+
+
+class SpeculativeGreeting:
+    """
+    Profile enrichment and first-line generation started from room/dispatch
+    metadata, before the participant joins.
+
+    The work is only used if the participant's own metadata describes the same
+    session; otherwise (or if admission fails) it is cancelled.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        session_type: str,
+        custom_prompt: str,
+        profile_task: "asyncio.Task[str]",
+        first_line_task: "asyncio.Task[Optional[str]]",
+    ):
+        self.user_id = user_id
+        self.session_type = session_type
+        self.custom_prompt = custom_prompt
+        self.profile_task = profile_task
+        self.first_line_task = first_line_task
+
+    @classmethod
+    def start(
+        cls,
+        session_manager,
+        config: Config,
+        user_id: Optional[int],
+        session_type: str,
+        custom_prompt: str,
+        topic: str,
+        timings: StageTimings,
+    ) -> Optional["SpeculativeGreeting"]:
+        """
+        Start the speculative work, if the metadata identifies a user.
+
+        Args:
+            session_manager: SessionManager of this job
+            config: Application configuration
+            user_id: User ID from room/dispatch metadata (None if absent)
+            session_type: Session type from the same metadata
+            custom_prompt: Prompt from the same metadata
+            topic: Topic title from the same metadata
+            timings: Bootstrap timings
+
+        Returns:
+            SpeculativeGreeting, or None when there is nothing to speculate on
+        """
+        if user_id is None:
+            return None
+
+        async def load_profile() -> str:
+            with timings.stage("profile"):
+                return await session_manager.enrich_with_profile(user_id, custom_prompt)
+
+        profile_task = asyncio.create_task(load_profile())
+        first_line_task = asyncio.create_task(
+            prepare_first_line(config, session_type, profile_task, timings, custom_prompt, topic)
+        )
+        logger.info(
+            "Preparing greeting for user %s (%s) before the participant joins",
+            user_id, session_type,
+        )
+        return cls(user_id, session_type, custom_prompt, profile_task, first_line_task)
+
+    def matches(self, user_id: Optional[int], session_type: str, custom_prompt: str) -> bool:
+        """Check whether the participant's metadata describes the speculated session."""
+        return (
+            self.user_id == user_id
+            and self.session_type == session_type
+            and self.custom_prompt == custom_prompt
+        )
+
+    def cancel(self) -> None:
+        """Cancel whatever is still running."""
+        self.first_line_task.cancel()
+        self.profile_task.cancel()
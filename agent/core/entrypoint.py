@@ -6,6 +6,7 @@ Orchestrates session lifecycle using modular handlers and services.
 import asyncio
 import logging
 from datetime import datetime
+from typing import Optional
 
 from livekit.agents import (
     AgentSession,
@@ -19,12 +20,29 @@ from livekit.plugins import silero
 
 from agent import EmotiveAgent
 from config import Config, load_environment
-from database import DatabasePool, test_connection
-from services import setup_logging, get_logger, emit_session_save_failed
+from database import DatabasePool, test_connection, watch_cache_invalidations
+from services import (
+    setup_logging,
+    get_logger,
+    dispatch_session_save_failed,
+    session_events,
+    get_session_event_channel,
+    register_room,
+    get_transcript_spool_flusher,
+    get_outbox_relay,
+    quota_ledgers,
+    http_clients,
+)
 from utils.timezone import get_utc_now
 from .session_manager import SessionManager
 from .handlers import LLMErrorHandler, TimeCheckHandler, TranscriptSaveHandler
-from .first_line import generate_first_line
+from .bootstrap import (
+    AdmissionDenied,
+    StageTimings,
+    SpeculativeGreeting,
+    prepare_first_line,
+)
+from .greeting_cache import get_greeting_cache
 # Load environment variables first
 load_environment()
 
@@ -54,6 +72,14 @@ def prewarm(proc: JobProcess):
     # Initialize database pool
     db_pool = DatabasePool(config.database)
     logger.info("Database pool initialized")
+
+    # Shared keep-alive HTTP clients (Gemini REST, Node session-state events)
+    http_clients.configure(http2=config.api.http2_enabled)
+
+    # Read persisted greetings now, off any session's event loop
+    greeting_cache = get_greeting_cache(config)
+    if greeting_cache is not None:
+        greeting_cache.load()
     
     # Load VAD model
     proc.userdata["vad"] = silero.VAD.load()
@@ -70,18 +96,63 @@ async def entrypoint(ctx: JobContext):
     """
     global config, db_pool
     
+    # Drain transcript saves spooled by earlier (possibly crashed) runs
+    get_transcript_spool_flusher(db_pool, config).start()
+
+    # Keep the per-process read caches coherent with Node's writes
+    listener = watch_cache_invalidations(db_pool)
+    quota_ledgers.watch(listener)
+
+    # Deliver SESSION_SAVED events committed with transcript saves (any process's)
+    outbox_relay = get_outbox_relay(db_pool, config)
+    outbox_relay.watch(listener)
+    outbox_relay.start()
+
+    # Stream session state events over the persistent channel to Node, if configured
+    if config.api.event_socket:
+        session_events.use_channel(
+            get_session_event_channel(config.api.event_socket, config.api.event_secret)
+        )
+
+    # Stage offsets are measured from the start of the job
+    timings = StageTimings()
+
     logger.info("Connecting to room %s", ctx.room.name)
-    await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    with timings.stage("connect"):
+        await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+
+    # Initialize session manager
+    session_manager = SessionManager(config, db_pool)
+
+    # Registered before any bootstrap work can open shared HTTP clients, so every
+    # exit path (refused, no user, admitted) releases them. Shutdown callbacks run
+    # concurrently, so this one awaits the transcript save (idempotent) itself
+    # before delivering its events and closing the pooled connections.
+    transcript_handler: Optional[TranscriptSaveHandler] = None
+
+    async def release_session_resources() -> None:
+        if transcript_handler is not None:
+            await transcript_handler.save_transcript()
+        await session_events.drain()
+        await http_clients.aclose()
+
+    ctx.add_shutdown_callback(release_session_resources)
+
+    # Start on the greeting from room/dispatch metadata while the participant is joining
+    room_user_id, room_prompt, _, room_session_type, room_topic = (
+        session_manager.extract_room_metadata(ctx)
+    )
+    speculative = SpeculativeGreeting.start(
+        session_manager, config, room_user_id, room_session_type, room_prompt, room_topic, timings
+    )
 
     # Wait for a participant to join the room
     participant = await ctx.wait_for_participant()
+    timings.mark("participant_joined")
     logger.info("Starting voice assistant for participant %s", participant.identity)
 
-    # Initialize session manager
-    session_manager = SessionManager(config, db_pool)
-
     # Extract and validate metadata
-    user_id, custom_prompt, first_prompt, session_type, room_name = (
+    user_id, custom_prompt, first_prompt, session_type, room_name, topic = (
         await session_manager.extract_metadata(participant)
     )
 
@@ -92,20 +163,8 @@ async def entrypoint(ctx: JobContext):
     # Require authenticated user for all sessions
     if user_id is None:
         logger.warning("No user_id found in metadata, cannot start session")
-        return
-
-    # Enrich prompt with user profile
-    custom_prompt = await session_manager.enrich_with_profile(user_id, custom_prompt)
-
-    # Check time limits
-    can_start = await session_manager.check_time_limit(user_id, session_type)
-    if not can_start:
-        await emit_session_save_failed(
-            user_id=user_id,
-            api_url=config.api.node_api_url,
-            call_id=room_name,
-            error_message="Time limit reached for this session type. Please upgrade your plan for more time.",
-        )
+        if speculative is not None:
+            speculative.cancel()
         return
 
     # Validate Google API key
@@ -114,55 +173,141 @@ async def entrypoint(ctx: JobContext):
             "GOOGLE_API_KEY not set. Please add it to your .env file or set it as an environment variable."
         )
 
-    # Create session and LLM instance
-    session, llm_instance = session_manager.create_session(ctx, config.google.api_key)
+    # Bootstrap graph (stages only wait on what they need):
+    #   profile ──┬──> first line (speculative) ────────────┐
+    #             └──┐                                      v
+    #   admission ───┴──> session.start ──> greeting (session.say)
+    #   STT/TTS/LLM clients ──┘
+    # Profile and first line may already be running from room metadata.
+    # Admission failing cancels everything still in flight, including the first line.
+    async def load_profile() -> str:
+        with timings.stage("profile"):
+            return await session_manager.enrich_with_profile(user_id, custom_prompt)
 
-    # Prepare session info for handlers
-    session_start_time = get_utc_now()
-    session_info = session_manager.get_session_info(
-        user_id, session_type, room_name, session_start_time
-    )
-    
-    # For call sessions, store call_start_time in memory (NO database insert)
-    if session_type == "call":
-        session_info["call_start_time"] = session_start_time
-        logger.info(
-            "Call session started for user %s at %s (stored in memory, no DB insert)",
-            user_id,
-            session_start_time.isoformat()
-        )
+    async def admit() -> None:
+        with timings.stage("admission"):
+            can_start = await session_manager.check_time_limit(user_id, session_type)
+        if not can_start:
+            raise AdmissionDenied(f"time limit reached for {session_type}")
 
-    # Setup LLM error handler
-    llm_error_handler = LLMErrorHandler(session, ctx, config, session_info)
-    # Wrap async handler in synchronous callback using asyncio.create_task
-    llm_instance.on("error", lambda err: asyncio.create_task(llm_error_handler.handle_error(err)))
+    try:
+        async with asyncio.TaskGroup() as tg:
+            admission_task = tg.create_task(admit())
+            if speculative is not None and speculative.matches(user_id, session_type, custom_prompt):
+                profile_task = speculative.profile_task
+                first_line_task = speculative.first_line_task
+            else:
+                if speculative is not None:
+                    logger.info(
+                        "Participant metadata differs from room metadata, discarding prepared greeting"
+                    )
+                    speculative.cancel()
+                    speculative = None
+                profile_task = tg.create_task(load_profile())
+                first_line_task = tg.create_task(
+                    prepare_first_line(
+                        config, session_type, profile_task, timings, custom_prompt, topic
+                    )
+                )
 
-    # Setup transcript save handler
-    transcript_handler = TranscriptSaveHandler(
-        session, ctx, db_pool, config, session_info, participant
-    )
-    # Register as a shutdown callback (safety net)
-    ctx.add_shutdown_callback(transcript_handler.save_transcript)
+            # Let the tasks send their requests before building the clients on this loop
+            await asyncio.sleep(0)
+            with timings.stage("create_session"):
+                session, llm_instance = session_manager.create_session(ctx, config.google.api_key)
 
-    # Create the agent with custom prompts
-    agent = EmotiveAgent(custom_prompt=custom_prompt, first_prompt=first_prompt)
+            custom_prompt = await profile_task
+            await admission_task
 
-    # Start the session
-    await session.start(
-        agent=agent,
-        room=ctx.room,
-    )
+            # Prepare session info for handlers
+            session_start_time = get_utc_now()
+            session_info = session_manager.get_session_info(
+                user_id, session_type, room_name, session_start_time
+            )
 
-    # Say initial greeting (LLM-generated first line)
-    try:
-        first_line = await generate_first_line(
-            api_key=config.google.api_key,
-            session_type=session_type,   # "call" | "practice" | "roleplay" from metadata
-            custom_prompt=custom_prompt, # enriched with profile earlier
+            # Publish session state straight to the user in this room while they are in it
+            if config.api.room_events_enabled:
+                register_room(room_name, ctx.room)
+
+            # Count session time against the quota loaded at admission
+            if session_manager.quota_ledger is not None:
+                session_manager.quota_ledger.start_clock()
+                session_info["quota_ledger"] = session_manager.quota_ledger
+                # Active course from the same snapshot; reused by every daily_progress write
+                if session_manager.quota_ledger.snapshot is not None:
+                    session_info["course_context"] = session_manager.quota_ledger.snapshot.course
+
+            # For call sessions, store call_start_time in memory (NO database insert)
+            if session_type == "call":
+                session_info["call_start_time"] = session_start_time
+                logger.info(
+                    "Call session started for user %s at %s (stored in memory, no DB insert)",
+                    user_id,
+                    session_start_time.isoformat()
+                )
+
+            # Setup LLM error handler
+            llm_error_handler = LLMErrorHandler(session, ctx, config, session_info)
+            # Wrap async handler in synchronous callback using asyncio.create_task
+            llm_instance.on("error", lambda err: asyncio.create_task(llm_error_handler.handle_error(err)))
+
+            # Setup transcript save handler
+            transcript_handler = TranscriptSaveHandler(
+                session, ctx, db_pool, config, session_info, participant
+            )
+            # Register as a shutdown callback (safety net)
+            ctx.add_shutdown_callback(transcript_handler.save_transcript)
+
+            # Create the agent with custom prompts
+            agent = EmotiveAgent(custom_prompt=custom_prompt, first_prompt=first_prompt)
+
+            # Start the session (the first line keeps generating meanwhile)
+            with timings.stage("session_start"):
+                await session.start(
+                    agent=agent,
+                    room=ctx.room,
+                )
+
+            # Say initial greeting (LLM-generated first line)
+            first_line = await first_line_task
+            if first_line:
+                try:
+                    timings.mark("greeting_queued")
+                    with timings.stage("greeting"):
+                        await session.say(first_line)
+                except Exception as e:
+                    logger.warning("Could not say initial greeting: %s", e)
+
+    except* AdmissionDenied:
+        admitted = False
+    else:
+        admitted = True
+    finally:
+        # Prepared work lives outside the task group; never leave it running
+        if speculative is not None:
+            speculative.cancel()
+
+    if not admitted:
+        logger.info(
+            "Session refused for user %s (%s); bootstrap: %s",
+            user_id, session_type, timings.summary(),
         )
-        await session.say(first_line)
-    except Exception as e:
-        logger.warning("Could not say initial greeting: %s", e)
+        dispatch_session_save_failed(
+            user_id=user_id,
+            api_url=config.api.node_api_url,
+            call_id=room_name,
+            error_message="Time limit reached for this session type. Please upgrade your plan for more time.",
+        )
+        # The job ends here; give the event a bounded chance to go out
+        await session_events.drain()
+        return
+
+    logger.info("Bootstrap timings for room %s: %s", room_name, timings.summary())
+    hidden_ms, first_line_ms = timings.hidden_ms("first_line", "session_start")
+    logger.info(
+        "Greeting latency hidden behind session start: %.0f of %.0f ms (%s)",
+        hidden_ms, first_line_ms,
+        "prepared before join" if speculative is not None else "started after join",
+    )
 
     # Setup periodic time checking for authenticated users
     if user_id:
@@ -180,9 +325,9 @@ async def entrypoint(ctx: JobContext):
                 session_info["session_disconnected"] = True
 
                 # Proactively start transcript save as soon as participant leaves,
-                # instead of waiting for full worker shutdown. This reduces the
-                # chance of hitting 'Executor shutdown has been called' while
-                # saving the conversation.
+                # instead of waiting for full worker shutdown. The save is spooled
+                # to local disk first, so a shutdown mid-save ('Executor shutdown
+                # has been called') no longer loses the conversation.
                 try:
                     asyncio.create_task(transcript_handler.save_transcript())
                 except Exception as e:
@@ -1,4 +1,18 @@
-import httpx
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, Optional, Set, Tuple
+
+from config import (
+    FIRST_LINE_HEDGE_DEFAULT_SECONDS,
+    FIRST_LINE_HEDGE_MIN_SAMPLES,
+    FIRST_LINE_LATENCY_WINDOW,
+)
+from services import http_clients
+
+logger = logging.getLogger(__name__)
 
 
 async def generate_first_line(
@@ -102,10 +116,9 @@ Now generate the first line.
         },
     }
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.post(url, json=payload)
-        r.raise_for_status()
-        data = r.json()
+    r = await http_clients.get(url).post(url, json=payload, timeout=10)
+    r.raise_for_status()
+    data = r.json()
 
     text = (
         data.get("candidates", [{}])[0]
@@ -116,4 +129,153 @@ Now generate the first line.
     )
 
     # Ensure single clean line
-    return " ".join(text.split())
\ No newline at end of file
+    return " ".join(text.split())
+
+
+# Spoken when the LLM misses the latency budget ({topic} is the session's topic title)
+_TEMPLATES = {
+    "call": (
+        "Heeey, I'm Alina from Talktivity, and I'll be taking your assessment today; don't worry, "
+        "there are no right or wrong answers, it'll only take a few minutes, so are you ready to begin?",
+        "Hellooo, I'm Alina from Talktivity, and today we'll do a short speaking assessment; "
+        "there are no right or wrong answers, it's just to understand your level, so shall we get started?",
+    ),
+    "practice": (
+        "Hey, hello, so our today's topic is {topic}; let's start simple, what comes to your mind first about it?",
+        "Hi there, so our today's topic is {topic}; tell me, what do you already know about it?",
+    ),
+    "roleplay": (
+        "Hey, hello, so our today's topic is {topic}; let's jump into the roleplay, are you ready to begin?",
+        "Hi there, so our today's topic is {topic}; I'll set the scene and you just respond naturally, okay?",
+    ),
+}
+_GENERIC_TOPIC = "everyday conversation"
+
+# Recent successful first-line latencies (seconds), for the hedge delay
+_latencies: Deque[float] = deque(maxlen=FIRST_LINE_LATENCY_WINDOW)
+
+# Requests that finished after the budget; kept referenced until they complete
+_late_requests: Set[asyncio.Task] = set()
+
+
+def template_first_line(session_type: str, topic: str = "") -> str:
+    """
+    Build an instant first line from the session type and topic title.
+
+    Args:
+        session_type: "call" | "practice" | "roleplay"
+        topic: Topic title from the session metadata (a generic one is used if empty)
+
+    Returns:
+        Templated first line
+    """
+    templates = _TEMPLATES.get(session_type, _TEMPLATES["call"])
+    topic = " ".join((topic or "").split()) or _GENERIC_TOPIC
+    return random.choice(templates).format(topic=topic)
+
+
+def hedge_delay() -> float:
+    """Get the p90 of recent first-line latencies (a default until enough are seen)."""
+    if len(_latencies) < FIRST_LINE_HEDGE_MIN_SAMPLES:
+        return FIRST_LINE_HEDGE_DEFAULT_SECONDS
+    ordered = sorted(_latencies)
+    return ordered[min(int(len(ordered) * 0.9), len(ordered) - 1)]
+
+
+async def _timed_first_line(api_key: str, session_type: str, custom_prompt: str) -> str:
+    """Generate a first line and record its latency if it succeeds."""
+    started = time.perf_counter()
+    text = await generate_first_line(api_key, session_type, custom_prompt)
+    _latencies.append(time.perf_counter() - started)
+    return text
+
+
+def _discard_late(task: asyncio.Task) -> None:
+    """Let a request that missed the budget finish (its latency is still recorded), then drop it."""
+    _late_requests.add(task)
+
+    def done(finished: asyncio.Task) -> None:
+        _late_requests.discard(finished)
+        if not finished.cancelled() and finished.exception() is None:
+            logger.info("Discarded first line that arrived after the budget")
+
+    task.add_done_callback(done)
+
+
+async def first_line_within_budget(
+    api_key: str,
+    session_type: str,
+    custom_prompt: str,
+    topic: str = "",
+    budget_seconds: float = 0.8,
+    hedge: bool = True,
+) -> Tuple[str, str]:
+    """
+    Get a first line within a latency budget.
+
+    The LLM request is hedged: if it has not answered after the p90 of recent
+    latencies, a second identical request is sent and the first answer wins.
+    Each hedge costs an extra request, so none is sent until enough latencies
+    are known (the default delay is the whole budget).
+    If no request answers within the budget (or all fail), a templated line is
+    returned instead, so time-to-greeting is bounded by the budget rather than
+    by the upstream service. Requests still running are left to finish in the
+    background and their results discarded.
+
+    Args:
+        api_key: Google API key
+        session_type: "call" | "practice" | "roleplay"
+        custom_prompt: Prompt (enriched with profile)
+        topic: Topic title for the template fallback
+        budget_seconds: Latency budget for the LLM
+        hedge: Whether to send a hedged second request
+
+    Returns:
+        (first_line, source) where source is "llm", "hedge" or "template"
+    """
+    if budget_seconds <= 0:
+        return template_first_line(session_type, topic), "template"
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget_seconds
+    primary = asyncio.create_task(_timed_first_line(api_key, session_type, custom_prompt))
+    pending = {primary}
+    hedged: Optional[asyncio.Task] = None
+
+    try:
+        delay = hedge_delay()
+        if hedge and delay < budget_seconds:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done or primary.exception() is not None or not primary.result():
+                hedged = asyncio.create_task(_timed_first_line(api_key, session_type, custom_prompt))
+                pending.add(hedged)
+
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is not None:
+                    logger.warning("First-line request failed: %s", task.exception())
+                    continue
+                text = task.result()
+                if text:
+                    for other in pending:
+                        other.cancel()
+                    return text, "hedge" if task is hedged else "llm"
+    except asyncio.CancelledError:
+        # Session refused or metadata changed: nobody needs these requests any more
+        for task in pending:
+            task.cancel()
+        raise
+
+    for task in pending:
+        _discard_late(task)
+    logger.info(
+        "No first line within %.0f ms (hedged=%s), using template for %s session",
+        budget_seconds * 1000, hedged is not None, session_type,
+    )
+    return template_first_line(session_type, topic), "template"
@@ -0,0 +1,321 @@
+"""
+Greeting cache for the first line.
+Keeps a rotating pool of pre-generated first lines per session type and topic,
+persisted to disk and refilled in the background (stale-while-revalidate).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from config import (
+    Config,
+    GREETING_POOL_SIZE,
+    GREETING_FRESH_SECONDS,
+    GREETING_MAX_AGE_SECONDS,
+    GREETING_MAX_KEYS,
+    GREETING_RELOAD_SECONDS,
+)
+from services import get_logger
+
+logger = get_logger(__name__)
+
+Pools = Dict[str, List[Dict[str, Any]]]
+
+
+class GreetingCache:
+    """
+    Pools of first lines keyed by session type and a topic fingerprint.
+
+    Pool lines are generated from the topic prompt alone (never the profile
+    enriched one), so a cached line carries nothing specific to a user and can
+    be served to anyone starting the same kind of session. Variants are served
+    in rotation; a pool that is short or has variants older than the fresh
+    window is topped up in the background while its lines keep being served.
+    The file is shared by the worker's job processes: each write merges with
+    what is on disk, and changes made by other processes are picked up by a
+    background reload. get() never touches the file; all file I/O runs in a
+    thread (or in load(), before any session). Only the max_keys most
+    recently used pools are kept.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pool_size: int = GREETING_POOL_SIZE,
+        fresh_seconds: float = GREETING_FRESH_SECONDS,
+        max_age_seconds: float = GREETING_MAX_AGE_SECONDS,
+        max_keys: int = GREETING_MAX_KEYS,
+        reload_seconds: float = GREETING_RELOAD_SECONDS,
+    ):
+        """
+        Initialize cache.
+
+        Args:
+            path: JSON file the pools are persisted to
+            pool_size: Variants kept per key
+            fresh_seconds: Age after which a variant is replaced in the background
+            max_age_seconds: Age after which a variant is no longer served
+            max_keys: Pools kept (least recently used ones are dropped)
+            reload_seconds: Minimum delay between checks of the file for other processes' writes
+        """
+        self.path = path
+        self.pool_size = pool_size
+        self.fresh_seconds = fresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.max_keys = max_keys
+        self.reload_seconds = reload_seconds
+        self._pools: Pools = {}
+        self._used: Dict[str, float] = {}
+        self._cursor: Dict[str, int] = {}
+        self._loaded_mtime: Optional[float] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._reload_checked_at = 0.0
+        self._refills: Dict[str, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "refills": 0, "refill_errors": 0}
+
+    @staticmethod
+    def fingerprint(session_type: str, topic_prompt: str) -> str:
+        """
+        Build the cache key for a session type and topic prompt.
+
+        The prompt is case- and whitespace-normalized before hashing, so
+        cosmetic differences between topic prompts map to the same pool.
+        """
+        normalized = re.sub(r"\s+", " ", (topic_prompt or "").strip().lower())
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+        return f"{session_type}:{digest}"
+
+    def get(
+        self,
+        session_type: str,
+        topic_prompt: str,
+        generate: Callable[[], Awaitable[str]],
+    ) -> Optional[str]:
+        """
+        Get a cached first line, scheduling a background refill when needed.
+
+        Args:
+            session_type: "call" | "practice" | "roleplay"
+            topic_prompt: Prompt from the session metadata (without profile)
+            generate: Coroutine function generating a new variant from the topic prompt
+
+        Returns:
+            A cached first line, or None on a miss
+        """
+        key = self.fingerprint(session_type, topic_prompt)
+        self._schedule_reload()
+
+        now = time.time()
+        self._used[key] = now
+        pool = [
+            variant for variant in self._pools.get(key, [])
+            if now - variant["created_at"] < self.max_age_seconds
+        ]
+        self._pools[key] = pool
+
+        if len(pool) < self.pool_size or any(
+            now - variant["created_at"] >= self.fresh_seconds for variant in pool
+        ):
+            self._schedule_refill(key, generate)
+
+        if not pool:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        cursor = self._cursor.get(key, 0) % len(pool)
+        self._cursor[key] = cursor + 1
+        return pool[cursor]["text"]
+
+    def _schedule_refill(self, key: str, generate: Callable[[], Awaitable[str]]) -> None:
+        """Start one background refill per key (further requests join the running one)."""
+        running = self._refills.get(key)
+        if running is not None and not running.done():
+            return
+        self._refills[key] = asyncio.create_task(self._refill(key, generate))
+
+    async def _refill(self, key: str, generate: Callable[[], Awaitable[str]]) -> None:
+        """Generate one variant, replacing the oldest one if the pool is full."""
+        try:
+            text = " ".join((await generate() or "").split())
+        except Exception as e:
+            self.stats["refill_errors"] += 1
+            logger.warning("Greeting refill for %s failed: %s", key, e)
+            return
+        finally:
+            self._refills.pop(key, None)
+
+        if not text:
+            return
+        self._add(self._pools, key, {"text": text, "created_at": time.time()})
+        self.stats["refills"] += 1
+        snapshot = {pool_key: list(pool) for pool_key, pool in self._pools.items()}
+        try:
+            merged = await asyncio.to_thread(self._persist, snapshot, dict(self._used))
+        except Exception as e:
+            logger.warning("Could not persist greeting cache to %s: %s", self.path, e)
+            return
+        self._merge(*merged)
+
+    def load(self) -> None:
+        """Read the persisted pools synchronously (at process start, before any session)."""
+        self._reload_checked_at = time.monotonic()
+        loaded = self._read_if_changed()
+        if loaded is not None:
+            self._merge(*loaded)
+
+    def _schedule_reload(self) -> None:
+        """Pick up other processes' writes in the background, at most every reload_seconds."""
+        now = time.monotonic()
+        if now - self._reload_checked_at < self.reload_seconds:
+            return
+        if self._reload_task is not None and not self._reload_task.done():
+            return
+        self._reload_checked_at = now
+        self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self) -> None:
+        """Merge the file into memory if another process changed it (read in a thread)."""
+        try:
+            loaded = await asyncio.to_thread(self._read_if_changed)
+        except Exception as e:
+            logger.warning("Could not reload greeting cache from %s: %s", self.path, e)
+            return
+        if loaded is not None:
+            self._merge(*loaded)
+
+    def _merge(self, pools: Pools, used: Dict[str, float]) -> None:
+        """Merge pools read from (or written to) the file into memory."""
+        for key, pool in pools.items():
+            for variant in pool:
+                self._add(self._pools, key, variant)
+        for key, used_at in used.items():
+            self._used[key] = max(self._used.get(key, 0.0), used_at)
+        self._evict(self._pools, self._used)
+        for key in [key for key in self._cursor if key not in self._pools]:
+            del self._cursor[key]
+
+    def _evict(self, pools: Pools, used: Dict[str, float]) -> None:
+        """Drop the least recently used pools beyond max_keys (and usage of dropped pools)."""
+        if len(pools) > self.max_keys:
+            def last_used(key: str) -> float:
+                newest = max((variant["created_at"] for variant in pools[key]), default=0.0)
+                return used.get(key, newest)
+
+            for key in sorted(pools, key=last_used)[:len(pools) - self.max_keys]:
+                del pools[key]
+        for key in [key for key in used if key not in pools]:
+            del used[key]
+
+    def _add(self, pools: Pools, key: str, variant: Dict[str, Any]) -> None:
+        """Add a variant to a pool (deduplicated by text), keeping the newest pool_size."""
+        pool = [existing for existing in pools.get(key, []) if existing["text"] != variant["text"]]
+        pool.append(variant)
+        pool.sort(key=lambda existing: existing["created_at"])
+        pools[key] = pool[-self.pool_size:]
+
+    def _read_file(self) -> Tuple[Pools, Dict[str, float]]:
+        """Read the persisted pools and their last use (empty if the file is missing or unreadable)."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}, {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable greeting cache %s: %s", self.path, e)
+            return {}, {}
+        if not isinstance(data, dict):
+            return {}, {}
+        pools = {
+            key: [v for v in pool if isinstance(v, dict) and v.get("text") and v.get("created_at")]
+            for key, pool in data.get("pools", {}).items()
+            if isinstance(pool, list)
+        }
+        used = {
+            key: float(used_at)
+            for key, used_at in data.get("used", {}).items()
+            if key in pools and isinstance(used_at, (int, float))
+        }
+        return pools, used
+
+    def _read_if_changed(self) -> Optional[Tuple[Pools, Dict[str, float]]]:
+        """Read the file if it changed since the last read or write (blocking; run in a thread)."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        if mtime == self._loaded_mtime:
+            return None
+        self._loaded_mtime = mtime
+        return self._read_file()
+
+    def _persist(self, pools: Pools, used: Dict[str, float]) -> Tuple[Pools, Dict[str, float]]:
+        """
+        Merge pools into the file and replace it atomically (runs in a thread).
+
+        Returns:
+            The merged pools and last-use times, as written
+        """
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            merged, merged_used = self._read_file()
+            for key, pool in pools.items():
+                for variant in pool:
+                    self._add(merged, key, variant)
+            for key, used_at in used.items():
+                merged_used[key] = max(merged_used.get(key, 0.0), used_at)
+            merged = {key: pool for key, pool in merged.items() if pool}
+            self._evict(merged, merged_used)
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"pools": merged, "used": merged_used}, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._loaded_mtime = os.stat(self.path).st_mtime
+        return merged, merged_used
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/refill counters and the number of pools."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "pools": len(self._pools),
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Process-wide cache (created on first use)
+_cache: Optional[GreetingCache] = None
+
+
+def get_greeting_cache(config: Config) -> Optional[GreetingCache]:
+    """
+    Get the process-wide greeting cache.
+
+    Args:
+        config: Application configuration
+
+    Returns:
+        Shared GreetingCache, or None if the cache is disabled
+    """
+    global _cache
+    if not config.greeting.cache_enabled:
+        return None
+    if _cache is None:
+        _cache = GreetingCache(config.greeting.cache_path)
+    return _cache
@@ -6,22 +6,34 @@ Handles LLM errors, time limit checks, and transcript saving.
 import asyncio
 import logging
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from livekit.agents import AgentSession, JobContext
 
-from config import Config, SESSION_STATE_SAVING
+from config import (
+    Config,
+    SPOOL_SAVE_WAIT_SECONDS,
+    TIME_WARNING_SECONDS_BEFORE_DEADLINE,
+)
 from database import DatabasePool, UsageRepository
 from services import (
+    ScheduledSession,
     TimeLimitService,
     TranscriptService,
-    emit_session_state,
-    emit_session_save_failed,
-    emit_saving_conversation,
-    emit_session_saved,
+    SessionQuotaLedger,
+    quota_ledgers,
+    get_deadline_scheduler,
+    build_spool_record,
+    get_transcript_spool_flusher,
+    get_outbox_relay,
+    project_transcript,
+    projection_savings,
+    dispatch_saving_conversation,
+    dispatch_session_save_failed,
     get_logger,
 )
 from utils.timezone import get_utc_now
+from .bootstrap import StageTimings
 
 logger = get_logger(__name__)
 
@@ -63,10 +75,10 @@ class LLMErrorHandler:
                     "Please check your Google Cloud API quotas or service account limits."
                 )
                 
-                # Emit session save failed for quota exhaustion
+                # Emit session save failed for quota exhaustion (delivered in the background)
                 user_id = self.session_info.get("user_id")
                 if user_id:
-                    await emit_session_save_failed(
+                    dispatch_session_save_failed(
                         user_id=user_id,
                         api_url=self.config.api.node_api_url,
                         call_id=self.session_info.get("room_name"),
@@ -83,7 +95,7 @@ class LLMErrorHandler:
 
 
 class TimeCheckHandler:
-    """Handles periodic time limit checks during active sessions."""
+    """Enforces session time limits through the process-wide deadline scheduler."""
 
     def __init__(
         self,
@@ -92,6 +104,7 @@ class TimeCheckHandler:
         db_pool: DatabasePool,
         config: Config,
         session_info: Dict[str, Any],
+        warning_seconds: Tuple[int, ...] = TIME_WARNING_SECONDS_BEFORE_DEADLINE,
     ):
         """
         Initialize time check handler.
@@ -101,112 +114,112 @@ class TimeCheckHandler:
             ctx: Job context
             db_pool: Database connection pool
             config: Application configuration
-            session_info: Session information dictionary
+            session_info: Session information dictionary (may carry the admission quota_ledger)
+            warning_seconds: Seconds before the deadline at which warning hooks fire
         """
         self.session = session
         self.ctx = ctx
         self.config = config
         self.session_info = session_info
         self.time_limit_service = TimeLimitService(db_pool)
-        self.check_interval = 10  # Check every 10 seconds
-        self.task: Optional[asyncio.Task] = None
+        self.scheduler = get_deadline_scheduler(db_pool)
+        self.warning_seconds = list(warning_seconds)
+        self.warning_hooks: List[Callable[[int], Awaitable[None]]] = [self._log_warning]
+        self._scheduled: Optional[ScheduledSession] = None
 
-    async def check_periodically(self):
-        """Check remaining time every 10 seconds and disconnect if time runs out."""
-        user_id = self.session_info["user_id"]
-        session_type = self.session_info["session_type"]
-        start_time = self.session_info["start_time"]
+        # Reuse the ledger loaded at admission; fall back to a lazily loaded one
+        self.ledger: SessionQuotaLedger = session_info.get("quota_ledger") or SessionQuotaLedger(
+            self.time_limit_service,
+            session_info["user_id"],
+            session_info["session_type"],
+        )
+
+    def add_warning_hook(self, hook: Callable[[int], Awaitable[None]]) -> None:
+        """
+        Register a coroutine called with the seconds left at each warning threshold.
         
-        # For call sessions, use call_start_time if available (stored in memory)
-        call_start_time = self.session_info.get("call_start_time")
-        if session_type == "call" and call_start_time:
-            start_time = call_start_time
+        Args:
+            hook: Async callable receiving the warning threshold in seconds
+        """
+        self.warning_hooks.append(hook)
 
-        while not self.session_info["session_disconnected"]:
+    async def _log_warning(self, seconds_left: int) -> None:
+        """Default warning hook: log the approaching deadline."""
+        logger.info(
+            "Time warning - User %s, Session: %s, Duration: %ss, %ss left",
+            self.session_info["user_id"],
+            self.session_info["session_type"],
+            self.ledger.elapsed_seconds(),
+            seconds_left,
+        )
+
+    async def _fire_warning(self, seconds_left: int) -> None:
+        """Run all warning hooks for a threshold, isolating hook failures."""
+        if self.session_info["session_disconnected"]:
+            return
+        for hook in self.warning_hooks:
             try:
-                await asyncio.sleep(self.check_interval)
-                
-                # Double-check if session is still active
-                if self.session_info["session_disconnected"]:
-                    logger.info("Session already disconnected, stopping time check")
-                    break
-                
-                # Calculate elapsed time in memory (NO database query for elapsed time)
-                elapsed_seconds = int((get_utc_now() - start_time).total_seconds())
-                
-                # For call sessions, check lifetime limit using existing sessions only
-                if session_type == "call":
-                    remaining = await self.time_limit_service.get_remaining_lifetime_time(
-                        user_id, elapsed_seconds
-                    )
-                else:
-                    # For practice/roleplay, use existing logic
-                    remaining = await self.time_limit_service.get_remaining_time_during_session(
-                        user_id, session_type, elapsed_seconds
-                    )
-                
-                logger.info(
-                    "Time check - User %s, Session: %s, Duration: %ss, Remaining: %ss",
-                    user_id,
-                    session_type,
-                    elapsed_seconds,
-                    remaining,
-                )
-                
-                # If time runs out, disconnect gracefully
-                if remaining <= 0:
-                    logger.warning(
-                        "Time limit reached for user %s. Disconnecting call.", user_id
-                    )
-                    
-                    # Mark session as disconnected
-                    self.session_info["session_disconnected"] = True
-                    
-                    # Signal to frontend that time is up
-                    await emit_session_state(
-                        user_id=user_id,
-                        state=SESSION_STATE_SAVING,
-                        api_url=self.config.api.node_api_url,
-                        call_id=self.session_info.get("room_name"),
-                        message="Daily time limit reached for this session type. Saving your conversation…",
-                    )
-                    self.session_info["saving_emitted"] = True
-
-                    # Close the session - triggers shutdown callback (write_transcript)
-                    try:
-                        await self.session.aclose()
-                    except Exception as e:
-                        logger.warning("Error closing session: %s", e)
-                    
-                    # Disconnect from room
-                    try:
-                        await self.ctx.room.disconnect()
-                    except Exception as e:
-                        logger.warning("Error disconnecting from room: %s", e)
-                    
-                    break
-                    
-            except asyncio.CancelledError:
-                logger.info("Time check task cancelled")
-                break
+                await hook(seconds_left)
             except Exception as e:
-                logger.error("Error in time check task: %s", e)
-                # Continue checking even if one check fails
-                await asyncio.sleep(self.check_interval)
+                logger.warning("Time warning hook failed: %s", e)
+
+    async def _enforce_limit(self):
+        """Signal the frontend, close the session and leave the room."""
+        user_id = self.session_info["user_id"]
+        if self.session_info["session_disconnected"]:
+            logger.info("Session already disconnected, skipping time limit enforcement")
+            return
+
+        logger.warning(
+            "Time limit reached for user %s. Disconnecting call.", user_id
+        )
+        
+        # Mark session as disconnected
+        self.session_info["session_disconnected"] = True
+        
+        # Signal to frontend that time is up (delivered in the background)
+        dispatch_saving_conversation(
+            user_id=user_id,
+            api_url=self.config.api.node_api_url,
+            call_id=self.session_info.get("room_name"),
+            message="Daily time limit reached for this session type. Saving your conversation…",
+        )
+        self.session_info["saving_emitted"] = True
+
+        # Close the session - triggers shutdown callback (write_transcript)
+        try:
+            await self.session.aclose()
+        except Exception as e:
+            logger.warning("Error closing session: %s", e)
+        
+        # Disconnect from room
+        try:
+            await self.ctx.room.disconnect()
+        except Exception as e:
+            logger.warning("Error disconnecting from room: %s", e)
 
     def start(self):
-        """Start the periodic time checking task."""
-        self.task = asyncio.create_task(self.check_periodically())
+        """Register this session's deadline with the process-wide scheduler."""
+        quota_ledgers.register(self.ledger)
+        self._scheduled = self.scheduler.schedule(
+            self.ledger,
+            self.warning_seconds,
+            on_warning=self._fire_warning,
+            on_deadline=self._enforce_limit,
+        )
 
     async def stop(self):
-        """Stop the time checking task."""
+        """Remove this session's deadline from the scheduler."""
         self.session_info["session_disconnected"] = True
-        if self.task and not self.task.done():
-            self.task.cancel()
-            try:
-                await self.task
-            except asyncio.CancelledError:
-                pass
+        quota_ledgers.unregister(self.ledger)
+        if self._scheduled is not None:
+            self.scheduler.cancel(self._scheduled)
+            self._scheduled = None
+        logger.info(
+            "Quota ledger stats: %s, deadline scheduler stats: %s",
+            quota_ledgers.get_stats(),
+            self.scheduler.get_stats(),
+        )
 
 
 class TranscriptSaveHandler:
@@ -238,6 +251,8 @@ class TranscriptSaveHandler:
         self.session_info = session_info
         self.participant = participant
         self.transcript_service = TranscriptService(db_pool)
+        self.spool_flusher = get_transcript_spool_flusher(db_pool, config)
+        self.outbox_relay = get_outbox_relay(db_pool, config)
         self._save_task: Optional[asyncio.Task] = None
 
     async def save_transcript(self):
@@ -274,8 +289,22 @@ class TranscriptSaveHandler:
         """
         Internal implementation of transcript saving.
         Emits SESSION_STATE events to frontend:
-        1. SAVING_CONVERSATION - before saving
+        1. SAVING_CONVERSATION - first, before any save work
         2. SESSION_SAVED or SESSION_SAVE_FAILED - after save attempt
+           (SESSION_SAVED is committed to the outbox with the save and sent
+           right away; the outbox row is only delivered by a relay if that
+           send fails, so it is never lost between the write and the emit)
+
+        Nothing here waits on Node: events are queued on the user's dispatcher
+        lane, which delivers them in order, so SAVING_CONVERSATION is on its way
+        while the history is serialized and projected (off the event loop) and
+        written. Over the event channel SAVED/FAILED is written right behind it
+        without waiting for its ack. Each phase is timed and logged.
+
+        The save is first appended to the local spool, so it survives a slow or
+        unreachable database and a worker shutdown; a spooled save that fails is
+        retried by the flusher, and its SESSION_SAVED is sent from the outbox
+        once it lands.
         """
         user_id = self.session_info.get("user_id")
         room_name = self.session_info.get("room_name")
@@ -285,21 +314,38 @@ class TranscriptSaveHandler:
             logger.info("[TranscriptSaveHandler] _do_save_transcript: Session already handled for user %s, skipping", user_id)
             return
         self.session_info["session_save_handled"] = True
+        timings = StageTimings()
+        connect_task: Optional[asyncio.Task] = None
         
         try:
-            # Step 1: Emit SAVING_CONVERSATION state to frontend
+            # Step 1: Emit SAVING_CONVERSATION state to frontend (delivered in the background)
             if user_id and not self.session_info["saving_emitted"]:
                 logger.info("📤 Emitting SAVING_CONVERSATION for user %s (call_id=%s)", user_id, room_name)
-                await emit_saving_conversation(user_id=user_id, api_url=self.config.api.node_api_url, call_id=room_name)
+                dispatch_saving_conversation(user_id=user_id, api_url=self.config.api.node_api_url, call_id=room_name)
                 self.session_info["saving_emitted"] = True
-            
-            # Get transcript from session
+                timings.mark("saving_queued")
+
+            # Open the pool (first save of a process) while the history is serialized
+            connect_task = asyncio.create_task(self._warm_pool(timings))
+
+            # Step 2: Get transcript from session, projected onto the stored turn schema
             try:
-                transcript_data = self.session.history.to_dict()
+                with timings.stage("serialize"):
+                    history, transcript_data, (raw_bytes, projected_bytes) = await asyncio.to_thread(
+                        self._project, self.session.history
+                    )
+                logger.info(
+                    "[TranscriptSaveHandler] Transcript for user %s: %d turns, %d bytes (raw history %d bytes, saved %d)",
+                    user_id,
+                    len(transcript_data["items"]),
+                    projected_bytes,
+                    raw_bytes,
+                    raw_bytes - projected_bytes,
+                )
             except Exception as e:
                 logger.error("[TranscriptSaveHandler] Error getting transcript data for user %s: %s", user_id, e)
                 if user_id:
-                    await emit_session_save_failed(
+                    dispatch_session_save_failed(
                         user_id=user_id,
                         api_url=self.config.api.node_api_url,
                         call_id=room_name,
@@ -307,46 +353,113 @@ class TranscriptSaveHandler:
                     )
                 return
             
-            # Save transcript to database
-            logger.info("[TranscriptSaveHandler] Writing to database for user %s...", user_id)
+            # Optionally keep the full history as a compressed cold archive
+            archive = history if self.config.transcript.archive_enabled else None
+
+            # Calculate duration
+            session_type = self.session_info["session_type"]
+            ended_at = get_utc_now()
+            if session_type == "call" and "call_start_time" in self.session_info:
+                call_start_time = self.session_info["call_start_time"]
+                duration_seconds = int((ended_at - call_start_time).total_seconds())
+            else:
+                start_time = self.session_info.get("start_time", ended_at)
+                duration_seconds = int((ended_at - start_time).total_seconds())
+
+            # Step 3: Spool the save to local disk; the flusher writes it to the database
+            spooled = None
             try:
-                # Calculate duration
-                session_type = self.session_info["session_type"]
-                if session_type == "call" and "call_start_time" in self.session_info:
-                    call_start_time = self.session_info["call_start_time"]
-                    duration_seconds = int((get_utc_now() - call_start_time).total_seconds())
-                else:
-                    start_time = self.session_info.get("start_time", get_utc_now())
-                    duration_seconds = int((get_utc_now() - start_time).total_seconds())
-                
-                save_success = await self.transcript_service.save_session_transcript(
-                    user_id=user_id,
-                    room_name=room_name,
-                    session_type=session_type,
-                    transcript=transcript_data,
-                    duration_seconds=duration_seconds,
-                    session_info=self.session_info,
-                )
+                with timings.stage("spool"):
+                    spooled = await self.spool_flusher.submit(
+                        build_spool_record(
+                            user_id=user_id,
+                            room_name=room_name,
+                            session_type=session_type,
+                            transcript=transcript_data,
+                            duration_seconds=duration_seconds,
+                            ended_at=ended_at,
+                            session_info=self.session_info,
+                            archive=archive,
+                        )
+                    )
             except Exception as e:
-                logger.error("[TranscriptSaveHandler] Database error for user %s: %s", user_id, e)
-                save_success = False
-            
-            # Step 3: Emit SESSION_SAVED or SESSION_SAVE_FAILED based on result
+                logger.error("[TranscriptSaveHandler] Could not spool transcript for user %s, saving directly: %s", user_id, e)
+
+            if spooled is not None:
+                logger.info("[TranscriptSaveHandler] Spooled transcript for user %s, waiting for database write...", user_id)
+                try:
+                    with timings.stage("db_write"):
+                        save_success = await asyncio.wait_for(asyncio.shield(spooled), SPOOL_SAVE_WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Still on disk: the flusher saves it and its SESSION_SAVED goes out from the outbox
+                    logger.warning("[TranscriptSaveHandler] Database write still pending for user %s; left to the spool flusher", user_id)
+                    return
+            else:
+                logger.info("[TranscriptSaveHandler] Writing to database for user %s...", user_id)
+                await connect_task
+                try:
+                    with timings.stage("db_write"):
+                        save_success = await self.transcript_service.save_session_transcript(
+                            user_id=user_id,
+                            room_name=room_name,
+                            session_type=session_type,
+                            transcript=transcript_data,
+                            duration_seconds=duration_seconds,
+                            session_info=self.session_info,
+                            ended_at=ended_at,
+                            archive=archive,
+                        )
+                except Exception as e:
+                    logger.error("[TranscriptSaveHandler] Database error for user %s: %s", user_id, e)
+                    save_success = False
+
+                # Saved usage changes the baseline of this user's other live sessions
+                # (the flusher does this for spooled saves)
+                if user_id and save_success:
+                    quota_ledgers.invalidate_user(user_id, "another session was saved")
+
+            # Step 4: Emit SESSION_SAVED or SESSION_SAVE_FAILED based on result
             if user_id:
                 if save_success:
-                    logger.info("📤 Emitting SESSION_SAVED for user %s (call_id=%s)", user_id, room_name)
-                    await emit_session_saved(user_id=user_id, api_url=self.config.api.node_api_url, call_id=room_name)
+                    logger.info("📤 Emitting SESSION_SAVED for user %s from the outbox (call_id=%s)", user_id, room_name)
+                    with timings.stage("saved_queued"):
+                        self.outbox_relay.relay_saved(user_id, room_name)
                     logger.info("[TranscriptSaveHandler] ✅ Success for user %s", user_id)
                 else:
                     logger.error("📤 Emitting SESSION_SAVE_FAILED for user %s (call_id=%s)", user_id, room_name)
-                    await emit_session_save_failed(
+                    if spooled is not None:
+                        error_message = "Saving your conversation is delayed. It will be saved automatically."
+                    else:
+                        error_message = "Failed to save conversation to database. Please try again."
+                    dispatch_session_save_failed(
                         user_id=user_id,
                         api_url=self.config.api.node_api_url,
                         call_id=room_name,
-                        error_message="Failed to save conversation to database. Please try again.",
+                        error_message=error_message,
                     )
         except asyncio.CancelledError:
             logger.warning("[TranscriptSaveHandler] ‼️ _do_save_transcript was CANCELLED for user %s despite shield? This usually means the loop is closing.", user_id)
             raise
         except Exception as e:
             logger.error("[TranscriptSaveHandler] ❌ Unexpected error in _do_save_transcript for user %s: %s", user_id, e)
+        finally:
+            if connect_task is not None and not connect_task.done():
+                # Only the spool and error paths get here without awaiting it
+                connect_task.cancel()
+                await asyncio.gather(connect_task, return_exceptions=True)
+            logger.info("[TranscriptSaveHandler] Save timings for user %s: %s", user_id, timings.summary())
+
+    @staticmethod
+    def _project(chat_ctx: Any) -> Tuple[Dict[str, Any], Dict[str, Any], Tuple[int, int]]:
+        """Serialize and project the history and measure the savings (runs in a thread)."""
+        history = chat_ctx.to_dict()
+        transcript_data = project_transcript(history)
+        return history, transcript_data, projection_savings(history, transcript_data)
+
+    async def _warm_pool(self, timings: StageTimings) -> None:
+        """Create the database pool if this is the process's first save (errors surface on the write)."""
+        try:
+            with timings.stage("connect"):
+                await self.transcript_service.db.connect()
+        except Exception as e:
+            logger.warning("[TranscriptSaveHandler] Could not open database pool ahead of the write: %s", e)
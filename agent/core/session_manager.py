@@ -13,8 +13,8 @@ from livekit.plugins import google, silero
 from livekit.plugins.turn_detector.english import EnglishModel
 
 from config import Config
-from database import UserRepository, DatabasePool
-from services import TimeLimitService, get_logger
+from database import UserRepository, DatabasePool, profile_cache
+from services import TimeLimitService, SessionQuotaLedger, get_logger
 from utils.timezone import get_utc_now
 
 logger = get_logger(__name__)
@@ -41,8 +41,9 @@ class SessionManager:
         self.db_pool = db_pool
         self.user_repo = UserRepository(db_pool)
         self.time_limit_service = TimeLimitService(db_pool)
+        self.quota_ledger: Optional[SessionQuotaLedger] = None
 
-    async def extract_metadata(self, participant) -> Tuple[Optional[int], str, str, str, str]:
+    async def extract_metadata(self, participant) -> Tuple[Optional[int], str, str, str, str, str]:
         """
         Extract and validate metadata from participant.
         
@@ -50,34 +51,69 @@ class SessionManager:
             participant: LiveKit participant object
             
         Returns:
-            Tuple of (user_id, custom_prompt, first_prompt, session_type, room_name)
+            Tuple of (user_id, custom_prompt, first_prompt, session_type, room_name, topic)
+        """
+        metadata_str = ""
+        if participant.metadata and hasattr(participant.metadata, "__str__"):
+            metadata_str = str(participant.metadata)
+        user_id, custom_prompt, first_prompt, session_type, topic = self.parse_metadata(metadata_str)
+        if user_id is not None:
+            logger.info("User ID: %s, Session Type: %s", user_id, session_type)
+
+        room_name = f"room_{get_utc_now().timestamp()}"
+        return user_id, custom_prompt, first_prompt, session_type, room_name, topic
+
+    def extract_room_metadata(self, ctx: JobContext) -> Tuple[Optional[int], str, str, str, str]:
+        """
+        Extract session metadata known before the participant joins.
+
+        Node creates the room with the same metadata it puts in the participant
+        token; an explicit dispatch may carry it as job metadata instead.
+        
+        Args:
+            ctx: Job context (after ctx.connect)
+            
+        Returns:
+            Tuple of (user_id, custom_prompt, first_prompt, session_type, topic);
+            user_id is None when no usable metadata is present
+        """
+        metadata_str = getattr(ctx.job, "metadata", "") or getattr(ctx.room, "metadata", "") or ""
+        return self.parse_metadata(str(metadata_str))
+
+    @staticmethod
+    def parse_metadata(metadata_str: str) -> Tuple[Optional[int], str, str, str, str]:
+        """
+        Parse session metadata JSON.
+        
+        Args:
+            metadata_str: JSON metadata as built by Node's buildSessionMetadata
+            
+        Returns:
+            Tuple of (user_id, custom_prompt, first_prompt, session_type, topic)
         """
         user_id = None
         custom_prompt = ""
         first_prompt = ""
         session_type = "call"
-        room_name = f"room_{get_utc_now().timestamp()}"
+        topic = ""
 
         try:
-            if participant.metadata and hasattr(participant.metadata, "__str__"):
-                metadata_str = str(participant.metadata)
-                if metadata_str and metadata_str != "MagicMock":
-                    metadata = json.loads(metadata_str)
-                    
-                    user_id = metadata.get("userId")
-                    custom_prompt = metadata.get("prompt", "")
-                    first_prompt = metadata.get("firstPrompt", "")
-                    session_type = metadata.get("sessionType", "call")
-                    
-                    logger.info("User ID: %s, Session Type: %s", user_id, session_type)
-        except (ValueError, TypeError) as e:
-            logger.warning("Could not parse participant metadata: %s", e)
+            if metadata_str and metadata_str != "MagicMock":
+                metadata = json.loads(metadata_str)
+                
+                user_id = metadata.get("userId")
+                custom_prompt = metadata.get("prompt", "")
+                first_prompt = metadata.get("firstPrompt", "")
+                session_type = metadata.get("sessionType", "call")
+                topic = metadata.get("topic") or ""
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning("Could not parse session metadata: %s", e)
 
         # Normalize session type
         if session_type not in {"call", "practice", "roleplay"}:
             session_type = "call"
 
-        return user_id, custom_prompt, first_prompt, session_type, room_name
+        return user_id, custom_prompt, first_prompt, session_type, topic
 
     async def enrich_with_profile(self, user_id: int, custom_prompt: str) -> str:
         """
@@ -92,6 +128,7 @@ class SessionManager:
         """
         try:
             profile = await self.user_repo.get_profile(user_id)
+            logger.debug("Profile cache stats: %s", profile_cache.get_stats())
             if profile:
                 profile_context = f"\nUser Profile: {json.dumps(profile.to_dict())}"
                 return custom_prompt + profile_context if custom_prompt else profile_context
@@ -103,6 +140,7 @@ class SessionManager:
     async def check_time_limit(self, user_id: int, session_type: str) -> bool:
         """
         Check if user has time remaining for this session type.
+        On success, keeps the admission snapshot as the session's quota ledger.
         
         Args:
             user_id: User identifier
@@ -112,14 +150,20 @@ class SessionManager:
             True if user can start session, False otherwise
         """
         try:
-            can_start = await self.time_limit_service.check_can_start_session(
-                user_id, session_type
+            snapshot = await self.time_limit_service.get_quota_snapshot(user_id)
+            can_start = self.time_limit_service.can_start_with_snapshot(
+                snapshot, session_type
             )
             if not can_start:
                 logger.warning(
                     "Time limit exceeded for user %s (%s)", user_id, session_type
                 )
-            return can_start
+                return False
+
+            self.quota_ledger = SessionQuotaLedger(
+                self.time_limit_service, user_id, session_type, snapshot
+            )
+            return True
         except Exception as e:
             logger.error("Error checking time limit for user %s: %s", user_id, e)
             return False
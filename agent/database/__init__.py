@@ -3,13 +3,24 @@ Database module with connection pooling and repositories.
 Provides clean data access layer with type safety.
 """
 
-from .connection import DatabasePool, test_connection
+from .connection import DatabasePool, DatabaseListener, test_connection
+from .cache import (
+    AsyncLRUCache,
+    profile_cache,
+    subscription_cache,
+    plan_cache,
+    watch_cache_invalidations,
+)
 from .models import (
     UserProfile,
     SessionInfo,
     TranscriptData,
+    SessionSave,
     UsageRecord,
     Subscription,
+    QuotaSnapshot,
+    CourseContext,
+    OutboxEvent,
 )
 from .repositories import (
     UserRepository,
@@ -17,22 +28,37 @@ from .repositories import (
     UsageRepository,
     SubscriptionRepository,
     CourseRepository,
+    QuotaRepository,
+    OutboxRepository,
 )
 
 __all__ = [
     # Connection
     "DatabasePool",
+    "DatabaseListener",
     "test_connection",
+    # Caches
+    "AsyncLRUCache",
+    "profile_cache",
+    "subscription_cache",
+    "plan_cache",
+    "watch_cache_invalidations",
     # Models
     "UserProfile",
     "SessionInfo",
     "TranscriptData",
+    "SessionSave",
     "UsageRecord",
     "Subscription",
+    "QuotaSnapshot",
+    "CourseContext",
+    "OutboxEvent",
     # Repositories
     "UserRepository",
     "TranscriptRepository",
     "UsageRepository",
     "SubscriptionRepository",
     "CourseRepository",
+    "QuotaRepository",
+    "OutboxRepository",
 ]
@@ -0,0 +1,260 @@
+"""
+Per-process read caches for rarely changing rows.
+Bounded LRU with TTL and single-flight loading.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from config import (
+    PROFILE_CACHE_MAX_ENTRIES,
+    PROFILE_CACHE_TTL_SECONDS,
+    ONBOARDING_CHANGED_CHANNEL,
+    SUBSCRIPTION_CACHE_MAX_ENTRIES,
+    SUBSCRIPTION_CACHE_TTL_SECONDS,
+    SUBSCRIPTION_CHANGED_CHANNEL,
+    PLAN_CACHE_TTL_SECONDS,
+    SUBSCRIPTION_PLANS_CHANGED_CHANNEL,
+)
+from database.connection import DatabasePool, DatabaseListener
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLRUCache:
+    """
+    Bounded async cache with per-entry expiry.
+
+    Concurrent misses for the same key share a single load (single-flight).
+    A key invalidated while its load is in flight is not populated with the
+    possibly stale result.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float):
+        """
+        Initialize cache.
+
+        Args:
+            name: Name used in logs and stats
+            max_entries: Maximum number of cached keys (least recently used are evicted)
+            ttl_seconds: Default lifetime of an entry
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generation: Dict[Hashable, int] = {}
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "shared_loads": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[Callable[[Any], float]] = None,
+    ) -> Any:
+        """
+        Get a cached value, loading it on a miss.
+
+        Args:
+            key: Cache key
+            loader: Coroutine function loading the value (exceptions are not cached)
+            ttl: Optional function giving the lifetime in seconds of a loaded value
+
+        Returns:
+            Cached or freshly loaded value
+        """
+        async def load_one(keys):
+            return {key: await loader()}
+
+        values = await self.get_many_or_load([key], load_one, ttl)
+        return values[key]
+
+    async def get_many_or_load(
+        self,
+        keys: Iterable[Hashable],
+        loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        ttl: Optional[Callable[[Any], float]] = None,
+    ) -> Dict[Hashable, Any]:
+        """
+        Get cached values for many keys, loading all misses with one loader call.
+
+        Misses already being loaded by another caller are awaited instead of
+        loaded again.
+
+        Args:
+            keys: Cache keys
+            loader: Coroutine function taking the missing keys and returning a
+                mapping of key to value (keys it omits are cached as None)
+            ttl: Optional function giving the lifetime in seconds of a loaded value
+
+        Returns:
+            Mapping of every requested key to its value
+        """
+        now = time.monotonic()
+        results: Dict[Hashable, Any] = {}
+        shared: Dict[Hashable, asyncio.Future] = {}
+        missing: List[Hashable] = []
+
+        for key in dict.fromkeys(keys):
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    results[key] = value
+                    continue
+                del self._entries[key]
+
+            self.stats["misses"] += 1
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.stats["shared_loads"] += 1
+                shared[key] = inflight
+            else:
+                missing.append(key)
+
+        if missing:
+            results.update(await self._load(missing, loader, ttl))
+
+        for key, inflight in shared.items():
+            results[key] = await asyncio.shield(inflight)
+        return results
+
+    async def _load(
+        self,
+        keys: List[Hashable],
+        loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        ttl: Optional[Callable[[Any], float]],
+    ) -> Dict[Hashable, Any]:
+        """Load missing keys once, sharing the result with concurrent callers."""
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        generations = {key: self._generation.get(key, 0) for key in keys}
+        self._inflight.update(futures)
+        try:
+            self.stats["loads"] += 1
+            loaded = await loader(keys)
+        except asyncio.CancelledError:
+            for future in futures.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in futures.values():
+                future.set_exception(e)
+                # Mark retrieved so a failure nobody shared is not logged as unretrieved
+                future.exception()
+            raise
+        finally:
+            current = {}
+            for key in keys:
+                self._inflight.pop(key, None)
+                current[key] = self._generation.pop(key, 0)
+
+        now = time.monotonic()
+        values = {}
+        for key in keys:
+            value = loaded.get(key)
+            values[key] = value
+            if current[key] == generations[key]:
+                lifetime = ttl(value) if ttl is not None else self.ttl_seconds
+                if lifetime > 0:
+                    self._store(key, value, now + lifetime)
+            futures[key].set_result(value)
+        return values
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a key (and keep an in-flight load from caching its result)."""
+        if key in self._inflight:
+            self._generation[key] = self._generation.get(key, 0) + 1
+        if self._entries.pop(key, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        """Drop every entry (e.g. after missing notifications)."""
+        for key in list(self._inflight):
+            self._generation[key] = self._generation.get(key, 0) + 1
+        self.stats["invalidations"] += len(self._entries)
+        self._entries.clear()
+
+    def _store(self, key: Hashable, value: Any, expires_at: float) -> None:
+        """Insert an entry, evicting the least recently used ones beyond the bound."""
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters, hit ratio and current size."""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Onboarding profiles by user_id (Node updates onboarding_data; a trigger NOTIFYs)
+profile_cache = AsyncLRUCache("profile", PROFILE_CACHE_MAX_ENTRIES, PROFILE_CACHE_TTL_SECONDS)
+
+# Active subscription by user_id (None cached too); entries expire at end_date
+subscription_cache = AsyncLRUCache(
+    "subscription", SUBSCRIPTION_CACHE_MAX_ENTRIES, SUBSCRIPTION_CACHE_TTL_SECONDS
+)
+
+# The whole (tiny) subscription_plans table under a single key
+plan_cache = AsyncLRUCache("plans", 1, PLAN_CACHE_TTL_SECONDS)
+
+_listener: Optional[DatabaseListener] = None
+
+
+def _invalidate_user_key(cache: AsyncLRUCache, payload: str) -> None:
+    """Evict the user id carried by a notification payload."""
+    try:
+        cache.invalidate(int(payload))
+    except ValueError:
+        logger.warning("Ignoring %s notification with payload %r", cache.name, payload)
+        return
+    logger.info("Evicted user %s from %s cache", payload, cache.name)
+
+
+def watch_cache_invalidations(db: DatabasePool) -> DatabaseListener:
+    """
+    Start the process-wide listener that keeps the read caches coherent.
+    Safe to call for every session; the listener is created once.
+
+    Args:
+        db: Database connection pool (its configuration is used for the listener)
+
+    Returns:
+        Shared DatabaseListener instance
+    """
+    global _listener
+    if _listener is None:
+        _listener = DatabaseListener(db.config)
+        _listener.subscribe(
+            ONBOARDING_CHANGED_CHANNEL,
+            lambda payload: _invalidate_user_key(profile_cache, payload),
+        )
+        _listener.subscribe(
+            SUBSCRIPTION_CHANGED_CHANNEL,
+            lambda payload: _invalidate_user_key(subscription_cache, payload),
+        )
+        _listener.subscribe(SUBSCRIPTION_PLANS_CHANGED_CHANNEL, lambda payload: plan_cache.clear())
+        # Changes may have been missed while (re)connecting
+        for cache in (profile_cache, subscription_cache, plan_cache):
+            _listener.on_reconnect(cache.clear)
+    _listener.start()
+    return _listener
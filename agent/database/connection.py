@@ -3,10 +3,11 @@ Database connection pool management.
 Provides async connection pooling with context managers.
 """
 
+import asyncio
 import asyncpg
 import logging
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Callable, Dict, List, Optional
 
 from config import DatabaseConfig
 
@@ -84,6 +85,46 @@ class DatabasePool:
         async with pool.acquire() as connection:
             yield connection
     
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Async context manager for a pooled connection inside a transaction.
+        
+        Everything executed on the yielded connection commits together, or
+        rolls back if the block raises.
+        
+        Usage:
+            async with pool.transaction() as conn:
+                await conn.execute("INSERT ...")
+                await conn.execute("UPDATE ...")
+        
+        Yields:
+            Database connection with an open transaction
+        """
+        async with self.acquire() as connection:
+            async with connection.transaction():
+                yield connection
+    
+    @asynccontextmanager
+    async def connection(self, conn=None):
+        """
+        Async context manager that reuses a caller's connection or acquires one.
+        
+        Lets repository methods join a caller's transaction when given a
+        connection, and fall back to a pooled connection otherwise.
+        
+        Args:
+            conn: Existing connection to reuse, if any
+        
+        Yields:
+            Database connection
+        """
+        if conn is not None:
+            yield conn
+            return
+        async with self.acquire() as connection:
+            yield connection
+    
     async def test_connection(self) -> bool:
         """
         Test database connectivity.
@@ -103,6 +144,117 @@ class DatabasePool:
             return False
 
 
+
+class DatabaseListener:
+    """
+    LISTEN/NOTIFY subscriber on a dedicated connection.
+    
+    Pooled connections drop their listeners when released, so notifications
+    are received on a connection of their own. If that connection is lost it
+    is re-established with backoff, and reconnect callbacks run so caches can
+    drop whatever may have changed while notifications were missed.
+    """
+    
+    def __init__(self, config: DatabaseConfig, max_backoff: float = 60.0):
+        """
+        Initialize listener.
+        
+        Args:
+            config: Database configuration
+            max_backoff: Maximum delay between reconnect attempts
+        """
+        self.config = config
+        self.max_backoff = max_backoff
+        self._channels: Dict[str, List[Callable[[str], None]]] = {}
+        self._reconnect_callbacks: List[Callable[[], None]] = []
+        self._conn: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lost = asyncio.Event()
+    
+    def subscribe(self, channel: str, callback: Callable[[str], None]) -> None:
+        """
+        Register a callback for notifications on a channel.
+        
+        Args:
+            channel: NOTIFY channel name
+            callback: Called with the notification payload
+        """
+        if channel not in self._channels and self._conn is not None and not self._conn.is_closed():
+            # Already listening: LISTEN on the new channel too
+            asyncio.create_task(self._conn.add_listener(channel, self._dispatch))
+        self._channels.setdefault(channel, []).append(callback)
+    
+    def on_reconnect(self, callback: Callable[[], None]) -> None:
+        """Register a callback run after the connection is (re)established."""
+        self._reconnect_callbacks.append(callback)
+    
+    def start(self) -> None:
+        """Start listening (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self) -> None:
+        """Keep a listening connection open, reconnecting with backoff."""
+        backoff = 1.0
+        while True:
+            try:
+                self._lost.clear()
+                self._conn = await asyncpg.connect(
+                    host=self.config.host,
+                    port=self.config.port,
+                    user=self.config.user,
+                    password=self.config.password,
+                    database=self.config.database,
+                    ssl=self.config.ssl,
+                )
+                self._conn.add_termination_listener(lambda _conn: self._lost.set())
+                for channel in self._channels:
+                    await self._conn.add_listener(channel, self._dispatch)
+                logger.info(f"✅ Listening for database notifications on {sorted(self._channels)}")
+                
+                backoff = 1.0
+                for callback in self._reconnect_callbacks:
+                    callback()
+                await self._lost.wait()
+                logger.warning("Database notification connection lost, reconnecting")
+                
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Database notification listener error: {e}")
+            
+            await self._close_connection()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+    
+    def _dispatch(self, _conn, _pid: int, channel: str, payload: str) -> None:
+        """Fan a notification out to the channel's callbacks."""
+        for callback in self._channels.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Error handling notification on {channel}: {e}")
+    
+    async def _close_connection(self) -> None:
+        """Close the listening connection, if any."""
+        if self._conn is not None and not self._conn.is_closed():
+            try:
+                await self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+    
+    async def aclose(self) -> None:
+        """Stop listening and close the connection."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self._close_connection()
+
 async def test_connection() -> bool:
     """
     Standalone function to test database connectivity.
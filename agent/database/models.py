@@ -4,9 +4,19 @@ Type-safe representations of database entities.
 """
 
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+from datetime import date, datetime
+from typing import Optional, List, Dict, Any, Tuple
 
+from config import (
+    SESSION_TYPE_CALL,
+    SESSION_TYPE_PRACTICE,
+    SESSION_TYPE_ROLEPLAY,
+    CALL_LIFETIME_LIMIT_SECONDS,
+    PRACTICE_DAILY_CAP_SECONDS,
+    ROLEPLAY_BASIC_CAP_SECONDS,
+    ROLEPLAY_PRO_CAP_SECONDS,
+    PLAN_TYPE_PRO,
+)
 from utils.timezone import get_utc_now, get_utc_today
 
 
@@ -73,6 +83,68 @@ class TranscriptData:
     transcript: Dict[str, Any]
     duration_seconds: int
     timestamp: datetime = field(default_factory=get_utc_now)
+    archive: Optional[Dict[str, Any]] = None  # Full chat history for the compressed archive
+
+
+@dataclass
+class CourseContext:
+    """
+    A user's active course, resolved once at admission and carried through the
+    session so progress writes need not look it up again.
+    """
+    
+    course_id: int
+    course_start_date: date
+    
+    @classmethod
+    def from_db_row(cls, course_id: int, course_start_date: Any) -> 'CourseContext':
+        """Create from a user_courses row, normalizing the start date to a date."""
+        if isinstance(course_start_date, datetime):
+            course_start_date = course_start_date.date()
+        elif isinstance(course_start_date, str):
+            # Handle string dates (YYYY-MM-DD, optionally with a time part)
+            course_start_date = datetime.strptime(course_start_date.split('T')[0], '%Y-%m-%d').date()
+        return cls(course_id=course_id, course_start_date=course_start_date)
+    
+    def week_and_day(self, on_date: date) -> Tuple[int, int]:
+        """Get the 1-based (week_number, day_number) of a date within the course."""
+        days_since_start = max((on_date - self.course_start_date).days, 0)
+        return (days_since_start // 7) + 1, (days_since_start % 7) + 1
+
+
+@dataclass
+class SessionSave:
+    """A finished session to be persisted (transcript plus usage)."""
+    
+    user_id: int
+    room_name: str
+    session_type: str
+    transcript: Dict[str, Any]
+    duration_seconds: int
+    ended_at: datetime = field(default_factory=get_utc_now)
+    call_started_at: Optional[datetime] = None
+    topic_name: Optional[str] = None
+    topic_id: Optional[int] = None
+    roleplay_cap: Optional[int] = None
+    archive: Optional[Dict[str, Any]] = None
+    course: Optional[CourseContext] = None  # Resolved at admission; looked up if missing
+
+
+@dataclass
+class OutboxEvent:
+    """A session state event from the agent_outbox table, claimed for delivery."""
+    
+    id: int
+    user_id: int
+    state: str
+    call_id: Optional[str] = None
+    message: Optional[str] = None
+    attempts: int = 0
+    
+    @classmethod
+    def from_db_row(cls, row: Dict[str, Any]) -> 'OutboxEvent':
+        """Create OutboxEvent from database row."""
+        return cls(**{k: v for k, v in row.items() if k in cls.__dataclass_fields__})
 
 
 @dataclass
@@ -96,3 +168,72 @@ class Subscription:
     end_date: datetime
     is_free_trial: bool
     free_trial_started_at: Optional[datetime] = None
+
+
+@dataclass
+class QuotaSnapshot:
+    """
+    Point-in-time view of a user's plan and usage across all session types.
+    
+    Loaded in a single query so admission and in-session checks share
+    the same numbers without re-reading subscriptions and usage tables.
+    """
+    
+    user_id: int
+    plan_type: Optional[str]
+    subscription_end_date: Optional[datetime]
+    call_used_seconds: int
+    practice_used_seconds: int
+    roleplay_used_seconds: int
+    course: Optional[CourseContext] = None
+    taken_at: datetime = field(default_factory=get_utc_now)
+    
+    @property
+    def has_subscription(self) -> bool:
+        """Whether the user had an active subscription when the snapshot was taken."""
+        return self.plan_type is not None
+    
+    def cap_for(self, session_type: str) -> int:
+        """
+        Get the time cap in seconds for a session type.
+        
+        Calls use the lifetime cap for every user; practice and roleplay
+        require an active subscription and have no allowance without one.
+        """
+        session_type = session_type.lower()
+        if session_type == SESSION_TYPE_CALL:
+            return CALL_LIFETIME_LIMIT_SECONDS
+        if not self.has_subscription:
+            return 0
+        if session_type == SESSION_TYPE_PRACTICE:
+            return PRACTICE_DAILY_CAP_SECONDS
+        if session_type == SESSION_TYPE_ROLEPLAY:
+            if self.plan_type == PLAN_TYPE_PRO:
+                return ROLEPLAY_PRO_CAP_SECONDS
+            return ROLEPLAY_BASIC_CAP_SECONDS
+        return 0
+    
+    def used_for(self, session_type: str) -> int:
+        """Get seconds already used for a session type (lifetime for calls, today otherwise)."""
+        session_type = session_type.lower()
+        if session_type == SESSION_TYPE_CALL:
+            return self.call_used_seconds
+        if session_type == SESSION_TYPE_PRACTICE:
+            return self.practice_used_seconds
+        if session_type == SESSION_TYPE_ROLEPLAY:
+            return self.roleplay_used_seconds
+        return 0
+    
+    def remaining_for(self, session_type: str, elapsed_seconds: int = 0) -> int:
+        """
+        Get remaining seconds for a session type.
+        
+        Args:
+            session_type: Type of session ("call", "practice", "roleplay")
+            elapsed_seconds: Seconds already spent in the current, unsaved session
+            
+        Returns:
+            Remaining seconds (0 if exceeded)
+        """
+        remaining = self.cap_for(session_type) - (self.used_for(session_type) + elapsed_seconds)
+        return max(0, remaining)
@@ -5,11 +5,26 @@ Separates SQL queries from business logic.
 
 import json
 import logging
+import zlib
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 
+try:
+    import zstandard
+except ImportError:  # Optional: archives fall back to zlib
+    zstandard = None
+
+from database.cache import profile_cache, subscription_cache, plan_cache
 from database.connection import DatabasePool
-from database.models import UserProfile, TranscriptData, UsageRecord, Subscription
+from database.models import (
+    UserProfile,
+    TranscriptData,
+    UsageRecord,
+    Subscription,
+    QuotaSnapshot,
+    CourseContext,
+    OutboxEvent,
+)
 from config import (
     CALL_LIFETIME_LIMIT_SECONDS,
     PRACTICE_DAILY_CAP_SECONDS,
@@ -19,6 +34,7 @@ from config import (
     PLAN_TYPE_BASIC,
     PLAN_TYPE_FREE_TRIAL,
     SPEAKING_COMPLETION_THRESHOLD_SECONDS,
+    SUBSCRIPTION_CACHE_TTL_SECONDS,
 )
 from utils.timezone import get_utc_now, get_utc_today, to_utc_datetime
 
@@ -35,63 +51,180 @@ class UserRepository:
         """
         Fetch user onboarding profile.
         
+        Served from the per-process profile cache; concurrent misses for the
+        same user share one query, and entries are evicted when Node updates
+        onboarding_data (LISTEN/NOTIFY) or after the TTL.
+        
         Args:
             user_id: User ID
             
         Returns:
             UserProfile if found, None otherwise
         """
+        try:
+            return await profile_cache.get_or_load(user_id, lambda: self._fetch_profile(user_id))
+        except Exception as e:
+            logger.error(f"Failed to fetch user profile for user {user_id}: {e}")
+            return None
+    
+    async def _fetch_profile(self, user_id: int) -> Optional[UserProfile]:
+        """Load a profile from the database (errors are raised so they are not cached)."""
+        async with self.db.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT * FROM onboarding_data WHERE user_id = $1",
+                user_id
+            )
+            
+            if row:
+                return UserProfile.from_db_row(dict(row))
+            return None
+
+    async def get_onboarding_data(self, user_id: int) -> Dict[str, Any]:
+        """
+        Fetch the full onboarding_data row for a user.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            Dictionary of all onboarding columns, empty if not found
+        """
         try:
             async with self.db.acquire() as conn:
                 row = await conn.fetchrow(
                     "SELECT * FROM onboarding_data WHERE user_id = $1",
                     user_id
                 )
-                
-                if row:
-                    return UserProfile.from_db_row(dict(row))
-                return None
+                return dict(row) if row else {}
                 
         except Exception as e:
-            logger.error(f"Failed to fetch user profile for user {user_id}: {e}")
-            return None
+            logger.error(f"Failed to fetch onboarding data for user {user_id}: {e}")
+            return {}
 
 
 class TranscriptRepository:
     """Repository for transcript-related database operations."""
     
+    ARCHIVE_CODEC_ZSTD = "zstd"
+    ARCHIVE_CODEC_ZLIB = "zlib"
+    
     def __init__(self, db: DatabasePool):
         self.db = db
     
-    async def save(self, transcript: TranscriptData) -> bool:
+    @classmethod
+    def encode_archive(cls, history: Optional[Dict[str, Any]]) -> Tuple[Optional[bytes], Optional[str]]:
+        """
+        Compress a full chat history for conversations.transcript_archive.
+        
+        Args:
+            history: Full chat history, or None to store no archive
+            
+        Returns:
+            (payload, codec), or (None, None) if there is nothing to archive
+        """
+        if history is None:
+            return None, None
+        
+        raw = json.dumps(history, default=str, separators=(",", ":")).encode("utf-8")
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=10).compress(raw), cls.ARCHIVE_CODEC_ZSTD
+        return zlib.compress(raw, 9), cls.ARCHIVE_CODEC_ZLIB
+    
+    @classmethod
+    def decode_archive(cls, payload: Optional[bytes], codec: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Decompress a conversations.transcript_archive payload.
+        
+        Args:
+            payload: Compressed payload
+            codec: Codec stored alongside it (transcript_archive_codec)
+            
+        Returns:
+            Full chat history, or None if there is no archive
+            
+        Raises:
+            ValueError: If the codec is unknown or not available
+        """
+        if payload is None:
+            return None
+        
+        if codec == cls.ARCHIVE_CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("zstandard is required to decode zstd transcript archives")
+            raw = zstandard.ZstdDecompressor().decompress(bytes(payload))
+        elif codec == cls.ARCHIVE_CODEC_ZLIB:
+            raw = zlib.decompress(bytes(payload))
+        else:
+            raise ValueError(f"Unknown transcript archive codec: {codec}")
+        return json.loads(raw)
+    
+    async def get_archive(self, room_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load and decode the full chat history archived for a room.
+        
+        Args:
+            room_name: Room/session name
+            
+        Returns:
+            Full chat history, or None if the conversation has no archive
+        """
+        try:
+            async with self.db.acquire() as conn:
+                row = await conn.fetchrow(
+                    """
+                    SELECT transcript_archive, transcript_archive_codec
+                    FROM conversations
+                    WHERE room_name = $1 AND transcript_archive IS NOT NULL
+                    ORDER BY id DESC
+                    LIMIT 1
+                    """,
+                    room_name,
+                )
+            if row is None:
+                return None
+            return self.decode_archive(row["transcript_archive"], row["transcript_archive_codec"])
+            
+        except Exception as e:
+            logger.error(f"Failed to load transcript archive for room {room_name}: {e}")
+            return None
+    
+    async def save(self, transcript: TranscriptData, conn=None) -> bool:
         """
         Save conversation transcript to database.
         
         Args:
             transcript: Transcript data to save
+            conn: Connection of an enclosing transaction; errors are re-raised
+                so the caller's transaction rolls back
             
         Returns:
             True if successful, False otherwise
         """
+        in_transaction = conn is not None
         try:
-            async with self.db.acquire() as conn:
+            async with self.db.connection(conn) as conn:
                 # conversations.timestamp is a plain TIMESTAMP (without time zone).
                 # asyncpg expects a naive datetime for this, so we convert our
                 # timezone-aware UTC datetime to a naive UTC datetime to avoid
                 # \"can't subtract offset-naive and offset-aware datetimes\" errors.
-                aware_now = get_utc_now()
-                current_ts = aware_now.replace(tzinfo=None)
+                current_ts = to_utc_datetime(transcript.timestamp or get_utc_now()).replace(tzinfo=None)
+
+                archive, archive_codec = self.encode_archive(transcript.archive)
 
                 await conn.execute(
                     """
-                    INSERT INTO conversations (user_id, transcript, room_name, session_duration, timestamp)
-                    VALUES ($1, $2, $3, $4, $5)
+                    INSERT INTO conversations
+                    (user_id, transcript, room_name, session_duration, timestamp,
+                     transcript_archive, transcript_archive_codec)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7)
                     """,
                     transcript.user_id,
                     json.dumps(transcript.transcript),
                     transcript.room_name,
                     transcript.duration_seconds,
                     current_ts,
+                    archive,
+                    archive_codec,
                 )
             
             logger.info(
@@ -101,8 +234,103 @@ class TranscriptRepository:
             
         except Exception as e:
             logger.error(f"Failed to save transcript: {e}", exc_info=True)
+            if in_transaction:
+                raise
             return False
 
+    async def save_many(self, transcripts: List[TranscriptData], conn) -> int:
+        """
+        Bulk-insert conversation transcripts with a single COPY.
+
+        Args:
+            transcripts: Transcripts to save
+            conn: Connection of the enclosing transaction (errors are raised)
+
+        Returns:
+            Number of rows written
+        """
+        if not transcripts:
+            return 0
+
+        records = [
+            (
+                transcript.user_id,
+                json.dumps(transcript.transcript),
+                transcript.room_name,
+                transcript.duration_seconds,
+                to_utc_datetime(transcript.timestamp or get_utc_now()).replace(tzinfo=None),
+                *self.encode_archive(transcript.archive),
+            )
+            for transcript in transcripts
+        ]
+        await conn.copy_records_to_table(
+            "conversations",
+            records=records,
+            columns=[
+                "user_id", "transcript", "room_name", "session_duration", "timestamp",
+                "transcript_archive", "transcript_archive_codec",
+            ],
+        )
+
+        logger.info(f"✅ Saved {len(records)} transcripts in one batch")
+        return len(records)
+
+    async def claim_room(self, room_name: str, conn) -> bool:
+        """
+        Claim a room for saving inside the caller's transaction.
+
+        Takes a transaction-scoped advisory lock on the room name, so concurrent
+        saves of the same room are serialized, then checks whether its
+        conversation already exists.
+
+        Args:
+            room_name: Room/session name
+            conn: Connection of the enclosing transaction
+
+        Returns:
+            True if the room has not been saved yet, False if it already has
+        """
+        await conn.execute(
+            "SELECT pg_advisory_xact_lock(hashtext('conversations:' || $1))",
+            room_name,
+        )
+        already_saved = await conn.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM conversations WHERE room_name = $1)",
+            room_name,
+        )
+        return not already_saved
+
+    async def claim_rooms(self, room_names: List[str], conn) -> List[str]:
+        """
+        Batch version of claim_room.
+
+        Locks every room in a fixed (sorted) order, so concurrent batches cannot
+        deadlock, then filters out rooms whose conversation already exists.
+
+        Args:
+            room_names: Room/session names
+            conn: Connection of the enclosing transaction
+
+        Returns:
+            Names of the rooms that have not been saved yet
+        """
+        if not room_names:
+            return []
+
+        await conn.execute(
+            """
+            SELECT pg_advisory_xact_lock(hashtext('conversations:' || room_name))
+            FROM (SELECT DISTINCT room_name FROM unnest($1::text[]) AS room_name ORDER BY room_name) AS rooms
+            """,
+            room_names,
+        )
+        rows = await conn.fetch(
+            "SELECT DISTINCT room_name FROM conversations WHERE room_name = ANY($1::text[])",
+            room_names,
+        )
+        saved = {row["room_name"] for row in rows}
+        return [room_name for room_name in room_names if room_name not in saved]
+
 
 class UsageRepository:
     """Repository for usage tracking operations."""
@@ -123,19 +351,13 @@ class UsageRepository:
         try:
             session_type = usage.session_type.lower()
             
-            # Call sessions go to lifetime_call_usage
+            # Call usage is recorded with the call_sessions insert (and the
+            # user_call_usage counter) when the transcript is saved.
+            # lifetime_call_usage was dropped in migration 024.
             if session_type == "call":
-                async with self.db.acquire() as conn:
-                    await conn.execute(
-                        """
-                        INSERT INTO lifetime_call_usage (user_id, duration_seconds)
-                        VALUES ($1, $2)
-                        """,
-                        usage.user_id,
-                        usage.duration_seconds,
-                    )
                 logger.info(
-                    f"✅ Recorded call usage for user {usage.user_id}: {usage.duration_seconds}s"
+                    f"ℹ️ Skipping legacy lifetime_call_usage write for call usage "
+                    f"(user {usage.user_id}, duration={usage.duration_seconds}s)"
                 )
                 return True
             
@@ -158,7 +380,10 @@ class UsageRepository:
     
     async def get_lifetime_call_usage(self, user_id: int) -> int:
         """
-        Get total lifetime call usage for user from call_sessions table.
+        Get total lifetime call usage for user from the user_call_usage counter.
+        
+        The counter is incremented together with each call_sessions insert,
+        so this is a single-row primary-key read.
         
         Args:
             user_id: User ID
@@ -170,8 +395,8 @@ class UsageRepository:
             async with self.db.acquire() as conn:
                 result = await conn.fetchrow(
                     """
-                    SELECT COALESCE(SUM(call_duration_seconds), 0) as total_seconds
-                    FROM call_sessions
+                    SELECT total_seconds
+                    FROM user_call_usage
                     WHERE user_id = $1
                     """,
                     user_id
@@ -198,6 +423,8 @@ class UsageRepository:
 class SubscriptionRepository:
     """Repository for subscription-related operations."""
     
+    PLANS_KEY = "plans"
+    
     def __init__(self, db: DatabasePool):
         self.db = db
     
@@ -211,35 +438,248 @@ class SubscriptionRepository:
         Returns:
             Subscription if active, None otherwise
         """
+        subscriptions = await self.get_active_subscriptions([user_id])
+        if subscriptions is None:
+            return None
+        return subscriptions.get(user_id)
+    
+    async def get_active_subscriptions(
+        self, user_ids: List[int]
+    ) -> Optional[Dict[int, Optional[Subscription]]]:
+        """
+        Get the active subscription of many users.
+        
+        Served from the per-process subscription cache: an entry lives until the
+        subscription's end_date (capped by the cache TTL) and is evicted when the
+        subscriptions table changes (LISTEN/NOTIFY). Misses are loaded together
+        in one query, and plan types come from the in-memory plan table.
+        
+        Args:
+            user_ids: User IDs
+            
+        Returns:
+            Mapping of user ID to active Subscription (or None), None on error
+        """
         try:
-            async with self.db.acquire() as conn:
-                row = await conn.fetchrow(
-                    """
-                    SELECT s.*, sp.plan_type
-                    FROM subscriptions s
-                    JOIN subscription_plans sp ON s.plan_id = sp.id
-                    WHERE s.user_id = $1 AND s.status = 'active' AND s.end_date > (NOW() AT TIME ZONE 'UTC')
-                    ORDER BY s.created_at DESC
-                    LIMIT 1
-                    """,
-                    user_id
+            return await subscription_cache.get_many_or_load(
+                user_ids, self._fetch_active_subscriptions, ttl=self._subscription_ttl
+            )
+        except Exception as e:
+            logger.error(f"Failed to get subscription: {e}")
+            return None
+    
+    async def get_plan_types(self) -> Dict[int, str]:
+        """
+        Get plan_type by plan id for every subscription plan.
+        The table is tiny and static, so it is held in memory in full.
+        """
+        plans = await plan_cache.get_or_load(self.PLANS_KEY, self._fetch_plan_types)
+        return plans or {}
+    
+    async def _fetch_plan_types(self) -> Dict[int, str]:
+        """Load the whole subscription_plans table."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch("SELECT id, plan_type FROM subscription_plans")
+        return {row["id"]: row["plan_type"] for row in rows}
+    
+    async def _fetch_active_subscriptions(self, user_ids: List[int]) -> Dict[int, Subscription]:
+        """Load the latest active subscription of each user (errors are raised)."""
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT DISTINCT ON (user_id)
+                    user_id, plan_id, status, start_date, end_date,
+                    is_free_trial, free_trial_started_at
+                FROM subscriptions
+                WHERE user_id = ANY($1::int[])
+                  AND status = 'active'
+                  AND end_date > (NOW() AT TIME ZONE 'UTC')
+                ORDER BY user_id, created_at DESC
+                """,
+                list(user_ids),
+            )
+        
+        plan_types = await self.get_plan_types()
+        if any(row["plan_id"] not in plan_types for row in rows):
+            # A plan was added since the plan table was cached
+            plan_cache.clear()
+            plan_types = await self.get_plan_types()
+        
+        subscriptions = {}
+        for row in rows:
+            subscription = self._subscription_from_row(row, plan_types.get(row["plan_id"]))
+            if subscription is not None:
+                subscriptions[row["user_id"]] = subscription
+        return subscriptions
+    
+    @staticmethod
+    def _subscription_from_row(row, plan_type: Optional[str]) -> Optional[Subscription]:
+        """Build a Subscription from a subscriptions row (None if its plan is unknown)."""
+        if plan_type is None:
+            logger.warning(f"Unknown plan {row['plan_id']} for user {row['user_id']}")
+            return None
+        return Subscription(
+            user_id=row["user_id"],
+            plan_type=plan_type,
+            status=row["status"],
+            start_date=row["start_date"],
+            end_date=row["end_date"],
+            is_free_trial=row["is_free_trial"] or False,
+            free_trial_started_at=row["free_trial_started_at"],
+        )
+    
+    @staticmethod
+    def _subscription_ttl(subscription: Optional[Subscription]) -> float:
+        """Cache a subscription no longer than until it ends."""
+        if subscription is None or subscription.end_date is None:
+            return SUBSCRIPTION_CACHE_TTL_SECONDS
+        # end_date is a naive UTC TIMESTAMP
+        remaining = (to_utc_datetime(subscription.end_date) - get_utc_now()).total_seconds()
+        return min(SUBSCRIPTION_CACHE_TTL_SECONDS, remaining)
+
+
+class QuotaRepository:
+    """Repository for combined plan and usage lookups."""
+    
+    def __init__(self, db: DatabasePool):
+        self.db = db
+    
+    async def get_snapshot(self, user_id: int) -> Optional[QuotaSnapshot]:
+        """
+        Get plan type and usage for every session type.
+        
+        Args:
+            user_id: User ID
+            
+        Returns:
+            QuotaSnapshot if the query succeeded, None otherwise
+        """
+        snapshots = await self.get_snapshots([user_id])
+        if snapshots is None:
+            return None
+        return snapshots.get(user_id)
+    
+    async def get_snapshots(self, user_ids: List[int]) -> Optional[Dict[int, QuotaSnapshot]]:
+        """
+        Get quota snapshots for many users in one query.
+        
+        Active subscriptions come from the subscription cache. On a miss they are
+        loaded by the same query as the usage (subscription and plan joined in),
+        and the cache is filled from it; on a hit the query only reads today's
+        daily_progress row, the lifetime call total and the active course over
+        user_id = ANY($1).
+        
+        Args:
+            user_ids: User IDs to load
+            
+        Returns:
+            Mapping of user ID to QuotaSnapshot if the query succeeded, None otherwise
+        """
+        if not user_ids:
+            return {}
+        
+        rows = None
+        
+        async def load_with_usage(missing: List[int]) -> Dict[int, Subscription]:
+            nonlocal rows
+            rows = await self._fetch_snapshot_rows(user_ids, missing)
+            subscriptions = {}
+            for row in rows:
+                if row["plan_id"] is None:
+                    continue
+                subscription = SubscriptionRepository._subscription_from_row(row, row["plan_type"])
+                if subscription is not None:
+                    subscriptions[row["user_id"]] = subscription
+            return subscriptions
+        
+        try:
+            subscriptions = await subscription_cache.get_many_or_load(
+                user_ids, load_with_usage, ttl=SubscriptionRepository._subscription_ttl
+            )
+            if rows is None:
+                # Every subscription was cached (or being loaded by another caller)
+                rows = await self._fetch_snapshot_rows(user_ids, [])
+            
+            snapshots = {}
+            for row in rows:
+                subscription = subscriptions.get(row["user_id"])
+                snapshots[row["user_id"]] = QuotaSnapshot(
+                    user_id=row["user_id"],
+                    plan_type=subscription.plan_type if subscription else None,
+                    subscription_end_date=subscription.end_date if subscription else None,
+                    call_used_seconds=int(row["call_used_seconds"] or 0),
+                    practice_used_seconds=int(row["practice_used_seconds"] or 0),
+                    roleplay_used_seconds=int(row["roleplay_used_seconds"] or 0),
+                    course=(
+                        CourseContext.from_db_row(row["course_id"], row["course_start_date"])
+                        if row["course_id"] is not None else None
+                    ),
                 )
-                
-                if row:
-                    return Subscription(
-                        user_id=row["user_id"],
-                        plan_type=row["plan_type"],
-                        status=row["status"],
-                        start_date=row["start_date"],
-                        end_date=row["end_date"],
-                        is_free_trial=row.get("is_free_trial", False),
-                        free_trial_started_at=row.get("free_trial_started_at"),
-                    )
-                return None
+            return snapshots
                 
         except Exception as e:
-            logger.error(f"Failed to get subscription: {e}")
+            logger.error(f"Failed to get quota snapshots for users {list(user_ids)}: {e}")
             return None
+    
+    async def _fetch_snapshot_rows(self, user_ids: List[int], subscription_user_ids: List[int]):
+        """Read usage and course of user_ids, and the active subscription of subscription_user_ids (errors are raised)."""
+        async with self.db.acquire() as conn:
+            return await conn.fetch(
+                """
+                WITH requested AS (
+                    SELECT DISTINCT unnest($1::int[]) AS user_id
+                ),
+                today_progress AS (
+                    SELECT user_id, speaking_duration_seconds, roleplay_duration_seconds
+                    FROM daily_progress
+                    WHERE user_id = ANY($1) AND progress_date = $2
+                ),
+                call_usage AS (
+                    SELECT user_id, total_seconds
+                    FROM user_call_usage
+                    WHERE user_id = ANY($1)
+                ),
+                active_course AS (
+                    SELECT DISTINCT ON (user_id) user_id, id AS course_id, course_start_date
+                    FROM user_courses
+                    WHERE user_id = ANY($1) AND is_active = true
+                    ORDER BY user_id, id DESC
+                ),
+                active_subscription AS (
+                    SELECT DISTINCT ON (user_id)
+                        user_id, plan_id, status, start_date, end_date,
+                        is_free_trial, free_trial_started_at
+                    FROM subscriptions
+                    WHERE user_id = ANY($3::int[])
+                      AND status = 'active'
+                      AND end_date > (NOW() AT TIME ZONE 'UTC')
+                    ORDER BY user_id, created_at DESC
+                )
+                SELECT
+                    r.user_id,
+                    COALESCE(c.total_seconds, 0) AS call_used_seconds,
+                    COALESCE(t.speaking_duration_seconds, 0) AS practice_used_seconds,
+                    COALESCE(t.roleplay_duration_seconds, 0) AS roleplay_used_seconds,
+                    ac.course_id,
+                    ac.course_start_date,
+                    s.plan_id,
+                    sp.plan_type,
+                    s.status,
+                    s.start_date,
+                    s.end_date,
+                    s.is_free_trial,
+                    s.free_trial_started_at
+                FROM requested r
+                LEFT JOIN today_progress t ON t.user_id = r.user_id
+                LEFT JOIN call_usage c ON c.user_id = r.user_id
+                LEFT JOIN active_course ac ON ac.user_id = r.user_id
+                LEFT JOIN active_subscription s ON s.user_id = r.user_id
+                LEFT JOIN subscription_plans sp ON sp.id = s.plan_id
+                """,
+                list(user_ids),
+                get_utc_today(),
+                list(subscription_user_ids),
+            )
 
 
 class CourseRepository:
@@ -248,7 +688,35 @@ class CourseRepository:
     def __init__(self, db: DatabasePool):
         self.db = db
     
-    async def update_speaking_progress(self, user_id: int) -> bool:
+    async def get_active_course(self, user_id: int, conn=None) -> Optional[CourseContext]:
+        """
+        Get the user's active course.
+        
+        Args:
+            user_id: User ID
+            conn: Connection to reuse, if any
+            
+        Returns:
+            CourseContext if the user has an active course, None otherwise
+        """
+        async with self.db.connection(conn) as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT id, course_start_date
+                FROM user_courses
+                WHERE user_id = $1 AND is_active = true
+                ORDER BY id DESC
+                LIMIT 1
+                """,
+                user_id
+            )
+        if not row:
+            return None
+        return CourseContext.from_db_row(row["id"], row["course_start_date"])
+    
+    async def update_speaking_progress(
+        self, user_id: int, course: Optional[CourseContext] = None
+    ) -> bool:
         """
         Update course speaking progress for today.
         
@@ -256,34 +724,26 @@ class CourseRepository:
         
         Args:
             user_id: User ID
+            course: Active course resolved earlier (looked up if not given)
             
         Returns:
             True if successful, False otherwise
         """
         try:
             async with self.db.acquire() as conn:
-                # Get active course
-                course = await conn.fetchrow(
-                    """
-                    SELECT id, course_start_date
-                    FROM user_courses
-                    WHERE user_id = $1 AND is_active = true
-                    ORDER BY id DESC
-                    LIMIT 1
-                    """,
-                    user_id
-                )
-                
-                if not course:
+                if course is None:
+                    course = await self.get_active_course(user_id, conn)
+                if course is None:
                     return False
                 
-                # Get today's usage
+                # Get today's usage (daily_usage was consolidated into daily_progress)
                 today_date = get_utc_today()
                 usage = await conn.fetchrow(
                     """
-                    SELECT practice_time_seconds, roleplay_time_seconds
-                    FROM daily_usage
-                    WHERE user_id = $1 AND usage_date = $2
+                    SELECT speaking_duration_seconds AS practice_time_seconds,
+                           roleplay_duration_seconds AS roleplay_time_seconds
+                    FROM daily_progress
+                    WHERE user_id = $1 AND progress_date = $2
                     """,
                     user_id,
                     today_date
@@ -296,51 +756,14 @@ class CourseRepository:
                 roleplay_used = int(usage["roleplay_time_seconds"] or 0)
                 total_spoken = practice_used + roleplay_used
                 
-                # Calculate week and day numbers
-                # Ensure both dates are date objects (no time component)
-                course_start = course["course_start_date"]
-                if isinstance(course_start, datetime):
-                    course_start = course_start.date()
-                elif isinstance(course_start, str):
-                    # Handle string dates (YYYY-MM-DD)
-                    from datetime import datetime as dt
-                    course_start = dt.strptime(course_start.split('T')[0], '%Y-%m-%d').date()
-                
-                # Ensure today_date is a date object (no time component)
-                if isinstance(today_date, datetime):
-                    today_date = today_date.date()
-                
-                days_since_start = (today_date - course_start).days
-                if days_since_start < 0:
-                    days_since_start = 0
-                
-                week_number = (days_since_start // 7) + 1
-                day_number = (days_since_start % 7) + 1
-                
-                # Check if speaking_started_at is already set
-                existing_progress = await conn.fetchrow(
-                    """
-                    SELECT speaking_started_at, speaking_duration_seconds
-                    FROM daily_progress
-                    WHERE user_id = $1 AND progress_date = $2
-                    """,
-                    user_id,
-                    today_date
-                )
+                week_number, day_number = course.week_and_day(today_date)
                 
                 # Determine if we should mark as completed (only if >= threshold)
                 should_mark_completed = total_spoken >= SPEAKING_COMPLETION_THRESHOLD_SECONDS
                 
-                # Set started_at if not already set (use first usage time or current time)
-                started_at_value = None
-                if existing_progress and existing_progress["speaking_started_at"]:
-                    started_at_value = existing_progress["speaking_started_at"]
-                else:
-                    # Set started_at to current time if not set (first time updating today)
-                    started_at_value = get_utc_now()
-                
                 # Update daily progress
-                # Always update duration and ended_at, but only set completed if threshold reached
+                # Always update duration and ended_at, but only set completed if threshold reached;
+                # speaking_started_at keeps the first value written today
                 await conn.execute(
                     """
                     INSERT INTO daily_progress (
@@ -369,11 +792,11 @@ class CourseRepository:
                         updated_at = (NOW() AT TIME ZONE 'UTC')
                     """,
                     user_id,
-                    course["id"],
+                    course.course_id,
                     week_number,
                     day_number,
                     today_date,
-                    started_at_value,
+                    get_utc_now().replace(tzinfo=None),
                     total_spoken,
                     should_mark_completed,
                 )
@@ -386,3 +809,93 @@ class CourseRepository:
         except Exception as e:
             logger.error(f"Failed to update course progress: {e}", exc_info=True)
             return False
+
+
+class OutboxRepository:
+    """Repository for the agent_outbox table (session state events committed with saves)."""
+    
+    def __init__(self, db: DatabasePool):
+        self.db = db
+    
+    async def add_many(
+        self,
+        events: List[Tuple[int, Optional[str], str, Optional[str]]],
+        conn,
+        delay_seconds: float = 0.0,
+    ) -> None:
+        """
+        Queue events inside the caller's transaction (one statement).
+        
+        Args:
+            events: (user_id, call_id, state, message) tuples
+            conn: Connection of the enclosing transaction (errors are raised)
+            delay_seconds: Keep the events from claims for this long (the saving
+                process sends them itself meanwhile)
+        """
+        if not events:
+            return
+        user_ids, call_ids, states, messages = (list(column) for column in zip(*events))
+        await conn.execute(
+            """
+            INSERT INTO agent_outbox (user_id, call_id, state, message, available_at)
+            SELECT e.user_id, e.call_id, e.state, e.message,
+                   (NOW() AT TIME ZONE 'UTC') + make_interval(secs => $5)
+            FROM unnest($1::int[], $2::text[], $3::text[], $4::text[])
+                AS e(user_id, call_id, state, message)
+            """,
+            user_ids, call_ids, states, messages, float(delay_seconds),
+        )
+    
+    async def claim(self, limit: int, lease_seconds: float) -> List[OutboxEvent]:
+        """
+        Claim events for delivery.
+        
+        Rows locked by a concurrent claim are skipped, and claimed rows are
+        hidden from other claims for the lease, so relays in several processes
+        never deliver the same row at the same time. A row whose lease expires
+        before complete() is claimed again.
+        
+        Args:
+            limit: Maximum number of events
+            lease_seconds: How long the claimed rows stay hidden
+            
+        Returns:
+            Claimed events, oldest first (attempts already incremented)
+        """
+        async with self.db.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE agent_outbox o
+                SET attempts = o.attempts + 1,
+                    available_at = (NOW() AT TIME ZONE 'UTC') + make_interval(secs => $2)
+                WHERE o.id IN (
+                    SELECT id FROM agent_outbox
+                    WHERE available_at <= (NOW() AT TIME ZONE 'UTC')
+                    ORDER BY id
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING o.id, o.user_id, o.state, o.call_id, o.message, o.attempts
+                """,
+                limit,
+                float(lease_seconds),
+            )
+        return sorted((OutboxEvent.from_db_row(dict(row)) for row in rows), key=lambda event: event.id)
+    
+    async def complete(self, ids: List[int]) -> None:
+        """Delete delivered (or abandoned) events."""
+        if not ids:
+            return
+        async with self.db.acquire() as conn:
+            await conn.execute("DELETE FROM agent_outbox WHERE id = ANY($1::bigint[])", ids)
+    
+    async def complete_unclaimed(self, call_ids: List[str], state: str) -> None:
+        """Delete events of these calls that were delivered without being claimed."""
+        if not call_ids:
+            return
+        async with self.db.acquire() as conn:
+            await conn.execute(
+                "DELETE FROM agent_outbox WHERE call_id = ANY($1::text[]) AND state = $2 AND attempts = 0",
+                call_ids,
+                state,
+            )
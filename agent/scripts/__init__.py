@@ -0,0 +1,4 @@
+"""
+Maintenance and benchmark scripts for the agent.
+Run from the agent directory as modules, e.g. python -m scripts.bench_db_connect
+"""
@@ -0,0 +1,78 @@
+"""
+Timing helpers shared by the benchmark scripts.
+"""
+
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+from config import DatabaseConfig
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "tests" / "schema.sql"
+
+
+async def time_calls(call: Callable[[], Awaitable], iterations: int, warmup: int = 1) -> List[float]:
+    """
+    Time sequential awaits of a coroutine function.
+
+    Args:
+        call: Coroutine function to time
+        iterations: Number of timed calls
+        warmup: Untimed calls made first
+
+    Returns:
+        Duration of each timed call in seconds
+    """
+    for _ in range(warmup):
+        await call()
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(label: str, samples: List[float]) -> float:
+    """
+    Print mean/p50/p95 of a list of durations.
+
+    Returns:
+        Mean duration in seconds
+    """
+    ordered = sorted(samples)
+    mean = statistics.fmean(ordered)
+    p50 = ordered[len(ordered) // 2]
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(
+        f"{label:<32} n={len(ordered):<5} mean={mean * 1000:8.2f}ms "
+        f"p50={p50 * 1000:8.2f}ms p95={p95 * 1000:8.2f}ms"
+    )
+    return mean
+
+
+def scratch_database_config() -> DatabaseConfig:
+    """
+    Configuration of the disposable database in TEST_PG_* (as used by the tests).
+
+    Benchmarks that write rows run there, never against PG_*.
+    """
+    host = os.getenv("TEST_PG_HOST")
+    if not host:
+        raise SystemExit("Set TEST_PG_HOST (and TEST_PG_USER, TEST_PG_DATABASE, ...) to a disposable database")
+    return DatabaseConfig(
+        host=host,
+        port=int(os.getenv("TEST_PG_PORT", "5432")),
+        user=os.getenv("TEST_PG_USER", "postgres"),
+        password=os.getenv("TEST_PG_PASSWORD", ""),
+        database=os.getenv("TEST_PG_DATABASE", "postgres"),
+        ssl=os.getenv("TEST_PG_SSL", "false").lower() == "true",
+    )
+
+
+async def reset_scratch_schema(conn) -> None:
+    """Drop and recreate the agent tables of tests/schema.sql on a scratch database."""
+    await conn.execute(SCHEMA_PATH.read_text())
@@ -0,0 +1,60 @@
+"""
+Benchmark: connect-per-call vs the shared pool for the legacy db.py helpers.
+
+The old agent/db.py helpers ran asyncpg.connect() (TCP + TLS + auth) for
+every call; they now borrow a connection from DatabasePool. This times both
+patterns for the same trivial query against the database in PG_* (use a
+remote, TLS-enabled server to see the real handshake cost):
+
+    python -m scripts.bench_db_connect --iterations 50
+"""
+
+import argparse
+import asyncio
+
+import asyncpg
+
+from config import DatabaseConfig
+from database import DatabasePool
+from scripts.bench_common import report, time_calls
+
+QUERY = "SELECT 1"
+
+
+async def main(iterations: int) -> None:
+    config = DatabaseConfig.from_env()
+    print(f"Database {config.host}:{config.port}/{config.database} (ssl={config.ssl})")
+
+    async def connect_per_call() -> None:
+        conn = await asyncpg.connect(
+            host=config.host,
+            port=config.port,
+            user=config.user,
+            password=config.password,
+            database=config.database,
+            ssl=config.ssl,
+        )
+        try:
+            await conn.fetchval(QUERY)
+        finally:
+            await conn.close()
+
+    pool = DatabasePool(config, min_size=1, max_size=2)
+
+    async def pooled() -> None:
+        async with pool.acquire() as conn:
+            await conn.fetchval(QUERY)
+
+    try:
+        before = report("asyncpg.connect per call", await time_calls(connect_per_call, iterations))
+        after = report("DatabasePool.acquire", await time_calls(pooled, iterations))
+    finally:
+        await pool.close()
+    print(f"Handshake cost removed per call: {(before - after) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50, help="Timed calls per pattern")
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
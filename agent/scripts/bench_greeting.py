@@ -0,0 +1,104 @@
+"""
+Benchmark: greeting latency with and without the speculative first line.
+
+Runs the real bootstrap pieces (SpeculativeGreeting, prepare_first_line,
+StageTimings) against simulated latencies: the participant joining after
+the room is connected, the profile lookup, the Gemini first-line request
+(generate_first_line is replaced by a sleep) and session.start. For each
+trial it measures the time from the participant joining to the greeting
+being ready to say, when the first line is started after the join (the
+bootstrap graph alone) and when it is started from room metadata:
+
+    python -m scripts.bench_greeting --join-ms 800 --llm-ms 600 --trials 20
+"""
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import core.first_line as first_line_module
+from config import GreetingConfig
+from core.bootstrap import SpeculativeGreeting, StageTimings, prepare_first_line
+from scripts.bench_common import report
+
+USER_ID = 1
+SESSION_TYPE = "practice"
+PROMPT = "Topic: ordering food at a restaurant"
+
+
+class SimulatedSessionManager:
+    """Stands in for SessionManager.enrich_with_profile (the profile DB lookup)."""
+
+    def __init__(self, profile_seconds: float):
+        self.profile_seconds = profile_seconds
+
+    async def enrich_with_profile(self, user_id: int, custom_prompt: str) -> str:
+        await asyncio.sleep(self.profile_seconds)
+        return f"{custom_prompt}\nProfile of user {user_id}"
+
+
+async def greeting_after_join(args, config, session_manager, speculative_start: bool) -> float:
+    """Run one bootstrap; return seconds from participant join to greeting ready."""
+    timings = StageTimings()
+    speculative = None
+    if speculative_start:
+        speculative = SpeculativeGreeting.start(
+            session_manager, config, USER_ID, SESSION_TYPE, PROMPT, "Restaurant", timings
+        )
+
+    # ctx.wait_for_participant()
+    await asyncio.sleep(args.join_ms / 1000)
+    joined = time.perf_counter()
+
+    if speculative is not None and speculative.matches(USER_ID, SESSION_TYPE, PROMPT):
+        first_line_task = speculative.first_line_task
+    else:
+        profile_task = asyncio.create_task(session_manager.enrich_with_profile(USER_ID, PROMPT))
+        first_line_task = asyncio.create_task(
+            prepare_first_line(config, SESSION_TYPE, profile_task, timings, PROMPT, "Restaurant")
+        )
+
+    # session.start() runs while the first line is generated
+    await asyncio.sleep(args.session_start_ms / 1000)
+    first_line = await first_line_task
+    assert first_line
+    return time.perf_counter() - joined
+
+
+async def main(args) -> None:
+    async def simulated_llm(api_key: str, session_type: str, custom_prompt: str) -> str:
+        await asyncio.sleep(args.llm_ms / 1000)
+        return "Hi there, so our today's topic is Restaurant; what would you like to order?"
+
+    first_line_module.generate_first_line = simulated_llm
+    config = SimpleNamespace(
+        google=SimpleNamespace(api_key="bench"),
+        greeting=GreetingConfig(cache_enabled=False, budget_seconds=args.budget_ms / 1000, hedge_enabled=False),
+    )
+    session_manager = SimulatedSessionManager(args.profile_ms / 1000)
+
+    print(
+        f"join={args.join_ms}ms profile={args.profile_ms}ms llm={args.llm_ms}ms "
+        f"session.start={args.session_start_ms}ms budget={args.budget_ms}ms"
+    )
+    results = {}
+    for label, speculative_start in (("first line after join", False), ("first line before join", True)):
+        samples = [
+            await greeting_after_join(args, config, session_manager, speculative_start)
+            for _ in range(args.trials)
+        ]
+        results[label] = report(label, samples)
+    saved = results["first line after join"] - results["first line before join"]
+    print(f"Greeting latency saved per session: {saved * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--join-ms", type=int, default=800, help="Room connect to participant join")
+    parser.add_argument("--profile-ms", type=int, default=60, help="Profile lookup")
+    parser.add_argument("--llm-ms", type=int, default=600, help="Gemini first-line request")
+    parser.add_argument("--session-start-ms", type=int, default=250, help="session.start()")
+    parser.add_argument("--budget-ms", type=int, default=1500, help="First-line latency budget")
+    parser.add_argument("--trials", type=int, default=10, help="Bootstraps per variant")
+    asyncio.run(main(parser.parse_args()))
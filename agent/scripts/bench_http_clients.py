@@ -0,0 +1,112 @@
+"""
+Benchmark: a new httpx client per request vs the shared client registry.
+
+Before the registry, every session-state event and first-line request built
+its own httpx.AsyncClient and so paid DNS, TCP and (for HTTPS) TLS setup each
+time. This times the same POST both ways. By default it targets a local
+stand-in server (with --tls, over HTTPS with a throwaway self-signed
+certificate); use --url to time a real endpoint, e.g. the Node server:
+
+    python -m scripts.bench_http_clients --tls --iterations 100
+    python -m scripts.bench_http_clients --url https://api.example.com/api/agent/session-state
+
+A new client also loads its CA bundle. With --tls that bundle is only the
+throwaway certificate, so the per-request cost is lower than in production,
+where it is the full default bundle (as in the plain HTTP run).
+"""
+
+import argparse
+import asyncio
+import os
+import ssl
+import subprocess
+import tempfile
+from typing import Optional
+
+import httpx
+
+from scripts.bench_common import report, time_calls
+from services.http_client import http_clients
+
+PAYLOAD = {"user_id": 1, "state": "SESSION_SAVED", "call_id": "bench", "message": "Saved"}
+RESPONSE = b'{"success":true}'
+
+
+async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Answer keep-alive HTTP/1.1 requests with a small JSON body."""
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode("latin-1").split("\r\n"):
+                name, _, value = line.partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                b"Content-Length: " + str(len(RESPONSE)).encode() + b"\r\n\r\n" + RESPONSE
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def self_signed_context(directory: str) -> ssl.SSLContext:
+    """Create a server TLS context with a throwaway certificate, trusted by this process's clients."""
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1",
+            "-keyout", key, "-out", cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    # httpx clients (including the registry's) pick the CA bundle up from the environment
+    os.environ["SSL_CERT_FILE"] = cert
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+async def main(url: Optional[str], tls: bool, iterations: int) -> None:
+    server = None
+    with tempfile.TemporaryDirectory() as directory:
+        if url is None:
+            context = self_signed_context(directory) if tls else None
+            server = await asyncio.start_server(handle, "127.0.0.1", 0, ssl=context)
+            port = server.sockets[0].getsockname()[1]
+            url = f"{'https' if tls else 'http'}://127.0.0.1:{port}/api/agent/session-state"
+        print(f"POST {url}")
+
+        async def client_per_request() -> None:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, json=PAYLOAD, timeout=5.0)
+                response.raise_for_status()
+
+        async def shared_client() -> None:
+            response = await http_clients.get(url).post(url, json=PAYLOAD, timeout=5.0)
+            response.raise_for_status()
+
+        try:
+            before = report("new AsyncClient per request", await time_calls(client_per_request, iterations))
+            after = report("shared registry client", await time_calls(shared_client, iterations))
+            print(f"Saved per request: {(before - after) * 1000:.2f}ms ({before / after:.1f}x faster)")
+        finally:
+            await http_clients.aclose()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Endpoint to POST to (default: a local stand-in server)")
+    parser.add_argument("--tls", action="store_true", help="Serve the stand-in over HTTPS")
+    parser.add_argument("--iterations", type=int, default=100, help="Timed requests per pattern")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.tls, args.iterations))
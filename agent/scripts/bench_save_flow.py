@@ -0,0 +1,269 @@
+"""
+Benchmark: hang-up to "saved" with the sequential and the overlapped save flow.
+
+The sequential flow runs the save steps one after the other: await the
+SAVING_CONVERSATION POST, project the history on the event loop, spool the
+save and wait for the flusher's database write, then await the
+SESSION_SAVED POST. The overlapped flow is TranscriptSaveHandler's save as
+it runs after a session (queued SAVING_CONVERSATION, serialization and
+projection in a thread, the same spooled write, SESSION_SAVED sent
+straight after it), once over HTTP and once over the event channel. A
+local stand-in for Node answers POSTs and channel frames after --node-ms
+(the round trip including Socket.IO fan-out); saves go to the disposable
+TEST_PG_* database, whose agent tables are dropped and recreated. Latency
+is measured from the start of the save to the stand-in receiving
+SESSION_SAVED, and the phases of the last save of each flow are printed:
+
+    TEST_PG_HOST=localhost TEST_PG_DATABASE=agent_test python -m scripts.bench_save_flow --node-ms 80
+
+Over HTTP, SESSION_SAVED still waits on the user's lane for Node to answer
+SAVING_CONVERSATION, so the overlap saves the shorter of the Node round
+trip and serialize + spool + write. Over the channel the lane only waits
+for SAVING_CONVERSATION's frame to be written, so SESSION_SAVED arrives
+right after the write.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+from config import (
+    SESSION_SAVED_MESSAGE,
+    SESSION_STATE_SAVED,
+    SESSION_STATE_SAVING,
+    SpoolConfig,
+    TranscriptConfig,
+)
+from core.bootstrap import StageTimings
+from core.handlers import TranscriptSaveHandler
+from database import DatabasePool
+from scripts.bench_common import report, reset_scratch_schema, scratch_database_config
+from services.event_channel import SessionEventChannel
+from services.http_client import http_clients
+from services.session_events import session_events
+from services.socket_service import emit_session_state
+from services.transcript_projection import project_transcript, projection_savings
+from services.transcript_spool import build_spool_record, get_transcript_spool_flusher
+from utils.timezone import get_utc_now
+
+RESPONSE = b'{"success":true}'
+
+
+class NodeStandIn:
+    """Answers POST /api/agent/session-state after a delay, recording when each state arrived."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._arrivals: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def arrival(self, call_id: str, state: str) -> asyncio.Future:
+        """Future resolved with the perf_counter time the state of a call arrived."""
+        key = (call_id, state)
+        if key not in self._arrivals:
+            self._arrivals[key] = asyncio.get_running_loop().create_future()
+        return self._arrivals[key]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n"):
+                    name, _, value = line.partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                event = json.loads(await reader.readexactly(length))
+                arrived = self.arrival(event["call_id"], event["state"])
+                if not arrived.done():
+                    arrived.set_result(time.perf_counter())
+                await asyncio.sleep(self.delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(RESPONSE)).encode() + b"\r\n\r\n" + RESPONSE
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_channel(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the event channel: record each frame on arrival, ack it after the delay."""
+
+        async def ack(frame_id: int) -> None:
+            await asyncio.sleep(self.delay)
+            if not writer.is_closing():
+                writer.write(json.dumps({"ack": frame_id, "ok": True}).encode("utf-8") + b"\n")
+
+        try:
+            while line := await reader.readline():
+                frame = json.loads(line)
+                arrived = self.arrival(frame["call_id"], frame["state"])
+                if not arrived.done():
+                    arrived.set_result(time.perf_counter())
+                asyncio.create_task(ack(frame["id"]))
+        finally:
+            writer.close()
+
+
+class SaveTimingsLog(logging.Handler):
+    """Keeps the phase timings TranscriptSaveHandler logs at the end of each save."""
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.lines: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if "Save timings" in message:
+            self.lines.append(message.partition(": ")[2])
+
+
+def make_history(turns: int) -> Dict[str, Any]:
+    """A session.history.to_dict() payload of alternating user/assistant turns."""
+    items = []
+    for turn in range(turns):
+        items.append({
+            "id": f"item_{turn}",
+            "type": "message",
+            "role": "user" if turn % 2 == 0 else "assistant",
+            "content": [f"Turn {turn}: I would like to order the grilled fish with a side salad, please."],
+            "interrupted": False,
+            "created_at": 1_700_000_000.0 + turn,
+            "extra": {"transcript_confidence": 0.93},
+        })
+    return {"items": items}
+
+
+async def sequential_save(db: DatabasePool, config, user_id: int, room_name: str, history) -> str:
+    """The save flow with every step awaited in turn; returns its phase timings."""
+    timings = StageTimings()
+    api_url = config.api.node_api_url
+    with timings.stage("saving_sent"):
+        await emit_session_state(
+            user_id=user_id, state=SESSION_STATE_SAVING, api_url=api_url, call_id=room_name,
+            message="Please wait a moment, we are saving your conversation for analysis…",
+        )
+    with timings.stage("serialize"):
+        transcript = project_transcript(history)
+        projection_savings(history, transcript)
+    with timings.stage("spool"):
+        spooled = await get_transcript_spool_flusher(db, config).submit(build_spool_record(
+            user_id=user_id, room_name=room_name, session_type="practice", transcript=transcript,
+            duration_seconds=300, ended_at=get_utc_now(), session_info={},
+        ))
+    with timings.stage("db_write"):
+        assert await spooled
+    with timings.stage("saved_sent"):
+        await emit_session_state(
+            user_id=user_id, state=SESSION_STATE_SAVED, api_url=api_url, call_id=room_name,
+            message=SESSION_SAVED_MESSAGE,
+        )
+    return timings.summary()
+
+
+async def overlapped_save(
+    db: DatabasePool, config, save_log: SaveTimingsLog, user_id: int, room_name: str, history
+) -> str:
+    """TranscriptSaveHandler's save of a finished practice session; returns its phase timings."""
+    session = SimpleNamespace(history=SimpleNamespace(to_dict=lambda: history))
+    session_info = {
+        "user_id": user_id,
+        "room_name": room_name,
+        "session_type": "practice",
+        "start_time": get_utc_now(),
+        "session_save_handled": False,
+        "saving_emitted": False,
+    }
+    handler = TranscriptSaveHandler(session, None, db, config, session_info, participant=None)
+    await handler._do_save_transcript()
+    return save_log.lines[-1]
+
+
+async def main(args) -> None:
+    node = NodeStandIn(args.node_ms / 1000)
+    server = await asyncio.start_server(node.handle, "127.0.0.1", 0)
+    api_url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    socket_dir = tempfile.TemporaryDirectory()
+    channel_server = await asyncio.start_unix_server(
+        node.handle_channel, os.path.join(socket_dir.name, "events.sock")
+    )
+    channel = SessionEventChannel(os.path.join(socket_dir.name, "events.sock"))
+
+    db = DatabasePool(scratch_database_config(), min_size=1, max_size=4)
+    async with db.acquire() as conn:
+        await reset_scratch_schema(conn)
+    history = make_history(args.turns)
+    print(f"node round trip={args.node_ms}ms history={args.turns} turns trials={args.trials}")
+
+    save_log = SaveTimingsLog()
+    handlers_logger = logging.getLogger("core.handlers")
+    handlers_logger.setLevel(logging.INFO)
+    handlers_logger.addHandler(save_log)
+    handlers_logger.propagate = False
+
+    with tempfile.TemporaryDirectory() as spool_dir:
+        config = SimpleNamespace(
+            api=SimpleNamespace(node_api_url=api_url),
+            spool=SpoolConfig(transcript_dir=spool_dir),
+            transcript=TranscriptConfig(),
+        )
+        flows = {
+            "sequential": lambda user_id, room: sequential_save(db, config, user_id, room, history),
+            "overlapped": lambda user_id, room: overlapped_save(db, config, save_log, user_id, room, history),
+            "overlapped (channel)": lambda user_id, room: overlapped_save(
+                db, config, save_log, user_id, room, history
+            ),
+        }
+        results, phases = {}, {}
+        try:
+            for label, save in flows.items():
+                if label == "overlapped (channel)":
+                    channel.start()
+                    session_events.use_channel(channel)
+                    while not channel.connected:
+                        await asyncio.sleep(0.01)
+                samples = []
+                # The first save of each flow warms the pool and the HTTP client, untimed
+                for trial in range(args.trials + 1):
+                    room = f"bench-{label}-{trial}"
+                    saved = node.arrival(room, SESSION_STATE_SAVED)
+                    started = time.perf_counter()
+                    phases[label] = await save(trial + 1, room)
+                    arrived = await asyncio.wait_for(saved, 10)
+                    if trial:
+                        samples.append(arrived - started)
+                results[label] = report(f"{label} save to SESSION_SAVED", samples)
+        finally:
+            await session_events.drain()
+            session_events.use_channel(None)
+            await channel.aclose()
+            await http_clients.aclose()
+            await db.close()
+            for stand_in in (server, channel_server):
+                stand_in.close()
+                await stand_in.wait_closed()
+            socket_dir.cleanup()
+
+    for label, summary in phases.items():
+        print(f"{label} phases: {summary}")
+    for label in ("overlapped", "overlapped (channel)"):
+        saved = results["sequential"] - results[label]
+        print(
+            f"Hang-up to saved shortened by {saved * 1000:.1f}ms with the {label} flow "
+            f"({saved * 1000 / args.node_ms:.1f} Node round trips)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--node-ms", type=int, default=80, help="Node round trip per session state POST")
+    parser.add_argument("--turns", type=int, default=60, help="Turns in the saved history")
+    parser.add_argument("--trials", type=int, default=20, help="Timed saves per flow")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,119 @@
+"""
+Benchmark: saving finished sessions one by one vs in batches.
+
+Writes the same mix of call, practice and roleplay sessions three ways:
+sequential save_session_transcript calls, concurrent ones (a "save storm"
+of calls ending together), and save_session_transcripts batches (COPY plus
+one statement per table). Runs against the disposable TEST_PG_* database,
+whose agent tables are dropped and recreated:
+
+    TEST_PG_HOST=localhost TEST_PG_DATABASE=agent_test python -m scripts.bench_session_saves --sessions 500
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+from database import DatabasePool, SessionSave
+from scripts.bench_common import reset_scratch_schema, scratch_database_config
+from services.transcript_saver import TranscriptService
+from utils.timezone import get_utc_now
+
+SESSION_TYPES = ("call", "practice", "roleplay")
+TRANSCRIPT = {"version": 2, "turns": [{"role": "user", "text": "Hello"}, {"role": "assistant", "text": "Hi!"}]}
+
+
+def make_sessions(count: int, users: int, run: str):
+    ended_at = get_utc_now()
+    saves = []
+    for index in range(count):
+        session_type = SESSION_TYPES[index % len(SESSION_TYPES)]
+        saves.append(SessionSave(
+            user_id=index % users + 1,
+            room_name=f"bench-{run}-{index}",
+            session_type=session_type,
+            transcript=TRANSCRIPT,
+            duration_seconds=30,
+            ended_at=ended_at,
+            call_started_at=ended_at - timedelta(seconds=30) if session_type == "call" else None,
+            roleplay_cap=300 if session_type == "roleplay" else None,
+        ))
+    return saves
+
+
+def session_info(save: SessionSave):
+    return {"call_start_time": save.call_started_at, "roleplay_cap": save.roleplay_cap}
+
+
+async def main(sessions: int, users: int, batch_size: int, concurrency: int) -> None:
+    config = scratch_database_config()
+    db = DatabasePool(config, min_size=1, max_size=max(concurrency, 2))
+    service = TranscriptService(db)
+
+    async def reset() -> None:
+        async with db.acquire() as conn:
+            await reset_scratch_schema(conn)
+            await conn.execute(
+                """
+                INSERT INTO user_courses (user_id, course_start_date, course_end_date)
+                SELECT user_id, CURRENT_DATE - 10, CURRENT_DATE + 80
+                FROM generate_series(1, $1::int) AS user_id
+                """,
+                users,
+            )
+
+    async def save_one(save: SessionSave) -> bool:
+        return await service.save_session_transcript(
+            save.user_id, save.room_name, save.session_type, save.transcript,
+            save.duration_seconds, session_info(save), ended_at=save.ended_at,
+        )
+
+    async def sequential(saves):
+        return [await save_one(save) for save in saves]
+
+    async def concurrent(saves):
+        limit = asyncio.Semaphore(concurrency)
+
+        async def limited(save):
+            async with limit:
+                return await save_one(save)
+        return await asyncio.gather(*(limited(save) for save in saves))
+
+    async def batched(saves):
+        results = []
+        for start in range(0, len(saves), batch_size):
+            results += await service.save_session_transcripts(saves[start:start + batch_size])
+        return results
+
+    try:
+        for label, path in (
+            ("one by one", sequential),
+            (f"{concurrency} concurrent", concurrent),
+            (f"batches of {batch_size}", batched),
+        ):
+            await reset()
+            saves = make_sessions(sessions, users, label.split()[0])
+            started = time.perf_counter()
+            results = await path(saves)
+            elapsed = time.perf_counter() - started
+            async with db.acquire() as conn:
+                progress_seconds = await conn.fetchval(
+                    "SELECT COALESCE(SUM(speaking_duration_seconds + roleplay_duration_seconds), 0) FROM daily_progress"
+                )
+            print(
+                f"{label:<20} {sum(results):>5}/{len(saves)} saved in {elapsed:7.3f}s "
+                f"= {len(saves) / elapsed:8.1f} sessions/s (progress total {progress_seconds}s)"
+            )
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=300, help="Sessions saved per path")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users the sessions belong to")
+    parser.add_argument("--batch-size", type=int, default=50, help="Sessions per batch")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent single saves (pool size)")
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.users, args.batch_size, args.concurrency))
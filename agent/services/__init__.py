@@ -5,7 +5,37 @@ Provides organized access to time limits, transcripts, and session state events.
 
 from .time_limit_checker import TimeLimitService
 from .transcript_saver import TranscriptService
+from .quota_ledger import SessionQuotaLedger, QuotaLedgerRegistry, quota_ledgers
+from .deadline_scheduler import (
+    ScheduledSession,
+    SessionDeadlineScheduler,
+    get_deadline_scheduler,
+)
+from .transcript_spool import (
+    TranscriptSpool,
+    TranscriptSpoolFlusher,
+    build_spool_record,
+    get_transcript_spool_flusher,
+)
+from .transcript_projection import (
+    TRANSCRIPT_SCHEMA_VERSION,
+    project_transcript,
+    projection_savings,
+)
+from .outbox_relay import OutboxRelay, get_outbox_relay
+from .http_client import HttpClientRegistry, http_clients
+from .event_channel import SessionEventChannel, get_session_event_channel
+from .session_events import (
+    CircuitBreaker,
+    SessionStateDispatcher,
+    session_events,
+    dispatch_saving_conversation,
+    dispatch_session_saved,
+    dispatch_session_save_failed,
+)
 from .socket_service import (
+    register_room,
+    publish_session_state,
     emit_session_state,
     emit_saving_conversation,
     emit_session_saved,
@@ -27,7 +57,42 @@ __all__ = [
     # Services
     "TimeLimitService",
     "TranscriptService",
+    # Quota ledger
+    "SessionQuotaLedger",
+    "QuotaLedgerRegistry",
+    "quota_ledgers",
+    # Deadline scheduling
+    "ScheduledSession",
+    "SessionDeadlineScheduler",
+    "get_deadline_scheduler",
+    # Transcript spool
+    "TranscriptSpool",
+    "TranscriptSpoolFlusher",
+    "build_spool_record",
+    "get_transcript_spool_flusher",
+    # Transcript projection
+    "TRANSCRIPT_SCHEMA_VERSION",
+    "project_transcript",
+    "projection_savings",
+    # Session state outbox relay
+    "OutboxRelay",
+    "get_outbox_relay",
+    # Shared HTTP clients
+    "HttpClientRegistry",
+    "http_clients",
+    # Session event channel
+    "SessionEventChannel",
+    "get_session_event_channel",
+    # Session state event dispatcher
+    "CircuitBreaker",
+    "SessionStateDispatcher",
+    "session_events",
+    "dispatch_saving_conversation",
+    "dispatch_session_saved",
+    "dispatch_session_save_failed",
     # Socket/session state
+    "register_room",
+    "publish_session_state",
     "emit_session_state",
     "emit_saving_conversation",
     "emit_session_saved",
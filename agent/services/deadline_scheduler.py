@@ -0,0 +1,265 @@
+"""
+Process-wide deadline scheduler for active sessions.
+One task owns every session's time limit instead of one polling task per session.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config import TIME_CHECK_INTERVAL_SECONDS
+from database import DatabasePool, QuotaRepository
+from services.quota_ledger import SessionQuotaLedger
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledSession:
+    """Deadline bookkeeping for one session (one live heap entry at a time)."""
+
+    def __init__(
+        self,
+        ledger: SessionQuotaLedger,
+        warning_seconds: List[int],
+        on_warning: Callable[[int], Awaitable[None]],
+        on_deadline: Callable[[], Awaitable[None]],
+    ):
+        self.ledger = ledger
+        self.pending_warnings = sorted(set(warning_seconds), reverse=True)
+        self.on_warning = on_warning
+        self.on_deadline = on_deadline
+        self.version = 0
+        self.active = True
+
+
+class SessionDeadlineScheduler:
+    """
+    Min-heap of session deadlines driven by a single asyncio task.
+
+    Each tick pops every due entry, reloads stale ledgers with one batched
+    snapshot query, then fires warnings/deadlines and re-arms the entries.
+    Superseded heap items are skipped lazily via a per-entry version.
+    """
+
+    def __init__(self, db: DatabasePool, retry_interval: float = TIME_CHECK_INTERVAL_SECONDS):
+        """
+        Initialize deadline scheduler.
+
+        Args:
+            db: Database connection pool used for batched quota refreshes
+            retry_interval: Delay before retrying entries whose refresh failed
+        """
+        self.quota_repo = QuotaRepository(db)
+        self.retry_interval = retry_interval
+        self._heap: List[Tuple[float, int, ScheduledSession, int]] = []
+        self._entries: Set[ScheduledSession] = set()
+        self._counter = itertools.count()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._callbacks: Set[asyncio.Task] = set()
+        self.stats: Dict[str, Any] = {
+            "ticks": 0,
+            "last_tick_lag_ms": 0.0,
+            "max_tick_lag_ms": 0.0,
+            "refresh_batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "refresh_failures": 0,
+            "deadlines_fired": 0,
+            "warnings_fired": 0,
+        }
+
+    def schedule(
+        self,
+        ledger: SessionQuotaLedger,
+        warning_seconds: List[int],
+        on_warning: Callable[[int], Awaitable[None]],
+        on_deadline: Callable[[], Awaitable[None]],
+    ) -> ScheduledSession:
+        """
+        Start tracking a session's deadline.
+
+        Args:
+            ledger: Quota ledger of the session
+            warning_seconds: Seconds before the deadline at which on_warning fires
+            on_warning: Coroutine called with the warning threshold
+            on_deadline: Coroutine called once when time runs out
+
+        Returns:
+            Handle to pass to cancel()
+        """
+        entry = ScheduledSession(ledger, warning_seconds, on_warning, on_deadline)
+        self._entries.add(entry)
+        ledger.on_invalidate(lambda: self._push(entry, time.monotonic()))
+        self._push(entry, time.monotonic())
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return entry
+
+    def cancel(self, entry: ScheduledSession) -> None:
+        """Stop tracking a session; its heap item is dropped lazily."""
+        entry.active = False
+        self._entries.discard(entry)
+
+    def _push(self, entry: ScheduledSession, when: float) -> None:
+        """(Re)arm an entry, superseding any earlier heap item for it."""
+        if not entry.active:
+            return
+        entry.version += 1
+        heapq.heappush(self._heap, (when, next(self._counter), entry, entry.version))
+        if self._heap[0][2] is entry:
+            self._wake.set()
+
+    def _pop_due(self, now: float) -> Tuple[List[ScheduledSession], Optional[float]]:
+        """Pop all live entries due at `now`, returning them and the earliest due time."""
+        due: List[ScheduledSession] = []
+        earliest: Optional[float] = None
+        while self._heap and self._heap[0][0] <= now:
+            when, _, entry, version = heapq.heappop(self._heap)
+            if not entry.active or version != entry.version:
+                continue
+            due.append(entry)
+            if earliest is None:
+                earliest = when
+        return due, earliest
+
+    def _discard_superseded(self) -> None:
+        """Drop superseded items from the top of the heap."""
+        while self._heap:
+            _, _, entry, version = self._heap[0]
+            if entry.active and version == entry.version:
+                return
+            heapq.heappop(self._heap)
+
+    async def _run(self) -> None:
+        """Scheduler loop: sleep until the earliest deadline or an earlier re-arm."""
+        while True:
+            try:
+                self._wake.clear()
+                self._discard_superseded()
+                if not self._heap:
+                    await self._wake.wait()
+                    continue
+
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                now = time.monotonic()
+                due, earliest = self._pop_due(now)
+                if not due:
+                    continue
+
+                lag_ms = (now - earliest) * 1000
+                self.stats["ticks"] += 1
+                self.stats["last_tick_lag_ms"] = round(lag_ms, 3)
+                self.stats["max_tick_lag_ms"] = round(max(self.stats["max_tick_lag_ms"], lag_ms), 3)
+                await self._tick(due)
+
+            except asyncio.CancelledError:
+                logger.info("Deadline scheduler cancelled")
+                raise
+            except Exception as e:
+                logger.error("Error in deadline scheduler tick: %s", e)
+
+    async def _refresh_stale(self, entries: List[ScheduledSession]) -> None:
+        """Reload every stale ledger among `entries` with a single batched query."""
+        stale = [entry for entry in entries if entry.ledger.is_stale]
+        if not stale:
+            return
+
+        user_ids = sorted({entry.ledger.user_id for entry in stale})
+        self.stats["refresh_batches"] += 1
+        self.stats["last_batch_size"] = len(user_ids)
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(user_ids))
+
+        snapshots = await self.quota_repo.get_snapshots(user_ids)
+        if snapshots is None:
+            self.stats["refresh_failures"] += 1
+            return
+
+        for entry in stale:
+            snapshot = snapshots.get(entry.ledger.user_id)
+            if snapshot is not None:
+                entry.ledger.apply_snapshot(snapshot)
+
+    async def _tick(self, due: List[ScheduledSession]) -> None:
+        """Refresh, then fire warnings/deadlines and re-arm each due entry."""
+        await self._refresh_stale(due)
+        now = time.monotonic()
+
+        for entry in due:
+            if not entry.active:
+                continue
+            if entry.ledger.is_stale:
+                # Refresh failed; try again later rather than cutting the session off
+                self._push(entry, now + self.retry_interval)
+                continue
+
+            deadline = entry.ledger.deadline_from_baseline()
+            if now >= deadline:
+                self.cancel(entry)
+                self.stats["deadlines_fired"] += 1
+                self._spawn(entry.on_deadline())
+                continue
+
+            while entry.pending_warnings and deadline - now <= entry.pending_warnings[0]:
+                self.stats["warnings_fired"] += 1
+                self._spawn(entry.on_warning(entry.pending_warnings.pop(0)))
+
+            next_wake = deadline
+            if entry.pending_warnings:
+                next_wake = deadline - entry.pending_warnings[0]
+            self._push(entry, next_wake)
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        """Run a session callback without blocking the scheduler loop."""
+        task = asyncio.create_task(coro)
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get active deadline count, heap size, tick lag and refresh batch sizes."""
+        return {
+            **self.stats,
+            "active_deadlines": len(self._entries),
+            "heap_size": len(self._heap),
+        }
+
+    async def aclose(self) -> None:
+        """Stop the scheduler loop."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+# Process-wide scheduler (created on first use with the worker's pool)
+_scheduler: Optional[SessionDeadlineScheduler] = None
+
+
+def get_deadline_scheduler(db: DatabasePool) -> SessionDeadlineScheduler:
+    """
+    Get the process-wide deadline scheduler, creating it on first use.
+
+    Args:
+        db: Database connection pool
+
+    Returns:
+        Shared SessionDeadlineScheduler instance
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = SessionDeadlineScheduler(db)
+    return _scheduler
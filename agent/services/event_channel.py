@@ -0,0 +1,392 @@
+"""
+Persistent session event channel to the Node.js server.
+Streams session state events of every session in this process over one
+socket (AGENT_EVENT_SOCKET) as newline-delimited JSON frames acked by Node,
+instead of one HTTP POST per event. See src/modules/agent/channel.js.
+
+With AGENT_EVENT_SECRET set, each connection first sends {"auth": secret}
+and waits for Node's {"auth": true}; Node refuses non-loopback TCP without it.
+"""
+
+import argparse
+import asyncio
+import hmac
+import itertools
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from config import (
+    EVENT_CHANNEL_ACK_TIMEOUT_SECONDS,
+    EVENT_CHANNEL_MAX_BACKOFF_SECONDS,
+    EVENT_CHANNEL_MAX_FRAME_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _is_unix_address(address: str) -> bool:
+    """Check whether an address is a Unix socket path (otherwise it is host:port)."""
+    return "/" in address
+
+
+def _unix_path(address: str) -> str:
+    return address[len("unix:"):] if address.startswith("unix:") else address
+
+
+def _tcp_target(address: str) -> tuple:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+class SessionEventChannel:
+    """
+    Client side of the agent event channel.
+
+    One connection carries the events of all sessions; each frame has an id
+    and Node answers it with an ack for that id, so a send costs one frame
+    write, and write() pipelines frames without waiting for each ack in
+    turn. The connection is re-established with backoff whenever it is lost.
+    send() returns None whenever the channel cannot say whether Node took the
+    event (not connected, connection lost, ack overdue), and callers fall
+    back to the HTTP endpoint.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        secret: str = "",
+        ack_timeout: float = EVENT_CHANNEL_ACK_TIMEOUT_SECONDS,
+        max_backoff: float = EVENT_CHANNEL_MAX_BACKOFF_SECONDS,
+    ):
+        """
+        Initialize channel.
+
+        Args:
+            address: Unix socket path, or host:port for TCP
+            secret: Shared secret sent before any frame (AGENT_EVENT_SECRET)
+            ack_timeout: Seconds to wait for an ack before giving up on the frame
+            max_backoff: Maximum delay between reconnect attempts
+        """
+        self.address = address
+        self.secret = secret
+        self.ack_timeout = ack_timeout
+        self.max_backoff = max_backoff
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lost = asyncio.Event()
+        self.stats: Dict[str, int] = {
+            "frames": 0,
+            "acked": 0,
+            "nacked": 0,
+            "ack_timeouts": 0,
+            "connects": 0,
+        }
+
+    @property
+    def connected(self) -> bool:
+        """Check whether frames can be written right now."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    def start(self) -> None:
+        """Start connecting (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _open(self):
+        if _is_unix_address(self.address):
+            return await asyncio.open_unix_connection(
+                _unix_path(self.address), limit=EVENT_CHANNEL_MAX_FRAME_BYTES
+            )
+        host, port = _tcp_target(self.address)
+        return await asyncio.open_connection(host, port, limit=EVENT_CHANNEL_MAX_FRAME_BYTES)
+
+    async def _authenticate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Present the shared secret and wait for Node to accept it."""
+        writer.write(json.dumps({"auth": self.secret}).encode("utf-8") + b"\n")
+        await writer.drain()
+        reply = await asyncio.wait_for(reader.readline(), self.ack_timeout)
+        try:
+            accepted = json.loads(reply).get("auth") is True if reply else False
+        except ValueError:
+            accepted = False
+        if not accepted:
+            raise ConnectionError("session event channel refused AGENT_EVENT_SECRET")
+
+    async def _run(self) -> None:
+        """Keep the channel connected, reconnecting with backoff."""
+        backoff = 1.0
+        while True:
+            try:
+                reader, writer = await self._open()
+                if self.secret:
+                    try:
+                        await self._authenticate(reader, writer)
+                    except BaseException:
+                        writer.close()
+                        raise
+                self._lost.clear()
+                self._writer = writer
+                self.stats["connects"] += 1
+                backoff = 1.0
+                logger.info("✅ Session event channel connected to %s", self.address)
+                await self._read_acks(reader)
+                logger.warning("Session event channel to %s closed, reconnecting", self.address)
+            except asyncio.CancelledError:
+                raise
+            except ConnectionError as e:
+                logger.warning("Session event channel to %s unavailable: %s", self.address, e)
+            except Exception as e:
+                logger.debug("Session event channel to %s unavailable: %s", self.address, e)
+            finally:
+                await self._close_connection()
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _read_acks(self, reader: asyncio.StreamReader) -> None:
+        """Resolve pending frames from acks until the connection closes or is dropped."""
+        lost = asyncio.ensure_future(self._lost.wait())
+        try:
+            while True:
+                line = asyncio.ensure_future(reader.readline())
+                await asyncio.wait({line, lost}, return_when=asyncio.FIRST_COMPLETED)
+                if not line.done():
+                    line.cancel()
+                    return
+                frame = line.result()
+                if not frame:
+                    return
+                try:
+                    ack = json.loads(frame)
+                except ValueError:
+                    logger.warning("Ignoring malformed ack on session event channel")
+                    continue
+                waiter = self._pending.pop(ack.get("ack"), None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(bool(ack.get("ok")))
+        finally:
+            lost.cancel()
+
+    async def _close_connection(self) -> None:
+        """Close the connection and release every frame still waiting for an ack."""
+        writer, self._writer = self._writer, None
+        pending, self._pending = self._pending, {}
+        for waiter in pending.values():
+            if not waiter.done():
+                waiter.set_result(None)
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def send(
+        self,
+        user_id: int,
+        state: str,
+        call_id: Optional[str] = None,
+        message: Optional[str] = None,
+    ) -> Optional[bool]:
+        """
+        Send a session state event and wait for Node's ack.
+
+        Args:
+            user_id: User ID to send the event to
+            state: Session state
+            call_id: Optional call/room identifier
+            message: Optional message to display to user
+
+        Returns:
+            True if Node emitted the event, False if it refused it, None if the
+            outcome is unknown (use the HTTP endpoint instead)
+        """
+        ack = await self.write(user_id, state, call_id, message)
+        if ack is None:
+            return None
+        return await ack
+
+    async def write(
+        self,
+        user_id: int,
+        state: str,
+        call_id: Optional[str] = None,
+        message: Optional[str] = None,
+    ) -> "Optional[asyncio.Future[Optional[bool]]]":
+        """
+        Write a session state event without waiting for Node's ack.
+
+        Frames are written in call order on the one connection, and Node
+        handles each user's frames in that order, so a caller may write the
+        next event of a user while the previous one's ack is still out.
+
+        Args:
+            user_id: User ID to send the event to
+            state: Session state
+            call_id: Optional call/room identifier
+            message: Optional message to display to user
+
+        Returns:
+            Future resolving to the outcome send() would return, or None if the
+            frame could not be written (use the HTTP endpoint instead)
+        """
+        if not self.connected:
+            return None
+
+        frame_id = next(self._ids)
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending[frame_id] = waiter
+        frame = {"id": frame_id, "user_id": user_id, "state": state, "call_id": call_id, "message": message}
+        try:
+            self._writer.write(json.dumps(frame).encode("utf-8") + b"\n")
+            await self._writer.drain()
+        except (ConnectionError, OSError) as e:
+            logger.warning("Session event channel write failed: %s", e)
+            self._pending.pop(frame_id, None)
+            self._lost.set()
+            return None
+        self.stats["frames"] += 1
+        return asyncio.ensure_future(self._await_ack(frame_id, waiter, user_id, state))
+
+    async def _await_ack(
+        self, frame_id: int, waiter: asyncio.Future, user_id: int, state: str
+    ) -> Optional[bool]:
+        """Wait (bounded) for a written frame's ack."""
+        try:
+            delivered = await asyncio.wait_for(asyncio.shield(waiter), self.ack_timeout)
+        except asyncio.TimeoutError:
+            # A stuck connection is worse than none: drop it and let _run reconnect
+            self.stats["ack_timeouts"] += 1
+            logger.warning("No ack for session state '%s' of user %s, dropping channel", state, user_id)
+            self._lost.set()
+            return None
+        finally:
+            self._pending.pop(frame_id, None)
+
+        if delivered is not None:
+            self.stats["acked" if delivered else "nacked"] += 1
+        return delivered
+
+    async def aclose(self) -> None:
+        """Stop reconnecting and close the connection."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self._close_connection()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get frame/ack counters and the connection state."""
+        return {**self.stats, "connected": self.connected, "pending": len(self._pending)}
+
+
+# Process-wide channel (created on first use)
+_channel: Optional[SessionEventChannel] = None
+
+
+def get_session_event_channel(address: str, secret: str = "") -> SessionEventChannel:
+    """
+    Get the process-wide session event channel, starting it if needed.
+    Safe to call for every session; the channel is created once.
+
+    Args:
+        address: Unix socket path, or host:port for TCP
+        secret: Shared secret Node expects (AGENT_EVENT_SECRET)
+
+    Returns:
+        Shared SessionEventChannel instance
+    """
+    global _channel
+    if _channel is None:
+        _channel = SessionEventChannel(address, secret)
+    _channel.start()
+    return _channel
+
+
+async def serve_stand_in(
+    address: str, ack_delay: float = 0.0, ok: bool = True, secret: str = ""
+) -> None:
+    """
+    Run a stand-in for Node's side of the channel, acking every frame.
+
+    For local tests and benchmarks of the agent without the Node server:
+        python -m services.event_channel /tmp/agent-events.sock
+
+    Args:
+        address: Unix socket path, or host:port for TCP
+        ack_delay: Seconds to wait before acking (simulates Socket.IO fan-out)
+        ok: Ack value to send
+        secret: Shared secret connections must present first, as Node does
+    """
+    received = itertools.count(1)
+    connections = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        logger.info("Stand-in: agent connected")
+        connections.add(writer)
+
+        async def ack(frame: Dict[str, Any]) -> None:
+            if ack_delay:
+                await asyncio.sleep(ack_delay)
+            if not writer.is_closing():
+                writer.write(json.dumps({"ack": frame.get("id"), "ok": ok}).encode("utf-8") + b"\n")
+
+        try:
+            if secret:
+                hello = await reader.readline()
+                try:
+                    given = json.loads(hello).get("auth") if hello else None
+                except ValueError:
+                    given = None
+                if not isinstance(given, str) or not hmac.compare_digest(given, secret):
+                    logger.warning("Stand-in: connection failed authentication")
+                    writer.write(b'{"auth": false, "error": "unauthorized"}\n')
+                    return
+                writer.write(b'{"auth": true}\n')
+            while line := await reader.readline():
+                frame = json.loads(line)
+                logger.info(
+                    "Stand-in: #%d %s for user %s (call_id=%s)",
+                    next(received), frame.get("state"), frame.get("user_id"), frame.get("call_id"),
+                )
+                asyncio.create_task(ack(frame))
+        finally:
+            logger.info("Stand-in: agent disconnected")
+            connections.discard(writer)
+            writer.close()
+
+    if _is_unix_address(address):
+        if os.path.exists(_unix_path(address)):
+            os.unlink(_unix_path(address))
+        server = await asyncio.start_unix_server(handle, _unix_path(address))
+    else:
+        host, port = _tcp_target(address)
+        server = await asyncio.start_server(handle, host, port)
+    logger.info("Stand-in session event server listening on %s", address)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        # Stopping the stand-in drops its connections too, like a Node restart
+        for writer in list(connections):
+            writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in for Node's agent event channel")
+    parser.add_argument("address", help="Unix socket path, or host:port")
+    parser.add_argument("--ack-delay", type=float, default=0.0, help="Seconds before each ack")
+    parser.add_argument("--nack", action="store_true", help="Refuse every event")
+    parser.add_argument(
+        "--secret", default=os.getenv("AGENT_EVENT_SECRET", ""), help="Require this shared secret"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve_stand_in(args.address, args.ack_delay, not args.nack, args.secret))
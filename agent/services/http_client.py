@@ -0,0 +1,116 @@
+"""
+Shared HTTP clients.
+One long-lived httpx.AsyncClient per origin, so repeated calls to Gemini and
+the Node API reuse kept-alive connections instead of paying DNS/TCP/TLS each time.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from config import (
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientRegistry:
+    """
+    Process-wide registry of httpx clients keyed by origin (scheme, host, port).
+
+    Each origin gets its own connection pool, which bounds the connections
+    opened to any single host. Clients are bound to the event loop that created
+    them and are recreated if used from another (or after aclose()).
+    """
+
+    def __init__(self):
+        """Initialize registry with the default limits (see configure())."""
+        self.http2 = False
+        self.limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        self._clients: Dict[Tuple[str, str, Optional[int]], Tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+        self.stats: Dict[str, int] = {"created": 0, "reused": 0}
+
+    def configure(
+        self,
+        http2: bool = False,
+        max_connections: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    ) -> None:
+        """
+        Set options for clients created from now on.
+
+        Args:
+            http2: Negotiate HTTP/2 where the server supports it (needs the h2 package)
+            max_connections: Connection limit per origin
+            max_keepalive_connections: Idle connections kept per origin
+            keepalive_expiry: Seconds an idle connection is kept
+        """
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """
+        Get the shared client for a URL's origin.
+
+        Args:
+            url: Any URL on the origin (only scheme, host and port are used)
+
+        Returns:
+            Long-lived AsyncClient (do not close it; use aclose() on shutdown)
+        """
+        parsed = httpx.URL(url)
+        key = (parsed.scheme, parsed.host, parsed.port)
+        loop = asyncio.get_running_loop()
+
+        entry = self._clients.get(key)
+        if entry is not None:
+            client, client_loop = entry
+            if not client.is_closed and client_loop is loop:
+                self.stats["reused"] += 1
+                return client
+
+        client = httpx.AsyncClient(http2=self.http2, limits=self.limits)
+        self._clients[key] = (client, loop)
+        self.stats["created"] += 1
+        logger.debug("Created HTTP client for %s://%s (http2=%s)", parsed.scheme, parsed.host, self.http2)
+        return client
+
+    async def aclose(self) -> None:
+        """Close every client (e.g. when the job process drains); get() creates fresh ones afterwards."""
+        clients, self._clients = self._clients, {}
+        loop = asyncio.get_running_loop()
+        for client, client_loop in clients.values():
+            if client_loop is not loop or client.is_closed:
+                continue
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning("Error closing HTTP client: %s", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get client creation/reuse counters and the number of open clients."""
+        return {**self.stats, "clients": len(self._clients), "http2": self.http2}
+
+
+# Process-wide registry
+http_clients = HttpClientRegistry()
@@ -0,0 +1,250 @@
+"""
+Session state outbox relay.
+Delivers the events TranscriptService commits to agent_outbox together with
+the transcript (SESSION_SAVED), so a save is never left without its event,
+whatever happens to the process that saved it.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from config import (
+    Config,
+    SESSION_STATE_SAVED,
+    SESSION_SAVED_MESSAGE,
+    OUTBOX_CHANGED_CHANNEL,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_POLL_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+)
+from database import DatabasePool, DatabaseListener, OutboxRepository, OutboxEvent
+from services.session_events import session_events
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """
+    Background task draining agent_outbox in batches.
+
+    Claimed events are handed to the session event dispatcher and deleted
+    once it reports them delivered. Events not delivered within the lease
+    (the dispatcher is still retrying, or this process died) are claimed
+    again, by this or any other agent process, and events claimed
+    max_attempts times are abandoned. A pass runs on NOTIFY from the outbox
+    trigger, on wake(), and every poll interval. New events are held back
+    from passes for a grace period: the process that saved them sends them
+    first with relay_saved() (no claim), on the same per-user lane as the
+    session's SAVING_CONVERSATION, so SESSION_SAVED cannot overtake it.
+
+    Delivery to Node is at-least-once, not exactly-once: an event delivered
+    just as its lease runs out, or resent over HTTP after a channel ack
+    timeout, reaches Node again. Node drops repeats of the same (user_id,
+    call_id, state) for 10 minutes (src/modules/agent/service.js), so the
+    frontend sees each state of a call once per Node process.
+    """
+
+    def __init__(
+        self,
+        db: DatabasePool,
+        api_url: str,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+        poll_interval: float = OUTBOX_POLL_SECONDS,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    ):
+        """
+        Initialize relay.
+
+        Args:
+            db: Database connection pool
+            api_url: Node.js API server URL
+            batch_size: Events claimed per batch
+            lease_seconds: How long a claimed event may take to be delivered
+            poll_interval: Delay between passes without a wake-up
+            max_attempts: Claims per event before it is abandoned
+        """
+        self.outbox_repo = OutboxRepository(db)
+        self.api_url = api_url
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._settling: Set[asyncio.Task] = set()
+        self._watching = False
+        self.stats: Dict[str, int] = {
+            "claimed": 0,
+            "sent_unclaimed": 0,
+            "delivered": 0,
+            "redelivered": 0,
+            "abandoned": 0,
+            "lease_expired": 0,
+        }
+
+    def start(self) -> None:
+        """Start the relay loop; the first pass picks up events left by earlier runs."""
+        if self._task is None or self._task.done():
+            self._wake.set()
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self) -> None:
+        """Run a pass now (e.g. right after a save committed its event)."""
+        self._wake.set()
+
+    def watch(self, listener: DatabaseListener) -> None:
+        """Wake on the outbox NOTIFY, and after reconnects (notifications may have been missed)."""
+        if self._watching:
+            return
+        self._watching = True
+        listener.subscribe(OUTBOX_CHANGED_CHANNEL, lambda _payload: self.wake())
+        listener.on_reconnect(self.wake)
+
+    async def _run(self) -> None:
+        """Relay loop: drain the outbox when woken, or after the poll interval."""
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+                # Keep claiming while full batches come back
+                while await self.relay_batch() >= self.batch_size:
+                    pass
+
+            except asyncio.CancelledError:
+                logger.info("Outbox relay cancelled")
+                raise
+            except Exception as e:
+                logger.error("Error in outbox relay: %s", e)
+
+    async def relay_batch(self) -> int:
+        """
+        Claim one batch of available events and hand it to the dispatcher.
+
+        Deliveries are settled in the background, so the next batch can be
+        claimed without waiting on them.
+
+        Returns:
+            Number of events claimed
+        """
+        events = await self.outbox_repo.claim(self.batch_size, self.lease_seconds)
+        self._hand_over(events)
+        return len(events)
+
+    def relay_saved(self, user_id: int, call_id: str) -> "asyncio.Future[bool]":
+        """
+        Send the SESSION_SAVED this process just committed, without claiming it first.
+
+        Its outbox row is deleted in the background once the event is delivered.
+        Until then it is only held back by the grace period, so if delivery fails
+        (or this process dies) a relay claims and sends it afterwards.
+
+        Args:
+            user_id: User ID to send the event to
+            call_id: Call/room identifier of the saved session
+
+        Returns:
+            Delivery handle (see SessionStateDispatcher.dispatch)
+        """
+        delivery = session_events.dispatch(
+            user_id, SESSION_STATE_SAVED, self.api_url, call_id, SESSION_SAVED_MESSAGE
+        )
+        self.stats["sent_unclaimed"] += 1
+        task = asyncio.create_task(self._settle_unclaimed(call_id, delivery))
+        self._settling.add(task)
+        task.add_done_callback(self._settling.discard)
+        return delivery
+
+    async def _settle_unclaimed(self, call_id: str, delivery: asyncio.Future) -> None:
+        """Delete an event sent by relay_saved() once delivered; otherwise leave it to the relays."""
+        await asyncio.wait([delivery], timeout=self.lease_seconds)
+        if not (delivery.done() and delivery.result()):
+            return
+        self.stats["delivered"] += 1
+        try:
+            await self.outbox_repo.complete_unclaimed([call_id], SESSION_STATE_SAVED)
+        except Exception as e:
+            # Left in the outbox: a relay delivers it again once the grace period ends
+            logger.warning("Could not complete outbox event of call %s: %s", call_id, e)
+
+    def _hand_over(self, events: List[OutboxEvent]) -> None:
+        """Dispatch claimed events and settle them in the background."""
+        if not events:
+            return
+
+        self.stats["claimed"] += len(events)
+        self.stats["redelivered"] += sum(1 for event in events if event.attempts > 1)
+        deliveries = [
+            session_events.dispatch(event.user_id, event.state, self.api_url, event.call_id, event.message)
+            for event in events
+        ]
+        task = asyncio.create_task(self._settle(events, deliveries))
+        self._settling.add(task)
+        task.add_done_callback(self._settling.discard)
+
+    async def _settle(self, events: List[OutboxEvent], deliveries: List[asyncio.Future]) -> None:
+        """Delete events once delivered (or abandoned); leave the rest to expire and be claimed again."""
+        # Stop waiting a little before the lease ends, so completion beats a second claim
+        await asyncio.wait(deliveries, timeout=max(self.lease_seconds - 1, 0.1))
+
+        done_ids = []
+        for event, delivery in zip(events, deliveries):
+            if delivery.done() and delivery.result():
+                self.stats["delivered"] += 1
+                done_ids.append(event.id)
+            elif event.attempts >= self.max_attempts:
+                self.stats["abandoned"] += 1
+                logger.error(
+                    "Abandoning outbox event %d ('%s' for user %s, call_id=%s) after %d attempts",
+                    event.id, event.state, event.user_id, event.call_id, event.attempts,
+                )
+                done_ids.append(event.id)
+            else:
+                self.stats["lease_expired"] += 1
+
+        try:
+            await self.outbox_repo.complete(done_ids)
+        except Exception as e:
+            # Left in the outbox: the events are delivered again after the lease
+            logger.warning("Could not complete %d outbox events: %s", len(done_ids), e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get relay counters and the number of batches still settling."""
+        return {**self.stats, "settling": len(self._settling)}
+
+    async def aclose(self) -> None:
+        """Stop the relay loop; unsettled events stay in the outbox for the next claim."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+
+# Process-wide relay (created on first use with the worker's pool)
+_relay: Optional[OutboxRelay] = None
+
+
+def get_outbox_relay(db: DatabasePool, config: Config) -> OutboxRelay:
+    """
+    Get the process-wide outbox relay, creating it on first use.
+
+    Args:
+        db: Database connection pool
+        config: Application configuration
+
+    Returns:
+        Shared OutboxRelay instance
+    """
+    global _relay
+    if _relay is None:
+        _relay = OutboxRelay(db, config.api.node_api_url)
+    return _relay
@@ -0,0 +1,212 @@
+"""
+In-memory quota ledger for active sessions.
+Counts session time locally and only re-reads the database when invalidated.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from config import QUOTA_POLL_BASELINE_SECONDS, SUBSCRIPTION_CHANGED_CHANNEL
+from database import DatabaseListener, QuotaSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class SessionQuotaLedger:
+    """
+    Tracks remaining quota for one active session.
+
+    The baseline usage comes from a QuotaSnapshot loaded at admission; time spent
+    in the session itself is measured with a monotonic clock, since nothing is
+    written to the database until the session is saved.
+    """
+
+    def __init__(
+        self,
+        time_limit_service,
+        user_id: int,
+        session_type: str,
+        snapshot: Optional[QuotaSnapshot] = None,
+        registry: Optional["QuotaLedgerRegistry"] = None,
+    ):
+        """
+        Initialize session quota ledger.
+
+        Args:
+            time_limit_service: TimeLimitService used to reload snapshots
+            user_id: User identifier
+            session_type: Type of session (call, practice, roleplay)
+            snapshot: Baseline snapshot loaded at admission, if already available
+            registry: Registry tracking ledgers per user (defaults to the process-wide one)
+        """
+        self.time_limit_service = time_limit_service
+        self.user_id = user_id
+        self.session_type = session_type
+        self.snapshot = snapshot
+        self.registry = registry if registry is not None else quota_ledgers
+        self._started_at = time.monotonic()
+        self._stale = snapshot is None
+        self._db_reads = 0
+        self._invalidation_callbacks: List[Callable[[], None]] = []
+
+    def start_clock(self) -> None:
+        """Reset the session clock (call when the session actually starts)."""
+        self._started_at = time.monotonic()
+
+    def elapsed_seconds(self) -> int:
+        """Get seconds spent in the current session."""
+        return int(time.monotonic() - self._started_at)
+
+    def invalidate(self, reason: str = "") -> None:
+        """Mark the baseline as stale so the next read reloads it from the database."""
+        if not self._stale:
+            logger.info(
+                "Quota ledger invalidated for user %s (%s)", self.user_id, reason or "unspecified"
+            )
+        self._stale = True
+        self.registry.stats["invalidations"] += 1
+        for callback in self._invalidation_callbacks:
+            callback()
+
+    def on_invalidate(self, callback: Callable[[], None]) -> None:
+        """Register a callback run whenever the baseline is invalidated."""
+        self._invalidation_callbacks.append(callback)
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether the baseline must be reloaded before it can be trusted."""
+        return self._stale or self.snapshot is None
+
+    def apply_snapshot(self, snapshot: QuotaSnapshot) -> None:
+        """Install a baseline read from the database elsewhere (e.g. by a batched refresh)."""
+        self.snapshot = snapshot
+        self._stale = False
+        self._count_db_read()
+
+    def deadline_from_baseline(self) -> float:
+        """
+        Get the monotonic deadline from the current baseline without touching the database.
+        Callers must make sure the ledger is not stale first.
+        """
+        return self._started_at + self.snapshot.remaining_for(self.session_type)
+
+    async def refresh(self) -> QuotaSnapshot:
+        """Reload the baseline snapshot from the database."""
+        self.snapshot = await self.time_limit_service.get_quota_snapshot(self.user_id)
+        self._stale = False
+        self._count_db_read()
+        return self.snapshot
+
+    def _count_db_read(self) -> None:
+        """Count a database read of this session's baseline."""
+        self._db_reads += 1
+        self.registry.stats["db_reads"] += 1
+
+    def reads_avoided(self) -> int:
+        """
+        Get the database reads this session saved compared to the per-session poll,
+        which read the quota every QUOTA_POLL_BASELINE_SECONDS of the session.
+        """
+        polls = self.elapsed_seconds() // QUOTA_POLL_BASELINE_SECONDS
+        return max(polls - self._db_reads, 0)
+
+    async def _baseline(self) -> QuotaSnapshot:
+        """Get the baseline snapshot, reloading it only if stale."""
+        if self._stale or self.snapshot is None:
+            return await self.refresh()
+        return self.snapshot
+
+    async def deadline(self) -> float:
+        """
+        Get the monotonic time at which this session's quota runs out.
+
+        Returns:
+            Deadline on the time.monotonic() clock
+        """
+        snapshot = await self._baseline()
+        return self._started_at + snapshot.remaining_for(self.session_type)
+
+    async def remaining(self) -> int:
+        """
+        Get remaining seconds for this session.
+
+        Returns:
+            Remaining seconds (0 if exceeded)
+        """
+        snapshot = await self._baseline()
+        return snapshot.remaining_for(self.session_type, self.elapsed_seconds())
+
+
+class QuotaLedgerRegistry:
+    """
+    Process-wide index of active ledgers by user, with read counters.
+
+    reads_avoided is settled when a session ends: the polls the per-session
+    check would have made over its lifetime, less the reads its ledger made.
+    """
+
+    def __init__(self):
+        self._ledgers: Dict[int, Set[SessionQuotaLedger]] = {}
+        self._watching = False
+        self.stats: Dict[str, int] = {
+            "db_reads": 0,
+            "reads_avoided": 0,
+            "invalidations": 0,
+        }
+
+    def register(self, ledger: SessionQuotaLedger) -> None:
+        """
+        Register a ledger for an active session.
+        Other sessions of the same user are invalidated, since they now share quota.
+        """
+        existing = self._ledgers.setdefault(ledger.user_id, set())
+        for other in existing:
+            other.invalidate("concurrent session started")
+        if existing:
+            ledger.invalidate("concurrent session active")
+        existing.add(ledger)
+
+    def unregister(self, ledger: SessionQuotaLedger) -> None:
+        """Remove a ledger when its session ends, settling its avoided reads."""
+        ledgers = self._ledgers.get(ledger.user_id)
+        if not ledgers or ledger not in ledgers:
+            return
+        ledgers.discard(ledger)
+        self.stats["reads_avoided"] += ledger.reads_avoided()
+        if not ledgers:
+            del self._ledgers[ledger.user_id]
+
+    def invalidate_user(self, user_id: int, reason: str = "") -> None:
+        """Invalidate every active ledger of a user (e.g. after a plan change)."""
+        for ledger in self._ledgers.get(user_id, ()):
+            ledger.invalidate(reason)
+
+    def watch(self, listener: DatabaseListener) -> None:
+        """
+        Invalidate a user's ledgers when their subscription changes, so a plan
+        bought or cancelled mid-session takes effect on the running deadline.
+        """
+        if self._watching:
+            return
+        self._watching = True
+        listener.subscribe(SUBSCRIPTION_CHANGED_CHANNEL, self._on_subscription_changed)
+
+    def _on_subscription_changed(self, payload: str) -> None:
+        """Handle a subscription_changed notification (payload: user_id)."""
+        try:
+            user_id = int(payload)
+        except ValueError:
+            return
+        self.invalidate_user(user_id, "subscription changed")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get read counters and the number of active ledgers."""
+        return {
+            **self.stats,
+            "active_ledgers": sum(len(ledgers) for ledgers in self._ledgers.values()),
+        }
+
+
+# Process-wide registry shared by all sessions in this worker
+quota_ledgers = QuotaLedgerRegistry()
@@ -0,0 +1,494 @@
+"""
+Session state event dispatcher.
+Queues SAVING/SAVED/FAILED events for the Node.js server and delivers them in
+the background: coalesced per call, retried with jittered backoff, in order
+per user, and short-circuited while Node is down. Events are published in
+the user's LiveKit room when it is registered and the user is still in it;
+otherwise they go to Node over the persistent event channel when it is
+connected, and over HTTP if not.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from config import (
+    SESSION_STATE_SAVING,
+    SESSION_STATE_SAVED,
+    SESSION_STATE_FAILED,
+    SESSION_SAVED_MESSAGE,
+    SESSION_EVENT_QUEUE_MAX,
+    SESSION_EVENT_MAX_ATTEMPTS,
+    SESSION_EVENT_RETRY_BASE_SECONDS,
+    SESSION_EVENT_RETRY_MAX_SECONDS,
+    SESSION_EVENT_BREAKER_THRESHOLD,
+    SESSION_EVENT_BREAKER_RESET_SECONDS,
+    SESSION_EVENT_DRAIN_SECONDS,
+)
+from services.socket_service import emit_session_state, publish_session_state
+from services.event_channel import SessionEventChannel
+
+logger = logging.getLogger(__name__)
+
+# Queue order across users (used to find the oldest event on overflow)
+_sequence = itertools.count()
+
+
+@dataclass
+class SessionStateEvent:
+    """A queued session state event and the handles waiting on its delivery."""
+
+    user_id: int
+    state: str
+    api_url: str
+    call_id: Optional[str] = None
+    message: Optional[str] = None
+    attempts: int = 0
+    superseded: bool = False
+    backoff: bool = False
+    waiters: List[asyncio.Future] = field(default_factory=list)
+    seq: int = field(default_factory=lambda: next(_sequence))
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def resolve(self, delivered: bool) -> None:
+        """Resolve every handle waiting on this event."""
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(delivered)
+        self.waiters.clear()
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Opens after `threshold` failures in a row; while open, calls are refused
+    without touching the network. After `reset_seconds` one probe is let
+    through (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.opens = 0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """Get "closed", "open" or "half_open"."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def retry_in(self) -> float:
+        """Get the seconds until a probe is let through again (0 if not open)."""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0)
+
+    def allow(self) -> bool:
+        """Check whether a call may go out now."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of an allowed call."""
+        self._probing = False
+        if success:
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                self.opens += 1
+                logger.warning("Session state events: Node API failing, opening circuit breaker")
+            self.opened_at = time.monotonic()
+
+
+class SessionStateDispatcher:
+    """
+    Fire-and-forget delivery of session state events.
+
+    Events of one user are delivered in order by that user's lane (one task
+    per user with pending events). Over the persistent channel the lane only
+    waits for a frame to be written, not acked, so a SESSION_SAVED queued
+    while SAVING_CONVERSATION is still in flight goes out right behind it
+    instead of a Node round trip later. A pipelined event that Node refuses
+    (or whose outcome is unknown) goes back to the front of the lane, unless
+    a newer event of the same call has been sent since; only then can it
+    reach Node after a later event of another call.
+
+    An event still queued, or waiting to be retried, is replaced by a newer
+    event for the same call_id, so the frontend only sees the latest state
+    after an outage. The total number of queued events is bounded; past the
+    bound the oldest queued event is dropped.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = SESSION_EVENT_QUEUE_MAX,
+        max_attempts: int = SESSION_EVENT_MAX_ATTEMPTS,
+        retry_base: float = SESSION_EVENT_RETRY_BASE_SECONDS,
+        retry_max: float = SESSION_EVENT_RETRY_MAX_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        Initialize dispatcher.
+
+        Args:
+            max_queue: Maximum number of queued events (all users)
+            max_attempts: Delivery attempts per event before it is dropped
+            retry_base: First retry delay in seconds (doubles per attempt, with full jitter)
+            retry_max: Cap on the retry delay
+            breaker: Circuit breaker for the Node API
+        """
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.breaker = breaker or CircuitBreaker(
+            SESSION_EVENT_BREAKER_THRESHOLD, SESSION_EVENT_BREAKER_RESET_SECONDS
+        )
+        self._lanes: Dict[int, Deque[SessionStateEvent]] = {}
+        self._current: Dict[int, SessionStateEvent] = {}
+        self._unacked: Dict[int, List[SessionStateEvent]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._acks: Set[asyncio.Task] = set()
+        self._queued = 0
+        self.channel: Optional[SessionEventChannel] = None
+        self.stats: Dict[str, int] = {
+            "dispatched": 0,
+            "delivered": 0,
+            "via_room": 0,
+            "via_channel": 0,
+            "pipelined": 0,
+            "http_fallbacks": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "short_circuited": 0,
+            "dropped_overflow": 0,
+            "dropped_exhausted": 0,
+            "max_depth": 0,
+        }
+
+    def use_channel(self, channel: Optional[SessionEventChannel]) -> None:
+        """Send events over a persistent channel when it is connected (None: HTTP only)."""
+        self.channel = channel
+
+    def dispatch(
+        self,
+        user_id: int,
+        state: str,
+        api_url: str,
+        call_id: Optional[str] = None,
+        message: Optional[str] = None,
+    ) -> "asyncio.Future[bool]":
+        """
+        Queue a session state event.
+
+        Args:
+            user_id: User ID to send the event to
+            state: Session state (SAVING_CONVERSATION, SESSION_SAVED, SESSION_SAVE_FAILED)
+            api_url: Node.js API server URL
+            call_id: Optional call/room identifier (events of one call coalesce)
+            message: Optional message to display to user
+
+        Returns:
+            Handle resolving to True once delivered (or once a newer event for the
+            same call is), False if it is dropped; awaiting it is optional
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        event = SessionStateEvent(user_id, state, api_url, call_id, message, waiters=[waiter])
+        self.stats["dispatched"] += 1
+
+        lane = self._lanes.setdefault(user_id, deque())
+        if call_id is not None and self._coalesce(lane, event):
+            return waiter
+
+        if self._queued >= self.max_queue:
+            self._drop_oldest()
+        lane.append(event)
+        self._queued += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], self._queued)
+
+        self._ensure_worker(user_id)
+        return waiter
+
+    def _ensure_worker(self, user_id: int) -> None:
+        """Start the user's lane task unless it is running."""
+        worker = self._workers.get(user_id)
+        if worker is None or worker.done():
+            self._workers[user_id] = asyncio.create_task(self._run_lane(user_id))
+
+    def _coalesce(self, lane: Deque[SessionStateEvent], event: SessionStateEvent) -> bool:
+        """Let `event` supersede an undelivered event of the same call, keeping its place."""
+        current = self._current.get(event.user_id)
+        if current is not None and current.call_id == event.call_id and not current.superseded:
+            # Waiting to be retried: stop retrying it, the newer state goes out instead
+            current.superseded = True
+            current.wake.set()
+            event.waiters.extend(current.waiters)
+            current.waiters.clear()
+            self.stats["coalesced"] += 1
+
+        # Written but not acked: the newer state goes out behind it, so a refused
+        # older one is not sent again, and its handles follow the newer event
+        for unacked in self._unacked.get(event.user_id, ()):
+            if unacked.call_id == event.call_id and not unacked.superseded:
+                unacked.superseded = True
+                event.waiters.extend(unacked.waiters)
+                unacked.waiters.clear()
+
+        for index, queued in enumerate(lane):
+            if queued.call_id == event.call_id:
+                event.waiters.extend(queued.waiters)
+                event.seq = queued.seq
+                lane[index] = event
+                self.stats["coalesced"] += 1
+                return True
+        return False
+
+    def _drop_oldest(self) -> None:
+        """Drop the oldest queued event across all lanes to stay within the bound."""
+        heads = [lane for lane in self._lanes.values() if lane]
+        if not heads:
+            return
+        oldest_lane = min(heads, key=lambda lane: lane[0].seq)
+        dropped = oldest_lane.popleft()
+        self._queued -= 1
+        self.stats["dropped_overflow"] += 1
+        logger.warning(
+            "Session state queue full, dropping '%s' for user %s (call_id=%s)",
+            dropped.state, dropped.user_id, dropped.call_id,
+        )
+        dropped.resolve(False)
+
+    async def _run_lane(self, user_id: int) -> None:
+        """Deliver one user's events in order until the lane is empty."""
+        lane = self._lanes[user_id]
+        try:
+            while lane:
+                event = lane.popleft()
+                self._queued -= 1
+                self._current[user_id] = event
+                try:
+                    delivered = await self._deliver(event)
+                finally:
+                    self._current.pop(user_id, None)
+                # None: written to the channel, settled when its ack arrives
+                if delivered is not None and not event.superseded:
+                    event.resolve(delivered)
+        finally:
+            if not lane:
+                self._lanes.pop(user_id, None)
+            self._workers.pop(user_id, None)
+
+    async def _deliver(self, event: SessionStateEvent) -> Optional[bool]:
+        """
+        Send an event, retrying with full-jitter exponential backoff.
+
+        While the breaker is open no request is made and no attempt is used up:
+        the event waits for the breaker's next probe instead.
+
+        Returns:
+            Whether the event was delivered, or None once it is written to the
+            channel (its ack is awaited in the background, see _settle_ack)
+        """
+        if event.backoff:
+            # Put back by _settle_ack after Node refused it
+            event.backoff = False
+            self.stats["retries"] += 1
+            await self._wait(
+                event, random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (event.attempts - 1)))
+            )
+
+        while not event.superseded:
+            # The room does not go through Node, so neither the breaker nor attempts apply
+            if await publish_session_state(event.user_id, event.state, event.call_id, event.message):
+                self.stats["via_room"] += 1
+                self.stats["delivered"] += 1
+                return True
+
+            if not self.breaker.allow():
+                self.stats["short_circuited"] += 1
+                await self._wait(event, self.breaker.retry_in() + random.uniform(0, self.retry_base))
+                continue
+
+            event.attempts += 1
+            if self.channel is not None:
+                ack = await self.channel.write(event.user_id, event.state, event.call_id, event.message)
+                if ack is not None:
+                    self.stats["pipelined"] += 1
+                    self._unacked.setdefault(event.user_id, []).append(event)
+                    task = asyncio.create_task(self._settle_ack(event, ack))
+                    self._acks.add(task)
+                    task.add_done_callback(self._acks.discard)
+                    return None
+                self.stats["http_fallbacks"] += 1
+
+            delivered = await emit_session_state(
+                user_id=event.user_id,
+                state=event.state,
+                api_url=event.api_url,
+                call_id=event.call_id,
+                message=event.message,
+            )
+            self.breaker.record(delivered)
+            if delivered:
+                self.stats["delivered"] += 1
+                return True
+
+            if event.attempts >= self.max_attempts:
+                self.stats["dropped_exhausted"] += 1
+                logger.error(
+                    "Giving up on session state '%s' for user %s after %d attempts (breaker %s)",
+                    event.state, event.user_id, event.attempts, self.breaker.state,
+                )
+                return False
+
+            self.stats["retries"] += 1
+            await self._wait(
+                event, random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (event.attempts - 1)))
+            )
+        return False
+
+    async def _settle_ack(self, event: SessionStateEvent, ack: "asyncio.Future[Optional[bool]]") -> None:
+        """Resolve a pipelined event from its ack, or put it back at the front of its lane."""
+        delivered = await ack
+        unacked = self._unacked.get(event.user_id, [])
+        unacked.remove(event)
+        if not unacked:
+            self._unacked.pop(event.user_id, None)
+
+        if delivered is None:
+            # Outcome unknown (channel lost or ack overdue): the attempt goes over HTTP instead
+            self.stats["http_fallbacks"] += 1
+            event.attempts -= 1
+        else:
+            self.breaker.record(delivered)
+            if delivered:
+                self.stats["via_channel"] += 1
+                self.stats["delivered"] += 1
+                event.resolve(True)
+                return
+        if event.superseded:
+            return
+        if delivered is False and event.attempts >= self.max_attempts:
+            self.stats["dropped_exhausted"] += 1
+            logger.error(
+                "Giving up on session state '%s' for user %s after %d attempts (breaker %s)",
+                event.state, event.user_id, event.attempts, self.breaker.state,
+            )
+            event.resolve(False)
+            return
+
+        event.backoff = delivered is False
+        self._lanes.setdefault(event.user_id, deque()).appendleft(event)
+        self._queued += 1
+        self._ensure_worker(event.user_id)
+
+    @staticmethod
+    async def _wait(event: SessionStateEvent, delay: float) -> None:
+        """Sleep before the next attempt, waking early if a newer state supersedes the event."""
+        try:
+            await asyncio.wait_for(event.wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def drain(self, timeout: float = SESSION_EVENT_DRAIN_SECONDS) -> None:
+        """
+        Wait (bounded) for queued events to be delivered, e.g. before a job process exits.
+
+        Args:
+            timeout: Maximum seconds to wait
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Settling an ack may put its event back on a lane, so look again after each wait
+            pending = [task for task in (*self._workers.values(), *self._acks) if not task.done()]
+            if not pending:
+                return
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                unacked = sum(len(events) for events in self._unacked.values())
+                logger.warning(
+                    "Session state events still pending at shutdown: %d queued, %d lanes, %d unacked",
+                    self._queued, len(self._workers), unacked,
+                )
+                return
+            await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, delivery/drop counters and the breaker state."""
+        return {
+            **self.stats,
+            "queue_depth": self._queued,
+            "lanes": len(self._workers),
+            "unacked": sum(len(events) for events in self._unacked.values()),
+            "breaker": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            "channel_connected": self.channel is not None and self.channel.connected,
+        }
+
+
+# Process-wide dispatcher
+session_events = SessionStateDispatcher()
+
+
+def dispatch_saving_conversation(
+    user_id: int,
+    api_url: str,
+    call_id: Optional[str] = None,
+    message: Optional[str] = None,
+) -> "asyncio.Future[bool]":
+    """Queue SAVING_CONVERSATION (see emit_saving_conversation)."""
+    return session_events.dispatch(
+        user_id,
+        SESSION_STATE_SAVING,
+        api_url,
+        call_id,
+        message or "Please wait a moment, we are saving your conversation for analysis…",
+    )
+
+
+def dispatch_session_saved(
+    user_id: int,
+    api_url: str,
+    call_id: Optional[str] = None,
+) -> "asyncio.Future[bool]":
+    """Queue SESSION_SAVED (see emit_session_saved)."""
+    return session_events.dispatch(
+        user_id, SESSION_STATE_SAVED, api_url, call_id, SESSION_SAVED_MESSAGE
+    )
+
+
+def dispatch_session_save_failed(
+    user_id: int,
+    api_url: str,
+    call_id: Optional[str] = None,
+    error_message: Optional[str] = None,
+) -> "asyncio.Future[bool]":
+    """Queue SESSION_SAVE_FAILED (see emit_session_save_failed)."""
+    return session_events.dispatch(
+        user_id,
+        SESSION_STATE_FAILED,
+        api_url,
+        call_id,
+        error_message or "Failed to save conversation. Please try again.",
+    )
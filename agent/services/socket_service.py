@@ -1,16 +1,86 @@
 """
 Socket service for emitting session state events to Node.js server.
-Uses HTTP POST to Node.js which then broadcasts via Socket.IO to the frontend.
+Uses HTTP POST to Node.js which then broadcasts via Socket.IO to the frontend,
+or publishes them straight to the user in the LiveKit room when possible.
 """
 
-import httpx
+import json
 import logging
+import weakref
 from typing import Optional
 
-from config import SESSION_STATE_SAVING, SESSION_STATE_SAVED, SESSION_STATE_FAILED
+from config import (
+    SESSION_STATE_SAVING,
+    SESSION_STATE_SAVED,
+    SESSION_STATE_FAILED,
+    SESSION_SAVED_MESSAGE,
+    SESSION_STATE_TOPIC,
+)
+from services.http_client import http_clients
 
 logger = logging.getLogger(__name__)
 
+# LiveKit rooms by call_id (room name); entries go away with their job's room
+_rooms: "weakref.WeakValueDictionary[str, object]" = weakref.WeakValueDictionary()
+
+
+def register_room(call_id: str, room) -> None:
+    """
+    Let session state events of a call be published in its LiveKit room.
+
+    Args:
+        call_id: Call/room identifier the events are dispatched with
+        room: Connected rtc.Room the agent is in
+    """
+    _rooms[call_id] = room
+
+
+async def publish_session_state(
+    user_id: int,
+    state: str,
+    call_id: Optional[str] = None,
+    message: Optional[str] = None,
+) -> bool:
+    """
+    Publish a session state event to the user over the call's LiveKit room.
+
+    The event is sent as a reliable data packet on the SESSION_STATE_TOPIC
+    topic, addressed to the user's participant only, with the same payload
+    the Socket.IO session_state event carries.
+
+    Args:
+        user_id: User ID (the participant identity)
+        state: Session state
+        call_id: Call/room identifier the room was registered under
+        message: Optional message to display to user
+
+    Returns:
+        True if the packet was published, False if the room is not registered,
+        disconnected, or the user is no longer in it (use emit_session_state)
+    """
+    room = _rooms.get(call_id) if call_id else None
+    if room is None or not room.isconnected():
+        return False
+
+    identity = str(user_id)
+    if identity not in room.remote_participants:
+        return False
+
+    payload = {"state": state, "message": message, "call_id": call_id}
+    try:
+        await room.local_participant.publish_data(
+            json.dumps(payload).encode("utf-8"),
+            reliable=True,
+            destination_identities=[identity],
+            topic=SESSION_STATE_TOPIC,
+        )
+    except Exception as e:
+        logger.warning("Could not publish session state '%s' to room %s: %s", state, call_id, e)
+        return False
+
+    logger.info("✅ Published session state '%s' for user %s in room %s", state, user_id, call_id)
+    return True
+
 
 async def emit_session_state(
     user_id: int,
@@ -46,29 +116,26 @@ async def emit_session_state(
             "message": message,
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{api_url}/api/agent/session-state",
-                json=payload,
-                timeout=5.0,
+        url = f"{api_url}/api/agent/session-state"
+        # Shared keep-alive client: no new TCP/TLS handshake per event
+        response = await http_clients.get(url).post(url, json=payload, timeout=5.0)
+        
+        if response.status_code == 200:
+            logger.info(
+                "✅ Emitted session state '%s' for user %s (call_id=%s)",
+                state,
+                user_id,
+                call_id,
+            )
+            return True
+        else:
+            logger.warning(
+                "⚠️ Failed to emit session state '%s' for user %s: %s",
+                state,
+                user_id,
+                response.text,
             )
-            
-            if response.status_code == 200:
-                logger.info(
-                    "✅ Emitted session state '%s' for user %s (call_id=%s)",
-                    state,
-                    user_id,
-                    call_id,
-                )
-                return True
-            else:
-                logger.warning(
-                    "⚠️ Failed to emit session state '%s' for user %s: %s",
-                    state,
-                    user_id,
-                    response.text,
-                )
-                return False
+            return False
                 
     except Exception as e:
         logger.error(
@@ -112,7 +179,7 @@ async def emit_session_saved(
         state=SESSION_STATE_SAVED,
         api_url=api_url,
         call_id=call_id,
-        message="Conversation saved successfully!",
+        message=SESSION_SAVED_MESSAGE,
     )
 
 
@@ -136,6 +203,8 @@ async def emit_session_save_failed(
 
 
 __all__ = [
+    "register_room",
+    "publish_session_state",
     "emit_session_state",
     "emit_saving_conversation",
     "emit_session_saved",
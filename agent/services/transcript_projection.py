@@ -0,0 +1,71 @@
+"""
+Transcript projection.
+Reduces LiveKit chat history to the compact turn schema stored in conversations.transcript.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Version of the stored transcript schema (bump when the item shape changes)
+TRANSCRIPT_SCHEMA_VERSION = 1
+
+_ROLES = {"user", "assistant"}
+
+
+def _content_text(content: Any) -> str:
+    """Join the text parts of a message's content (audio/image parts are dropped)."""
+    if isinstance(content, str):
+        return content.strip()
+    if isinstance(content, list):
+        return " ".join(part.strip() for part in content if isinstance(part, str) and part.strip())
+    return ""
+
+
+def project_transcript(history: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Project a session.history.to_dict() payload onto the stored turn schema.
+
+    Only user/assistant messages with text are kept. Each item keeps its role,
+    text (as "content", which the Node readers already expect), creation time,
+    interruption flag and turn index:
+
+        {"version": 1, "items": [{"turn": 0, "role": "user", "content": "...",
+                                  "created_at": 1700000000.0, "interrupted": false}]}
+
+    Args:
+        history: Chat history as returned by ChatContext.to_dict()
+
+    Returns:
+        Compact, versioned transcript dictionary
+    """
+    items: List[Dict[str, Any]] = []
+    for item in history.get("items", []):
+        if item.get("type", "message") != "message" or item.get("role") not in _ROLES:
+            continue
+        text = _content_text(item.get("content"))
+        if not text:
+            continue
+        items.append({
+            "turn": len(items),
+            "role": item["role"],
+            "content": text,
+            "created_at": item.get("created_at"),
+            "interrupted": bool(item.get("interrupted", False)),
+        })
+
+    return {"version": TRANSCRIPT_SCHEMA_VERSION, "items": items}
+
+
+def projection_savings(history: Dict[str, Any], projected: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Measure the serialized size of a raw history and its projection.
+
+    Returns:
+        (raw_bytes, projected_bytes)
+    """
+    raw_bytes = len(json.dumps(history, default=str).encode("utf-8"))
+    projected_bytes = len(json.dumps(projected).encode("utf-8"))
+    return raw_bytes, projected_bytes
@@ -3,17 +3,22 @@ Transcript saving service.
 Handles session transcript persistence and usage tracking.
 """
 
+import itertools
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 
 from database import (
     DatabasePool,
     TranscriptRepository,
     UsageRepository,
     CourseRepository,
+    QuotaRepository,
+    OutboxRepository,
     TranscriptData,
+    SessionSave,
     UsageRecord,
+    CourseContext,
 )
 from config import (
     SUPPORTED_SESSION_TYPES,
@@ -22,21 +27,26 @@ from config import (
     ROLEPLAY_BASIC_CAP_SECONDS,
     ROLEPLAY_PRO_CAP_SECONDS,
     PLAN_TYPE_PRO,
+    SESSION_STATE_SAVED,
+    SESSION_SAVED_MESSAGE,
+    OUTBOX_OWNER_GRACE_SECONDS,
 )
-from utils.timezone import get_utc_now, get_utc_today
+from utils.timezone import get_utc_now, to_utc_datetime
 
 logger = logging.getLogger(__name__)
 
 
 class TranscriptService:
     """Service for saving session transcripts and tracking usage."""
-    
+
     def __init__(self, db: DatabasePool):
         self.db = db
         self.transcript_repo = TranscriptRepository(db)
         self.usage_repo = UsageRepository(db)
         self.course_repo = CourseRepository(db)
-    
+        self.quota_repo = QuotaRepository(db)
+        self.outbox_repo = OutboxRepository(db)
+
     async def save_session_transcript(
         self,
         user_id: int,
@@ -44,558 +54,721 @@ class TranscriptService:
         session_type: str,
         transcript: Dict[str, Any],
         duration_seconds: int,
-        session_info: Optional[Dict[str, Any]] = None
+        session_info: Optional[Dict[str, Any]] = None,
+        ended_at: Optional[datetime] = None,
+        archive: Optional[Dict[str, Any]] = None,
     ) -> bool:
         """
         Save session transcript and update usage tracking.
-        
+
+        All writes (transcript, call session, daily progress, lifecycle, and the
+        SESSION_SAVED event in agent_outbox) run in a single transaction on one
+        connection. The transcript and its event commit together or not at all;
+        the call session and daily progress writes run in savepoints, so if one
+        of them fails it is rolled back and logged on its own and the transcript
+        is still saved. The event is delivered by the outbox relay, not by the
+        caller; other processes' relays leave it to this one for
+        OUTBOX_OWNER_GRACE_SECONDS, so the session's own SAVING_CONVERSATION
+        goes out first.
+        Saving is idempotent per room: a room whose conversation is already stored
+        is skipped (its event was queued by that save), so a spooled save can
+        safely be replayed.
+
         Args:
             user_id: User ID
             room_name: Room/session name
             session_type: Type of session ("call", "practice", "roleplay")
             transcript: Transcript data dictionary
             duration_seconds: Session duration in seconds
-            
+            session_info: Session info dictionary (call_start_time, topic, quota_ledger,
+                roleplay_cap, course_context)
+            ended_at: When the session ended (defaults to now)
+            archive: Full chat history to store compressed alongside the transcript
+
         Returns:
-            True if successful, False otherwise
+            True if saved (or already saved), False otherwise
         """
         # Validate session type
         session_type = session_type.lower()
         if session_type not in SUPPORTED_SESSION_TYPES:
             logger.warning(f"Unsupported session type: {session_type}")
             return False
-        
+
         try:
-            # Save transcript
+            ended_at = to_utc_datetime(ended_at) or get_utc_now()
             transcript_data = TranscriptData(
                 room_name=room_name,
                 user_id=user_id,
                 session_type=session_type,
                 transcript=transcript,
                 duration_seconds=duration_seconds,
+                timestamp=ended_at,
+                archive=archive,
             )
-            
-            save_success = await self.transcript_repo.save(transcript_data)
-            if not save_success:
-                logger.error("Failed to save transcript to database")
-                return False
-            
-            # Route by session type
-            if session_type == "call":
-                # For call sessions, insert into call_sessions table (ONLY at end)
-                call_save_success = await self._save_call_session(
-                    user_id, room_name, session_type, duration_seconds, session_info
-                )
-                if not call_save_success:
-                    logger.warning("Failed to save call session (transcript saved successfully)")
-                    # Don't fail the whole operation if call session save fails
-            elif session_type == "practice":
-                # Practice sessions: update daily_progress speaking_* fields directly (daily caps)
-                try:
+
+            # Resolve the roleplay cap before opening the transaction
+            roleplay_cap = None
+            if session_type == "roleplay":
+                roleplay_cap = await self._get_roleplay_cap(user_id, session_info)
+            course = session_info.get("course_context") if session_info else None
+
+            async with self.db.transaction() as conn:
+                if not await self.transcript_repo.claim_room(room_name, conn):
+                    logger.info(
+                        f"Transcript for room {room_name} already saved (user {user_id}), skipping"
+                    )
+                    return True
+
+                await self.transcript_repo.save(transcript_data, conn=conn)
+
+                # Route by session type
+                if session_type == "call":
+                    # For call sessions, insert into call_sessions table (ONLY at end)
+                    try:
+                        async with conn.transaction():
+                            await self._save_call_session(
+                                conn, user_id, room_name, session_type, duration_seconds, session_info,
+                                ended_at=ended_at,
+                            )
+                    except Exception as e:
+                        # Don't fail the whole save if the call session write fails
+                        logger.warning(f"Failed to save call session (transcript saved successfully): {e}")
+                elif session_type == "practice":
+                    # Practice sessions: update daily_progress speaking_* fields directly (daily caps)
                     await self._update_daily_progress_for_practice(
+                        conn,
                         user_id=user_id,
                         duration_seconds=duration_seconds,
+                        ended_at=ended_at,
+                        course=course,
                     )
-                except Exception as e:
-                    logger.warning(f"Failed to update daily_progress for practice: {e}")
-            elif session_type == "roleplay":
-                # Roleplay sessions: update daily_progress roleplay_* fields directly (daily caps)
-                try:
+                elif session_type == "roleplay":
+                    # Roleplay sessions: update daily_progress roleplay_* fields directly (daily caps)
                     await self._update_daily_progress_for_roleplay(
+                        conn,
                         user_id=user_id,
                         duration_seconds=duration_seconds,
+                        roleplay_cap=roleplay_cap,
+                        ended_at=ended_at,
+                        course=course,
                     )
-                except Exception as e:
-                    logger.warning(f"Failed to update daily_progress for roleplay: {e}")
-            
+
+                # Committed with the save: the relay delivers it even if this process dies now
+                await self.outbox_repo.add_many(
+                    [(user_id, room_name, SESSION_STATE_SAVED, SESSION_SAVED_MESSAGE)],
+                    conn,
+                    delay_seconds=OUTBOX_OWNER_GRACE_SECONDS,
+                )
+
             logger.info(
                 f"✅ Successfully saved transcript for user {user_id} "
                 f"(session_type={session_type}, duration={duration_seconds}s)"
             )
             return True
-            
+
         except Exception as e:
-            logger.error(f"Error saving session transcript: {e}", exc_info=True)
+            logger.error(f"Error saving session transcript (transaction rolled back): {e}", exc_info=True)
             return False
-    
+
+    async def save_session_transcripts(self, saves: List[SessionSave]) -> List[bool]:
+        """
+        Save a batch of finished sessions, returning per-row success.
+
+        The whole batch is written in one transaction with one statement per
+        table (COPY for conversations, one multi-row statement for call_sessions,
+        executemany for daily_progress, one insert for the SESSION_SAVED outbox
+        events). If the batch fails, each session is
+        retried on its own so one bad row cannot fail the others. Saving stays
+        idempotent per room.
+
+        Args:
+            saves: Sessions to save
+
+        Returns:
+            Success flag for each entry of `saves`, in order
+        """
+        results = [False] * len(saves)
+        valid = []
+        for index, save in enumerate(saves):
+            save.session_type = save.session_type.lower()
+            if save.session_type not in SUPPORTED_SESSION_TYPES:
+                logger.warning(f"Unsupported session type: {save.session_type}")
+                continue
+            valid.append(index)
+
+        if not valid:
+            return results
+
+        batch = [saves[index] for index in valid]
+        try:
+            await self._resolve_roleplay_caps(batch)
+            async with self.db.transaction() as conn:
+                written = await self._write_batch(conn, batch)
+            for index in valid:
+                results[index] = True
+            logger.info(f"✅ Saved batch of {written} sessions ({len(batch) - written} already saved)")
+            return results
+
+        except Exception as e:
+            logger.warning(f"Batch save of {len(batch)} sessions failed, saving one by one: {e}")
+
+        for index, save in zip(valid, batch):
+            session_info = {
+                "topic_name": save.topic_name,
+                "topic_id": save.topic_id,
+                "roleplay_cap": save.roleplay_cap,
+                "course_context": save.course,
+            }
+            if save.call_started_at is not None:
+                session_info["call_start_time"] = save.call_started_at
+            results[index] = await self.save_session_transcript(
+                user_id=save.user_id,
+                room_name=save.room_name,
+                session_type=save.session_type,
+                transcript=save.transcript,
+                duration_seconds=save.duration_seconds,
+                session_info=session_info,
+                ended_at=save.ended_at,
+                archive=save.archive,
+            )
+        return results
+
+    async def _resolve_roleplay_caps(self, saves: List[SessionSave]) -> None:
+        """Fill in missing roleplay caps with one batched snapshot query."""
+        missing = [save for save in saves if save.session_type == "roleplay" and save.roleplay_cap is None]
+        if not missing:
+            return
+
+        snapshots = await self.quota_repo.get_snapshots(sorted({save.user_id for save in missing})) or {}
+        for save in missing:
+            snapshot = snapshots.get(save.user_id)
+            if snapshot and snapshot.has_subscription:
+                save.roleplay_cap = snapshot.cap_for("roleplay")
+            else:
+                save.roleplay_cap = ROLEPLAY_BASIC_CAP_SECONDS
+
+    async def _write_batch(self, conn, saves: List[SessionSave]) -> int:
+        """
+        Write a batch of sessions inside the caller's transaction.
+
+        Returns:
+            Number of sessions written (rooms already saved are skipped)
+        """
+        unsaved = set(await self.transcript_repo.claim_rooms([save.room_name for save in saves], conn))
+        new_saves = []
+        for save in saves:
+            if save.room_name in unsaved:
+                unsaved.discard(save.room_name)
+                save.ended_at = to_utc_datetime(save.ended_at) or get_utc_now()
+                new_saves.append(save)
+
+        if not new_saves:
+            return 0
+
+        await self.transcript_repo.save_many(
+            [
+                TranscriptData(
+                    room_name=save.room_name,
+                    user_id=save.user_id,
+                    session_type=save.session_type,
+                    transcript=save.transcript,
+                    duration_seconds=save.duration_seconds,
+                    timestamp=save.ended_at,
+                    archive=save.archive,
+                )
+                for save in new_saves
+            ],
+            conn,
+        )
+
+        call_saves = [save for save in new_saves if save.session_type == "call"]
+        completed_rooms = await self._save_call_sessions(conn, call_saves) if call_saves else set()
+
+        progress: List[Tuple[str, Tuple]] = []
+        for save in new_saves:
+            if save.session_type == "call":
+                progress.append(("speaking", self._daily_progress_args(
+                    save.user_id, save.duration_seconds, save.call_started_at, save.ended_at,
+                    mark_completed=save.room_name in completed_rooms,
+                    course=save.course,
+                )))
+            elif save.session_type == "practice":
+                progress.append(("speaking", self._daily_progress_args(
+                    save.user_id, save.duration_seconds, ended_at=save.ended_at,
+                    completion_cap_seconds=PRACTICE_DAILY_CAP_SECONDS,
+                    course=save.course,
+                )))
+            else:
+                progress.append(("roleplay", self._daily_progress_args(
+                    save.user_id, save.duration_seconds, ended_at=save.ended_at,
+                    completion_cap_seconds=save.roleplay_cap,
+                    course=save.course,
+                )))
+
+        # Every batch locks daily_progress rows in (user_id, progress_date) order, so
+        # concurrent batches cannot deadlock; the sort is stable, so rows of the same
+        # user/day are still applied in order and durations accumulate
+        progress.sort(key=lambda item: (item[1][0], item[1][1]))
+        for activity, rows in itertools.groupby(progress, key=lambda item: item[0]):
+            await conn.executemany(self._daily_progress_sql(activity), [args for _, args in rows])
+
+        await self.outbox_repo.add_many(
+            [(save.user_id, save.room_name, SESSION_STATE_SAVED, SESSION_SAVED_MESSAGE) for save in new_saves],
+            conn,
+            delay_seconds=OUTBOX_OWNER_GRACE_SECONDS,
+        )
+        return len(new_saves)
+
+    async def _save_call_sessions(self, conn, saves: List[SessionSave]) -> Set[str]:
+        """
+        Batch version of _save_call_session: one statement for all call sessions.
+
+        Each user's lifetime counter is incremented once by the batch total, in
+        user_id order like every batch (so concurrent batches cannot deadlock); a
+        session's call_completed flag uses the running total up to that session.
+
+        Returns:
+            Room names of the sessions that reached the lifetime limit
+        """
+        started, ended = [], []
+        for save in saves:
+            ended_at = to_utc_datetime(save.ended_at) or get_utc_now()
+            started_at = to_utc_datetime(save.call_started_at) or (
+                ended_at - timedelta(seconds=save.duration_seconds)
+            )
+            started.append(started_at.replace(tzinfo=None))
+            ended.append(ended_at.replace(tzinfo=None))
+
+        rows = await conn.fetch(
+            """
+            WITH batch AS (
+                SELECT *
+                FROM unnest($1::int[], $2::timestamp[], $3::timestamp[], $4::int[],
+                            $5::text[], $6::text[], $7::text[], $8::int[])
+                     WITH ORDINALITY AS b(user_id, started_at, ended_at, duration_seconds,
+                                          session_type, room_name, topic_name, topic_id, ord)
+            ),
+            per_user AS (
+                SELECT user_id, SUM(duration_seconds)::int AS batch_seconds
+                FROM batch
+                GROUP BY user_id
+            ),
+            usage AS (
+                INSERT INTO user_call_usage (user_id, total_seconds, updated_at)
+                SELECT user_id, batch_seconds, (NOW() AT TIME ZONE 'UTC')
+                FROM per_user
+                ORDER BY user_id
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total_seconds = user_call_usage.total_seconds + EXCLUDED.total_seconds,
+                    updated_at = EXCLUDED.updated_at
+                RETURNING user_id, total_seconds
+            ),
+            running AS (
+                SELECT
+                    b.*,
+                    usage.total_seconds - per_user.batch_seconds
+                        + SUM(b.duration_seconds) OVER (PARTITION BY b.user_id ORDER BY b.ord) AS total_after
+                FROM batch b
+                JOIN per_user USING (user_id)
+                JOIN usage USING (user_id)
+            ),
+            inserted AS (
+                INSERT INTO call_sessions
+                (user_id, call_started_at, call_ended_at, call_duration_seconds,
+                 session_type, room_name, topic_name, topic_id, call_completed)
+                SELECT user_id, started_at, ended_at, duration_seconds,
+                       session_type, room_name, topic_name, topic_id, total_after >= $9
+                FROM running
+                ORDER BY ord
+                RETURNING room_name, call_completed
+            ),
+            lifecycle AS (
+                UPDATE user_lifecycle
+                SET call_completed = true,
+                    updated_at = (NOW() AT TIME ZONE 'UTC')
+                WHERE user_id IN (SELECT user_id FROM per_user)
+            )
+            SELECT room_name, call_completed FROM inserted
+            """,
+            [save.user_id for save in saves],
+            started,
+            ended,
+            [save.duration_seconds for save in saves],
+            [save.session_type for save in saves],
+            [save.room_name for save in saves],
+            [save.topic_name for save in saves],
+            [save.topic_id for save in saves],
+            CALL_LIFETIME_LIMIT_SECONDS,
+        )
+
+        logger.info(f"✅ Saved {len(rows)} call sessions in one batch")
+        return {row["room_name"] for row in rows if row["call_completed"]}
+
+    async def _get_roleplay_cap(
+        self, user_id: int, session_info: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Determine the roleplay daily cap based on subscription plan (Basic/FreeTrial vs Pro).
+        Reuses a cap resolved earlier or the session's admission snapshot when
+        available; defaults to the basic cap.
+        """
+        if session_info and session_info.get("roleplay_cap") is not None:
+            return int(session_info["roleplay_cap"])
+
+        ledger = session_info.get("quota_ledger") if session_info else None
+        snapshot = ledger.snapshot if ledger is not None else None
+        if snapshot is None:
+            snapshot = await self.quota_repo.get_snapshot(user_id)
+
+        if snapshot and snapshot.has_subscription:
+            return snapshot.cap_for("roleplay")
+
+        logger.warning(
+            f"Could not determine roleplay cap from subscription for user {user_id}, using basic cap"
+        )
+        return ROLEPLAY_BASIC_CAP_SECONDS
+
     async def _save_call_session(
         self,
+        conn,
         user_id: int,
         room_name: str,
         session_type: str,
         duration_seconds: int,
-        session_info: Optional[Dict[str, Any]] = None
-    ) -> bool:
+        session_info: Optional[Dict[str, Any]] = None,
+        ended_at: Optional[datetime] = None,
+    ) -> None:
         """
         Save call session to call_sessions table (ONLY at end, with all details).
         Also updates user_lifecycle.call_completed for routing.
-        
+
+        The lifetime counter, the insert and the lifecycle update run as one statement.
+
         Args:
+            conn: Connection of the enclosing transaction
             user_id: User ID
             room_name: Room name
             session_type: Session type (should be "call")
             duration_seconds: Session duration in seconds
             session_info: Session info dictionary containing call_start_time
-            
-        Returns:
-            True if successful, False otherwise
+            ended_at: When the call ended (defaults to now)
         """
-        try:
-            # Get call start time from memory
-            if session_info and "call_start_time" in session_info:
-                call_started_at = session_info["call_start_time"]
-            else:
-                # Fallback: use current time minus duration
-                call_started_at = get_utc_now() - timedelta(seconds=duration_seconds)
-
-            # Normalize to naive UTC datetimes for TIMESTAMP columns in Postgres
-            if isinstance(call_started_at, datetime) and call_started_at.tzinfo is not None:
-                call_started_at = call_started_at.replace(tzinfo=None)
-
-            call_ended_at = get_utc_now()
-            if isinstance(call_ended_at, datetime) and call_ended_at.tzinfo is not None:
-                call_ended_at = call_ended_at.replace(tzinfo=None)
-            
-            # Extract topic info from session_info if available
-            topic_name = session_info.get("topic_name") if session_info else None
-            topic_id = session_info.get("topic_id") if session_info else None
-            
-            async with self.db.acquire() as conn:
-                # First, check total lifetime duration from existing sessions
-                total_result = await conn.fetchrow(
-                    """
-                    SELECT COALESCE(SUM(call_duration_seconds), 0) as total
-                    FROM call_sessions
-                    WHERE user_id = $1
-                    """,
-                    user_id
-                )
-                total_before = total_result["total"] if total_result else 0
-                total_after = total_before + duration_seconds
-                
-                # Insert new session record with all details
-                await conn.execute(
-                    """
-                    INSERT INTO call_sessions 
-                    (user_id, call_started_at, call_ended_at, call_duration_seconds, 
-                     session_type, room_name, topic_name, topic_id, call_completed)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                    """,
-                    user_id,
-                    call_started_at,
-                    call_ended_at,
-                    duration_seconds,
-                    session_type,
-                    room_name,
-                    topic_name,
-                    topic_id,
-                    total_after >= CALL_LIFETIME_LIMIT_SECONDS  # Set call_completed if lifetime limit reached
-                )
-            
-            logger.info(
-                f"✅ Saved call session for user {user_id}: "
-                f"duration={duration_seconds}s, total_lifetime={total_after}s, "
-                f"call_completed={total_after >= CALL_LIFETIME_LIMIT_SECONDS}"
-            )
-            
-            # Update daily_progress for call sessions
-            # Set speaking_started_at if not set, and mark completed if lifetime limit reached
-            await self._update_daily_progress_for_call(
-                user_id, call_started_at, call_ended_at, duration_seconds, 
-                total_after >= CALL_LIFETIME_LIMIT_SECONDS
+        call_ended_at = ended_at or get_utc_now()
+
+        # Get call start time from memory
+        if session_info and "call_start_time" in session_info:
+            call_started_at = session_info["call_start_time"]
+        else:
+            # Fallback: use end time minus duration
+            call_started_at = call_ended_at - timedelta(seconds=duration_seconds)
+
+        # Normalize to naive UTC datetimes for TIMESTAMP columns in Postgres
+        if isinstance(call_started_at, datetime) and call_started_at.tzinfo is not None:
+            call_started_at = call_started_at.replace(tzinfo=None)
+
+        if isinstance(call_ended_at, datetime) and call_ended_at.tzinfo is not None:
+            call_ended_at = call_ended_at.replace(tzinfo=None)
+
+        # Extract topic info from session_info if available
+        topic_name = session_info.get("topic_name") if session_info else None
+        topic_id = session_info.get("topic_id") if session_info else None
+
+        # Increment the lifetime counter, insert the new session (call_completed once
+        # the lifetime limit is reached) and flag the lifecycle in a single round trip.
+        # The counter row lock also serializes concurrent call saves of the same user.
+        result = await conn.fetchrow(
+            """
+            WITH usage AS (
+                INSERT INTO user_call_usage (user_id, total_seconds, updated_at)
+                VALUES ($1, $4, (NOW() AT TIME ZONE 'UTC'))
+                ON CONFLICT (user_id) DO UPDATE SET
+                    total_seconds = user_call_usage.total_seconds + EXCLUDED.total_seconds,
+                    updated_at = EXCLUDED.updated_at
+                RETURNING total_seconds
+            ),
+            inserted AS (
+                INSERT INTO call_sessions
+                (user_id, call_started_at, call_ended_at, call_duration_seconds,
+                 session_type, room_name, topic_name, topic_id, call_completed)
+                SELECT $1, $2, $3, $4, $5, $6, $7, $8, usage.total_seconds >= $9
+                FROM usage
+                RETURNING call_completed
+            ),
+            lifecycle AS (
+                UPDATE user_lifecycle
+                SET call_completed = true,
+                    updated_at = (NOW() AT TIME ZONE 'UTC')
+                WHERE user_id = $1
             )
-            
-            # Always update user_lifecycle.call_completed (for routing, regardless of duration)
-            # Direct database update instead of API call
-            await self._update_lifecycle_call_completed(user_id)
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error saving call session: {e}", exc_info=True)
-            return False
-    
+            SELECT usage.total_seconds AS total_after, inserted.call_completed
+            FROM usage, inserted
+            """,
+            user_id,
+            call_started_at,
+            call_ended_at,
+            duration_seconds,
+            session_type,
+            room_name,
+            topic_name,
+            topic_id,
+            CALL_LIFETIME_LIMIT_SECONDS,
+        )
+        total_after = int(result["total_after"])
+        lifetime_limit_reached = bool(result["call_completed"])
+
+        logger.info(
+            f"✅ Saved call session for user {user_id}: "
+            f"duration={duration_seconds}s, total_lifetime={total_after}s, "
+            f"call_completed={lifetime_limit_reached} (lifecycle.call_completed updated)"
+        )
+
+        # Update daily_progress for call sessions
+        # Set speaking_started_at if not set, and mark completed if lifetime limit reached
+        await self._update_daily_progress_for_call(
+            conn, user_id, call_started_at, call_ended_at, duration_seconds,
+            lifetime_limit_reached,
+            course=session_info.get("course_context") if session_info else None,
+        )
+
     async def _update_daily_progress_for_call(
-        self, user_id: int, call_started_at: datetime, call_ended_at: datetime,
-        duration_seconds: int, lifetime_limit_reached: bool
+        self, conn, user_id: int, call_started_at: datetime, call_ended_at: datetime,
+        duration_seconds: int, lifetime_limit_reached: bool,
+        course: Optional[CourseContext] = None,
     ) -> bool:
         """
         Update daily_progress for call sessions.
         Sets speaking_started_at if not set, and marks completed if lifetime limit reached.
-        Always recalculates week_number and day_number based on current date.
-        
+
         Args:
+            conn: Connection of the enclosing transaction
             user_id: User ID
             call_started_at: When the call session started
             call_ended_at: When the call session ended
             duration_seconds: Duration of this call session
             lifetime_limit_reached: Whether lifetime limit (5 min) is reached
-            
+            course: Active course resolved at session start (looked up if not given)
+
         Returns:
-            True if successful, False otherwise
+            True if updated, False if the user has no active course or the write failed
         """
-        try:
-            today_date = get_utc_today()
-            
-            async with self.db.acquire() as conn:
-                # Get active course to calculate week/day
-                course = await conn.fetchrow(
-                    """
-                    SELECT id, course_start_date
-                    FROM user_courses
-                    WHERE user_id = $1 AND is_active = true
-                    ORDER BY id DESC
-                    LIMIT 1
-                    """,
-                    user_id
-                )
-                
-                if not course:
-                    logger.warning(f"No active course found for user {user_id}, skipping daily_progress update")
-                    return False
-                
-                # Calculate week and day numbers based on today's date
-                # Ensure both dates are date objects (no time component)
-                course_start = course["course_start_date"]
-                if isinstance(course_start, datetime):
-                    course_start = course_start.date()
-                elif isinstance(course_start, str):
-                    # Handle string dates (YYYY-MM-DD)
-                    course_start = dt.strptime(course_start.split('T')[0], '%Y-%m-%d').date()
-                
-                # Ensure today_date is a date object (no time component)
-                if isinstance(today_date, datetime):
-                    today_date = today_date.date()
-                
-                days_since_start = (today_date - course_start).days
-                if days_since_start < 0:
-                    days_since_start = 0
-                
-                week_number = (days_since_start // 7) + 1
-                day_number = (days_since_start % 7) + 1
-                
-                # Check if daily_progress exists and get current state
-                existing = await conn.fetchrow(
-                    """
-                    SELECT speaking_started_at, speaking_duration_seconds, speaking_completed
-                    FROM daily_progress
-                    WHERE user_id = $1 AND progress_date = $2
-                    """,
-                    user_id,
-                    today_date
-                )
-                
-                # Determine started_at (preserve existing or use call start time)
-                started_at_value = None
-                if existing and existing["speaking_started_at"]:
-                    started_at_value = existing["speaking_started_at"]
-                else:
-                    started_at_value = call_started_at
-                
-                # Calculate total speaking time (existing + this call)
-                existing_duration = int(existing["speaking_duration_seconds"]) if existing and existing["speaking_duration_seconds"] else 0
-                total_duration = existing_duration + duration_seconds
-                
-                # Mark completed if lifetime limit reached (5 minutes = 300 seconds)
-                should_mark_completed = lifetime_limit_reached or (existing and existing["speaking_completed"])
-                
-                # Upsert daily_progress (always update week_number and day_number)
-                await conn.execute(
-                    """
-                    INSERT INTO daily_progress (
-                        user_id, course_id, week_number, day_number, progress_date,
-                        speaking_started_at, speaking_ended_at, speaking_duration_seconds,
-                        speaking_completed
-                    )
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                    ON CONFLICT (user_id, progress_date) DO UPDATE SET
-                        course_id = EXCLUDED.course_id,
-                        week_number = EXCLUDED.week_number,
-                        day_number = EXCLUDED.day_number,
-                        speaking_started_at = COALESCE(
-                            daily_progress.speaking_started_at,
-                            EXCLUDED.speaking_started_at
-                        ),
-                        speaking_ended_at = EXCLUDED.speaking_ended_at,
-                        speaking_duration_seconds = GREATEST(
-                            daily_progress.speaking_duration_seconds,
-                            EXCLUDED.speaking_duration_seconds
-                        ),
-                        speaking_completed = CASE
-                            WHEN EXCLUDED.speaking_completed = true THEN true
-                            ELSE daily_progress.speaking_completed
-                        END,
-                        updated_at = (NOW() AT TIME ZONE 'UTC')
-                    """,
-                    user_id,
-                    course["id"],
-                    week_number,
-                    day_number,
-                    today_date,
-                    started_at_value,
-                    call_ended_at,
-                    total_duration,
-                    should_mark_completed,
-                )
-                
-                logger.info(
-                    f"✅ Updated daily_progress for call session (user {user_id}): "
-                    f"started_at={started_at_value}, duration={total_duration}s, "
-                    f"completed={should_mark_completed}"
-                )
-                return True
-                
-        except Exception as e:
-            logger.error(f"Error updating daily_progress for call: {e}", exc_info=True)
-            return False
+        return await self._accumulate_daily_progress(
+            conn,
+            user_id=user_id,
+            activity="speaking",
+            started_at=call_started_at,
+            ended_at=call_ended_at,
+            duration_seconds=duration_seconds,
+            mark_completed=lifetime_limit_reached,
+            course=course,
+        )
 
     async def _update_daily_progress_for_practice(
         self,
+        conn,
         user_id: int,
         duration_seconds: int,
+        ended_at: Optional[datetime] = None,
+        course: Optional[CourseContext] = None,
     ) -> bool:
         """
         Update daily_progress for practice (speaking) sessions.
         Uses per-day accumulated speaking_duration_seconds and plan-based daily caps.
-        """
-        try:
-            today_date = get_utc_today()
-
-            async with self.db.acquire() as conn:
-                # Get active course
-                course = await conn.fetchrow(
-                    """
-                    SELECT id, course_start_date
-                    FROM user_courses
-                    WHERE user_id = $1 AND is_active = true
-                    ORDER BY id DESC
-                    LIMIT 1
-                    """,
-                    user_id,
-                )
-                if not course:
-                    logger.warning(f"No active course found for user {user_id}, skipping practice daily_progress update")
-                    return False
-
-                # Compute week/day from course_start_date and today
-                course_start = course["course_start_date"]
-                if isinstance(course_start, datetime):
-                    course_start = course_start.date()
-                days_since_start = (today_date - course_start).days
-                if days_since_start < 0:
-                    days_since_start = 0
-                week_number = (days_since_start // 7) + 1
-                day_number = (days_since_start % 7) + 1
-
-                # Get existing daily_progress row
-                existing = await conn.fetchrow(
-                    """
-                    SELECT speaking_started_at, speaking_duration_seconds, speaking_completed
-                    FROM daily_progress
-                    WHERE user_id = $1 AND progress_date = $2
-                    """,
-                    user_id,
-                    today_date,
-                )
-
-                # Determine started_at (preserve existing earliest), normalize to naive UTC
-                started_at_value = existing["speaking_started_at"] if existing and existing["speaking_started_at"] else get_utc_now()
-                if isinstance(started_at_value, datetime) and started_at_value.tzinfo is not None:
-                    started_at_value = started_at_value.replace(tzinfo=None)
-
-                # Accumulate duration
-                existing_duration = int(existing["speaking_duration_seconds"] or 0) if existing else 0
-                total_duration = existing_duration + duration_seconds
-                # Determine if daily cap has been reached for practice
-                should_mark_completed = bool(existing and existing["speaking_completed"])
-                if total_duration >= PRACTICE_DAILY_CAP_SECONDS:
-                    should_mark_completed = True
-
-                await conn.execute(
-                    """
-                    INSERT INTO daily_progress (
-                        user_id, course_id, week_number, day_number, progress_date,
-                        speaking_started_at, speaking_ended_at, speaking_duration_seconds,
-                        speaking_completed
-                    )
-                    VALUES ($1, $2, $3, $4, $5, $6, (NOW() AT TIME ZONE 'UTC'), $7, $8)
-                    ON CONFLICT (user_id, progress_date) DO UPDATE SET
-                        course_id = EXCLUDED.course_id,
-                        week_number = EXCLUDED.week_number,
-                        day_number = EXCLUDED.day_number,
-                        speaking_started_at = COALESCE(
-                            daily_progress.speaking_started_at,
-                            EXCLUDED.speaking_started_at
-                        ),
-                        speaking_ended_at = EXCLUDED.speaking_ended_at,
-                        speaking_duration_seconds = GREATEST(
-                            daily_progress.speaking_duration_seconds,
-                            EXCLUDED.speaking_duration_seconds
-                        ),
-                        speaking_completed = daily_progress.speaking_completed
-                            OR EXCLUDED.speaking_completed,
-                        updated_at = (NOW() AT TIME ZONE 'UTC')
-                    """,
-                    user_id,
-                    course["id"],
-                    week_number,
-                    day_number,
-                    today_date,
-                    started_at_value,
-                    total_duration,
-                    should_mark_completed,
-                )
 
-                logger.info(
-                    f"✅ Updated daily_progress for practice session (user {user_id}): "
-                    f"duration_today={total_duration}s"
-                )
-                return True
-        except Exception as e:
-            logger.error(f"Error updating daily_progress for practice: {e}", exc_info=True)
-            return False
+        Returns:
+            True if updated, False if the user has no active course or the write failed
+        """
+        return await self._accumulate_daily_progress(
+            conn,
+            user_id=user_id,
+            activity="speaking",
+            duration_seconds=duration_seconds,
+            ended_at=ended_at,
+            completion_cap_seconds=PRACTICE_DAILY_CAP_SECONDS,
+            course=course,
+        )
 
     async def _update_daily_progress_for_roleplay(
         self,
+        conn,
         user_id: int,
         duration_seconds: int,
+        roleplay_cap: Optional[int] = None,
+        ended_at: Optional[datetime] = None,
+        course: Optional[CourseContext] = None,
     ) -> bool:
         """
         Update daily_progress for roleplay sessions.
         Uses per-day accumulated roleplay_duration_seconds and plan-based daily caps.
-        """
-        try:
-            today_date = get_utc_today()
 
-            async with self.db.acquire() as conn:
-                # Get active course
-                course = await conn.fetchrow(
-                    """
-                    SELECT id, course_start_date
-                    FROM user_courses
-                    WHERE user_id = $1 AND is_active = true
-                    ORDER BY id DESC
-                    LIMIT 1
-                    """,
-                    user_id,
-                )
-                if not course:
-                    logger.warning(f"No active course found for user {user_id}, skipping roleplay daily_progress update")
-                    return False
-
-                # Compute week/day
-                course_start = course["course_start_date"]
-                if isinstance(course_start, datetime):
-                    course_start = course_start.date()
-                days_since_start = (today_date - course_start).days
-                if days_since_start < 0:
-                    days_since_start = 0
-                week_number = (days_since_start // 7) + 1
-                day_number = (days_since_start % 7) + 1
-
-                # Existing row
-                existing = await conn.fetchrow(
-                    """
-                    SELECT roleplay_started_at, roleplay_duration_seconds, roleplay_completed
-                    FROM daily_progress
-                    WHERE user_id = $1 AND progress_date = $2
-                    """,
-                    user_id,
-                    today_date,
-                )
+        Returns:
+            True if updated, False if the user has no active course or the write failed
+        """
+        if roleplay_cap is None:
+            roleplay_cap = ROLEPLAY_BASIC_CAP_SECONDS
 
-                started_at_value = existing["roleplay_started_at"] if existing and existing["roleplay_started_at"] else get_utc_now()
-                if isinstance(started_at_value, datetime) and started_at_value.tzinfo is not None:
-                    started_at_value = started_at_value.replace(tzinfo=None)
-                existing_duration = int(existing["roleplay_duration_seconds"] or 0) if existing else 0
-                total_duration = existing_duration + duration_seconds
-
-                # Determine daily cap based on subscription plan (Basic/FreeTrial vs Pro)
-                roleplay_cap = ROLEPLAY_BASIC_CAP_SECONDS
-                # Try to look up subscription plan; on failure, default to basic cap
-                try:
-                    from database import SubscriptionRepository  # local import to avoid cycles
-
-                    sub_repo = SubscriptionRepository(self.db)
-                    sub = await sub_repo.get_active_subscription(user_id)
-                    if sub and sub.plan_type == PLAN_TYPE_PRO:
-                        roleplay_cap = ROLEPLAY_PRO_CAP_SECONDS
-                except Exception as cap_err:
-                    logger.warning(
-                        f"Failed to determine roleplay cap from subscription for user {user_id}: {cap_err}"
-                    )
+        return await self._accumulate_daily_progress(
+            conn,
+            user_id=user_id,
+            activity="roleplay",
+            duration_seconds=duration_seconds,
+            ended_at=ended_at,
+            completion_cap_seconds=roleplay_cap,
+            course=course,
+        )
 
-                should_mark_completed = bool(existing and existing["roleplay_completed"])
-                if total_duration >= roleplay_cap:
-                    should_mark_completed = True
+    async def _accumulate_daily_progress(
+        self,
+        conn,
+        user_id: int,
+        activity: str,
+        duration_seconds: int,
+        started_at: Optional[datetime] = None,
+        ended_at: Optional[datetime] = None,
+        mark_completed: bool = False,
+        completion_cap_seconds: Optional[int] = None,
+        course: Optional[CourseContext] = None,
+    ) -> bool:
+        """
+        Add a session's duration to today's daily_progress row in one statement.
 
-                await conn.execute(
-                    """
-                    INSERT INTO daily_progress (
-                        user_id, course_id, week_number, day_number, progress_date,
-                        roleplay_started_at, roleplay_ended_at, roleplay_duration_seconds,
-                        roleplay_completed
-                    )
-                    VALUES ($1, $2, $3, $4, $5, $6, (NOW() AT TIME ZONE 'UTC'), $7, $8)
-                    ON CONFLICT (user_id, progress_date) DO UPDATE SET
-                        course_id = EXCLUDED.course_id,
-                        week_number = EXCLUDED.week_number,
-                        day_number = EXCLUDED.day_number,
-                        roleplay_started_at = COALESCE(
-                            daily_progress.roleplay_started_at,
-                            EXCLUDED.roleplay_started_at
-                        ),
-                        roleplay_ended_at = EXCLUDED.roleplay_ended_at,
-                        roleplay_duration_seconds = GREATEST(
-                            daily_progress.roleplay_duration_seconds,
-                            EXCLUDED.roleplay_duration_seconds
-                        ),
-                        roleplay_completed = daily_progress.roleplay_completed
-                            OR EXCLUDED.roleplay_completed,
-                        updated_at = (NOW() AT TIME ZONE 'UTC')
-                    """,
-                    user_id,
-                    course["id"],
-                    week_number,
-                    day_number,
-                    today_date,
-                    started_at_value,
-                    total_duration,
-                    should_mark_completed,
-                )
+        The duration is added to the stored value inside the upsert, so concurrent
+        sessions of the same user cannot overwrite each other's time. Week/day
+        numbers are derived in SQL from the session's course (or, without one, the
+        active user_courses row), and the completed flag is derived from the
+        accumulated total. Every parameter is cast: INSERT ... SELECT does not
+        infer parameter types from the target columns, so untyped ones would be
+        resolved as text.
 
-                logger.info(
-                    f"✅ Updated daily_progress for roleplay session (user {user_id}): "
-                    f"duration_today={total_duration}s"
-                )
-                return True
-        except Exception as e:
-            logger.error(f"Error updating daily_progress for roleplay: {e}", exc_info=True)
-            return False
-    
-    async def _update_lifecycle_call_completed(self, user_id: int) -> bool:
-        """
-        Update user_lifecycle.call_completed directly in database (for routing).
-        
         Args:
+            conn: Connection of the enclosing transaction
             user_id: User ID
-            
+            activity: Column prefix in daily_progress ("speaking" or "roleplay")
+            duration_seconds: Duration of this session
+            started_at: Session start (kept only if none is stored yet); defaults to ended_at
+            ended_at: Session end, which also picks the progress date; defaults to now
+            mark_completed: Mark the activity completed regardless of duration
+            completion_cap_seconds: Mark completed once today's total reaches this
+            course: Active course resolved at session start (looked up in SQL if not given)
+
+        Runs in a savepoint: if the write fails, only it is rolled back and the
+        rest of the caller's transaction (the transcript) can still commit.
+
         Returns:
-            True if successful, False otherwise
+            True if updated, False if the user has no active course or the write failed
         """
         try:
-            async with self.db.acquire() as conn:
-                await conn.execute(
-                    """
-                    UPDATE user_lifecycle
-                    SET call_completed = true,
-                        updated_at = (NOW() AT TIME ZONE 'UTC')
-                    WHERE user_id = $1
-                    """,
-                    user_id
+            async with conn.transaction():
+                row = await conn.fetchrow(
+                    self._daily_progress_sql(activity),
+                    *self._daily_progress_args(
+                        user_id, duration_seconds, started_at, ended_at, mark_completed,
+                        completion_cap_seconds, course,
+                    ),
                 )
-                logger.info(f"✅ Updated lifecycle.call_completed for user {user_id} (direct DB update)")
-                return True
         except Exception as e:
-            logger.error(f"Error updating lifecycle.call_completed: {e}")
-            return False
\ No newline at end of file
+            logger.warning(f"Failed to update daily_progress {activity} for user {user_id}: {e}")
+            return False
+
+        if row is None:
+            logger.warning(
+                f"No active course found for user {user_id}, skipping {activity} daily_progress update"
+            )
+            return False
+
+        logger.info(
+            f"✅ Updated daily_progress {activity} for user {user_id}: "
+            f"duration_today={row['duration_today']}s, completed={row['completed']}"
+        )
+        return True
+
+    @staticmethod
+    def _daily_progress_args(
+        user_id: int,
+        duration_seconds: int,
+        started_at: Optional[datetime] = None,
+        ended_at: Optional[datetime] = None,
+        mark_completed: bool = False,
+        completion_cap_seconds: Optional[int] = None,
+        course: Optional[CourseContext] = None,
+    ) -> Tuple:
+        """Build the parameters of the daily_progress accumulation statement."""
+        # Normalize to naive UTC datetimes for TIMESTAMP columns in Postgres
+        ended_at = to_utc_datetime(ended_at) or get_utc_now()
+        progress_date = ended_at.date()
+        ended_at = ended_at.replace(tzinfo=None)
+        if isinstance(started_at, datetime) and started_at.tzinfo is not None:
+            started_at = started_at.replace(tzinfo=None)
+
+        return (
+            user_id,
+            progress_date,
+            started_at or ended_at,
+            ended_at,
+            duration_seconds,
+            mark_completed,
+            completion_cap_seconds,
+            course.course_id if course else None,
+            course.course_start_date if course else None,
+        )
+
+    @staticmethod
+    def _daily_progress_sql(activity: str) -> str:
+        """
+        Build the daily_progress accumulation statement for an activity.
+
+        Week/day numbers are derived from the course passed in $8/$9 (resolved
+        once at session start); without one, the active user_courses row is
+        looked up instead and no row is written if the user has no active course.
+        """
+        if activity not in {"speaking", "roleplay"}:
+            raise ValueError(f"Unsupported daily_progress activity: {activity}")
+
+        return f"""
+            INSERT INTO daily_progress (
+                user_id, course_id, week_number, day_number, progress_date,
+                {activity}_started_at, {activity}_ended_at, {activity}_duration_seconds,
+                {activity}_completed
+            )
+            SELECT
+                $1::int,
+                uc.id,
+                (GREATEST($2::date - uc.course_start_date, 0) / 7) + 1,
+                (GREATEST($2::date - uc.course_start_date, 0) % 7) + 1,
+                $2::date,
+                $3::timestamp,
+                $4::timestamp,
+                $5::int,
+                $6::boolean OR COALESCE($5::int >= $7::int, false)
+            FROM (
+                SELECT $8::int AS id, $9::date AS course_start_date
+                WHERE $8::int IS NOT NULL
+                UNION ALL
+                (
+                    SELECT id, course_start_date
+                    FROM user_courses
+                    WHERE user_id = $1::int AND is_active = true AND $8::int IS NULL
+                    ORDER BY id DESC
+                    LIMIT 1
+                )
+            ) uc
+            ON CONFLICT (user_id, progress_date) DO UPDATE SET
+                course_id = EXCLUDED.course_id,
+                week_number = EXCLUDED.week_number,
+                day_number = EXCLUDED.day_number,
+                {activity}_started_at = COALESCE(
+                    daily_progress.{activity}_started_at,
+                    EXCLUDED.{activity}_started_at
+                ),
+                {activity}_ended_at = EXCLUDED.{activity}_ended_at,
+                {activity}_duration_seconds = COALESCE(daily_progress.{activity}_duration_seconds, 0)
+                    + EXCLUDED.{activity}_duration_seconds,
+                {activity}_completed = daily_progress.{activity}_completed
+                    OR EXCLUDED.{activity}_completed
+                    OR COALESCE(
+                        COALESCE(daily_progress.{activity}_duration_seconds, 0)
+                            + EXCLUDED.{activity}_duration_seconds >= $7::int,
+                        false
+                    ),
+                updated_at = (NOW() AT TIME ZONE 'UTC')
+            RETURNING {activity}_duration_seconds AS duration_today, {activity}_completed AS completed
+            """
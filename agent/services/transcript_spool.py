@@ -0,0 +1,533 @@
+"""
+Durable write-behind spool for transcript saves.
+Sessions append their save to a local fsync'd JSONL segment; a background
+flusher writes spooled saves to Postgres and drains leftovers on restart.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+from config import (
+    Config,
+    SPOOL_FLUSH_BATCH_SIZE,
+    SPOOL_FLUSH_INTERVAL_SECONDS,
+    SPOOL_MAX_ATTEMPTS,
+    SPOOL_RETRY_MAX_SECONDS,
+)
+from database import DatabasePool, SessionSave, CourseContext
+from services.quota_ledger import quota_ledgers
+from services.transcript_saver import TranscriptService
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+DEAD_SUFFIX = ".dead"
+
+
+class TranscriptSpool:
+    """
+    Append-only, segmented JSONL spool on local disk.
+
+    Each worker process appends to its own active segment, which it keeps
+    flock'ed while open. A segment becomes claimable once it is sealed (closed)
+    or its owning process has exited, so any process can drain it.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialize transcript spool.
+
+        Args:
+            directory: Directory holding the spool segments (created if missing)
+        """
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._active_fd: Optional[int] = None
+        self._active_path: Optional[str] = None
+        self._sequence = 0
+        # append() runs in worker threads; seal() must not close the fd under it
+        self._active_lock = threading.Lock()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        Durably append a record to the active segment.
+
+        Blocks on fsync, so callers on the event loop run it in a thread
+        (see TranscriptSpoolFlusher.submit). Safe to call from several threads.
+
+        Raises:
+            OSError: If the record could not be written and fsync'd
+        """
+        line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._active_lock:
+            if self._active_fd is None:
+                self._open_segment()
+            os.write(self._active_fd, line)
+            os.fsync(self._active_fd)
+
+    def seal(self) -> None:
+        """Close the active segment so it can be claimed; the next append starts a new one."""
+        with self._active_lock:
+            if self._active_fd is None:
+                return
+            os.close(self._active_fd)
+            self._active_fd = None
+            self._active_path = None
+
+    def claim_segments(self) -> Iterator[Tuple[str, int]]:
+        """
+        Yield (path, fd) for each segment this process can drain, oldest first.
+        The segment stays locked until release() is called with its fd.
+        """
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if path == self._active_path:
+                continue
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            if not self._try_lock(fd) or os.fstat(fd).st_nlink == 0:
+                # Still being written by a live process, or already drained
+                os.close(fd)
+                continue
+            yield path, fd
+
+    def read(self, fd: int) -> List[Dict[str, Any]]:
+        """Read the records of a claimed segment, dropping a torn trailing line."""
+        chunks = []
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        records = []
+        for line in b"".join(chunks).splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("Dropping unreadable spool line in %s", self.directory)
+        return records
+
+    def rewrite(self, path: str, records: List[Dict[str, Any]]) -> None:
+        """Atomically replace a claimed segment with the records still pending."""
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            for record in records:
+                os.write(fd, (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+
+    def bury(self, path: str, records: List[Dict[str, Any]]) -> str:
+        """
+        Durably append records that will never be saved to the segment's dead file.
+
+        Dead files are not segments: they are never claimed again and are kept
+        for manual inspection and replay.
+
+        Returns:
+            Path of the dead file
+        """
+        dead_path = path[:-len(SEGMENT_SUFFIX)] + DEAD_SUFFIX
+        fd = os.open(dead_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            for record in records:
+                os.write(fd, (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self._fsync_directory()
+        return dead_path
+
+    def remove(self, path: str) -> None:
+        """Delete a fully drained segment."""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self._fsync_directory()
+
+    def release(self, fd: int) -> None:
+        """Release a claimed segment."""
+        os.close(fd)
+
+    def pending_segments(self) -> int:
+        """Count segments on disk (including the active one)."""
+        try:
+            return sum(1 for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        except FileNotFoundError:
+            return 0
+
+    def _open_segment(self) -> None:
+        """Create and lock a new active segment for this process."""
+        self._sequence += 1
+        name = f"{int(time.time() * 1000):013d}-{os.getpid()}-{self._sequence}{SEGMENT_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._try_lock(fd)
+        self._fsync_directory()
+        self._active_fd = fd
+        self._active_path = path
+
+    @staticmethod
+    def _try_lock(fd: int) -> bool:
+        """Take an exclusive non-blocking lock on a segment (no-op without fcntl)."""
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _fsync_directory(self) -> None:
+        """Persist directory entries (segment creation, rename, removal)."""
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class TranscriptSpoolFlusher:
+    """
+    Background task that writes spooled transcript saves to Postgres.
+
+    Each batch is written with TranscriptService.save_session_transcripts,
+    which also commits each session's SESSION_SAVED event to the outbox.
+    Saves are idempotent per room_name, so a record replayed after a crash
+    (or drained by another process) is never stored (or notified) twice.
+    """
+
+    def __init__(
+        self,
+        spool: TranscriptSpool,
+        db: DatabasePool,
+        batch_size: int = SPOOL_FLUSH_BATCH_SIZE,
+        interval: float = SPOOL_FLUSH_INTERVAL_SECONDS,
+        max_retry_interval: float = SPOOL_RETRY_MAX_SECONDS,
+    ):
+        """
+        Initialize spool flusher.
+
+        Args:
+            spool: Spool to drain
+            db: Database connection pool
+            batch_size: Records written per batch
+            interval: Idle delay between passes
+            max_retry_interval: Cap on the backoff while saves keep failing
+        """
+        self.spool = spool
+        self.transcript_service = TranscriptService(db)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_retry_interval = max_retry_interval
+        self._retry_interval = interval
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self.stats: Dict[str, Any] = {
+            "spooled": 0,
+            "saved": 0,
+            "failed_attempts": 0,
+            "replayed": 0,
+            "dead_lettered": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def start(self) -> None:
+        """Start the flusher loop; the first pass drains segments left by earlier runs."""
+        if self._task is None or self._task.done():
+            self._wake.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, record: Dict[str, Any]) -> asyncio.Future:
+        """
+        Durably spool a save and schedule it for flushing.
+
+        The write and fsync run in a thread so the event loop keeps serving
+        other sessions; once the default executor is shut down (worker exiting)
+        they run inline instead.
+
+        Args:
+            record: Spool record (see build_spool_record)
+
+        Returns:
+            Future resolved with the outcome of the record's first save attempt
+
+        Raises:
+            OSError: If the record could not be written to the spool
+        """
+        # Registered first: a running pass may pick the record up as soon as it is on disk
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[record["room_name"]] = future
+        try:
+            try:
+                await asyncio.to_thread(self.spool.append, record)
+            except RuntimeError:
+                self.spool.append(record)
+        except BaseException:
+            if self._waiters.get(record["room_name"]) is future:
+                del self._waiters[record["room_name"]]
+            raise
+        self.stats["spooled"] += 1
+
+        self.start()
+        self._wake.set()
+        return future
+
+    async def _run(self) -> None:
+        """Flusher loop: run a pass when woken, or after the (backoff) interval."""
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self._retry_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+                failed = await self.flush()
+                if failed:
+                    self._retry_interval = min(self._retry_interval * 2, self.max_retry_interval)
+                else:
+                    self._retry_interval = self.interval
+
+            except asyncio.CancelledError:
+                logger.info("Transcript spool flusher cancelled")
+                raise
+            except Exception as e:
+                logger.error("Error in transcript spool flusher: %s", e)
+
+    async def flush(self) -> int:
+        """
+        Drain every claimable segment once.
+
+        Returns:
+            Number of records that failed and remain spooled
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            await asyncio.to_thread(self.spool.seal)
+            failed = 0
+            for path, fd in self.spool.claim_segments():
+                try:
+                    failed += await self._flush_segment(path, fd)
+                finally:
+                    self.spool.release(fd)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            return failed
+
+    async def _flush_segment(self, path: str, fd: int) -> int:
+        """
+        Save a claimed segment in batches, keeping only the records that failed.
+
+        Malformed records, and records that failed SPOOL_MAX_ATTEMPTS times, are
+        moved to the segment's dead file instead of being retried forever.
+        """
+        records = self.spool.read(fd)
+        pending: List[Dict[str, Any]] = []
+        dead: List[Dict[str, Any]] = []
+
+        for start in range(0, len(records), self.batch_size):
+            batch = []
+            for record in records[start:start + self.batch_size]:
+                try:
+                    batch.append((record, self._to_session_save(record)))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error("Malformed spool record %s: %s", record.get("room_name"), e)
+                    dead.append(record)
+
+            try:
+                results = await self.transcript_service.save_session_transcripts(
+                    [save for _, save in batch]
+                )
+            except Exception as e:
+                logger.error("Error saving spooled batch: %s", e)
+                results = [False] * len(batch)
+
+            for (record, _), success in zip(batch, results):
+                if not await self._record_outcome(record, success):
+                    record["attempts"] = record.get("attempts", 0) + 1
+                    if record["attempts"] >= SPOOL_MAX_ATTEMPTS:
+                        dead.append(record)
+                    else:
+                        pending.append(record)
+
+        if dead:
+            # Buried before the segment is rewritten, so a crash in between duplicates at worst
+            dead_path = self.spool.bury(path, dead)
+            self.stats["dead_lettered"] += len(dead)
+            logger.error(
+                "Moved %d spooled transcript(s) that cannot be saved to %s: %s",
+                len(dead),
+                dead_path,
+                ", ".join(str(record.get("room_name")) for record in dead),
+            )
+
+        if pending:
+            self.spool.rewrite(path, pending)
+            logger.warning(
+                "%d spooled transcript(s) failed to save, retrying in up to %ss",
+                len(pending),
+                self.max_retry_interval,
+            )
+        else:
+            self.spool.remove(path)
+        return len(pending)
+
+    @staticmethod
+    def _to_session_save(record: Dict[str, Any]) -> SessionSave:
+        """Rebuild the session save described by a spool record."""
+        call_start_time = record.get("call_start_time")
+        course = None
+        if record.get("course_id") is not None:
+            course = CourseContext.from_db_row(record["course_id"], record["course_start_date"])
+        return SessionSave(
+            user_id=record["user_id"],
+            room_name=record["room_name"],
+            session_type=record["session_type"],
+            transcript=record["transcript"],
+            duration_seconds=record["duration_seconds"],
+            ended_at=datetime.fromisoformat(record["ended_at"]),
+            call_started_at=datetime.fromisoformat(call_start_time) if call_start_time else None,
+            topic_name=record.get("topic_name"),
+            topic_id=record.get("topic_id"),
+            roleplay_cap=record.get("roleplay_cap"),
+            archive=record.get("archive"),
+            course=course,
+        )
+
+    async def _record_outcome(self, record: Dict[str, Any], success: bool) -> bool:
+        """Resolve the session waiting on a record (its SESSION_SAVED is in the outbox once saved)."""
+        room_name = record["room_name"]
+        user_id = record["user_id"]
+
+        waiter = self._waiters.pop(room_name, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(success)
+
+        if not success:
+            self.stats["failed_attempts"] += 1
+            return False
+
+        self.stats["saved"] += 1
+        # Saved usage changes the baseline of this user's other live sessions
+        quota_ledgers.invalidate_user(user_id, "another session was saved")
+
+        if waiter is None:
+            # Retry or replay after restart: the outbox relay notifies the user
+            self.stats["replayed"] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get spool counters and the number of segments on disk."""
+        return {
+            **self.stats,
+            "pending_segments": self.spool.pending_segments(),
+            "retry_interval": self._retry_interval,
+        }
+
+    async def aclose(self) -> None:
+        """Stop the flusher loop; anything not yet saved stays on disk for the next run."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self.spool.seal()
+
+
+def build_spool_record(
+    user_id: int,
+    room_name: str,
+    session_type: str,
+    transcript: Dict[str, Any],
+    duration_seconds: int,
+    ended_at: datetime,
+    session_info: Dict[str, Any],
+    archive: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Build the self-contained spool record for a session save.
+
+    Everything the save needs later is captured now, including the roleplay cap
+    and active course from the admission snapshot, so replaying it needs no live
+    session state.
+    """
+    call_start_time = session_info.get("call_start_time")
+    roleplay_cap = None
+    ledger = session_info.get("quota_ledger")
+    if session_type == "roleplay" and ledger is not None and ledger.snapshot is not None:
+        if ledger.snapshot.has_subscription:
+            roleplay_cap = ledger.snapshot.cap_for("roleplay")
+    course = session_info.get("course_context")
+
+    return {
+        "room_name": room_name,
+        "user_id": user_id,
+        "session_type": session_type,
+        "duration_seconds": duration_seconds,
+        "ended_at": ended_at.isoformat(),
+        "call_start_time": call_start_time.isoformat() if call_start_time else None,
+        "topic_name": session_info.get("topic_name"),
+        "topic_id": session_info.get("topic_id"),
+        "roleplay_cap": roleplay_cap,
+        "course_id": course.course_id if course else None,
+        "course_start_date": course.course_start_date.isoformat() if course else None,
+        "transcript": transcript,
+        "archive": archive,
+        "attempts": 0,
+    }
+
+
+# Process-wide flusher (created on first use with the worker's pool)
+_flusher: Optional[TranscriptSpoolFlusher] = None
+
+
+def get_transcript_spool_flusher(db: DatabasePool, config: Config) -> TranscriptSpoolFlusher:
+    """
+    Get the process-wide transcript spool flusher, creating it on first use.
+
+    Args:
+        db: Database connection pool
+        config: Application configuration
+
+    Returns:
+        Shared TranscriptSpoolFlusher instance
+    """
+    global _flusher
+    if _flusher is None:
+        _flusher = TranscriptSpoolFlusher(
+            TranscriptSpool(config.spool.transcript_dir),
+            db,
+        )
+    return _flusher
@@ -0,0 +1,73 @@
+"""
+Shared fixtures for the agent tests.
+
+Database tests run against a disposable PostgreSQL database given by the
+TEST_PG_* variables (same meaning as PG_*); they are skipped when
+TEST_PG_HOST is not set. The tables in tests/schema.sql are dropped and
+recreated for every test.
+
+    TEST_PG_HOST=localhost TEST_PG_USER=postgres TEST_PG_DATABASE=agent_test python -m pytest -q
+"""
+
+import asyncio
+import os
+from pathlib import Path
+
+import asyncpg
+import pytest
+
+from config import DatabaseConfig
+from database import DatabasePool
+
+SCHEMA_PATH = Path(__file__).with_name("schema.sql")
+
+
+@pytest.fixture
+def pg_config() -> DatabaseConfig:
+    """Configuration of the test database (skips the test if none is set)."""
+    host = os.getenv("TEST_PG_HOST")
+    if not host:
+        pytest.skip("TEST_PG_HOST is not set")
+    return DatabaseConfig(
+        host=host,
+        port=int(os.getenv("TEST_PG_PORT", "5432")),
+        user=os.getenv("TEST_PG_USER", "postgres"),
+        password=os.getenv("TEST_PG_PASSWORD", ""),
+        database=os.getenv("TEST_PG_DATABASE", "postgres"),
+        ssl=os.getenv("TEST_PG_SSL", "false").lower() == "true",
+    )
+
+
+async def _reset_schema(config: DatabaseConfig) -> None:
+    conn = await asyncpg.connect(
+        host=config.host,
+        port=config.port,
+        user=config.user,
+        password=config.password,
+        database=config.database,
+        ssl=config.ssl,
+    )
+    try:
+        await conn.execute(SCHEMA_PATH.read_text())
+    finally:
+        await conn.close()
+
+
+@pytest.fixture
+def db(pg_config: DatabaseConfig) -> DatabasePool:
+    """Pool on a freshly reset test database (connected lazily, in the test's loop)."""
+    asyncio.run(_reset_schema(pg_config))
+    return DatabasePool(pg_config, min_size=1, max_size=4)
+
+
+@pytest.fixture
+def run(db: DatabasePool):
+    """Run a test coroutine in its own event loop, closing the pool afterwards."""
+    def run_scenario(coro):
+        async def scenario():
+            try:
+                return await coro
+            finally:
+                await db.close()
+        return asyncio.run(scenario())
+    return run_scenario
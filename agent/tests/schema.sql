@@ -0,0 +1,105 @@
+-- Minimal schema of the tables the agent reads and writes, for the database tests.
+-- Mirrors the production columns the agent touches (see
+-- tables_schema_2026-01-24.sql and db/migrations); the test database is wiped.
+
+DROP TABLE IF EXISTS
+    agent_outbox, daily_progress, user_courses, call_sessions,
+    conversations, user_call_usage, user_lifecycle, subscriptions, subscription_plans
+CASCADE;
+
+CREATE TABLE conversations (
+    id SERIAL PRIMARY KEY,
+    room_name VARCHAR NOT NULL,
+    participant_identity VARCHAR,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    transcript TEXT,
+    user_id INTEGER NOT NULL,
+    session_duration INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    transcript_archive BYTEA,
+    transcript_archive_codec VARCHAR(16)
+);
+
+CREATE TABLE call_sessions (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    call_started_at TIMESTAMP,
+    call_ended_at TIMESTAMP,
+    call_duration_seconds INTEGER,
+    session_type VARCHAR,
+    room_name VARCHAR,
+    topic_name VARCHAR,
+    topic_id INTEGER,
+    call_completed BOOLEAN DEFAULT false,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE user_call_usage (
+    user_id INTEGER PRIMARY KEY,
+    total_seconds INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE user_lifecycle (
+    user_id INTEGER PRIMARY KEY,
+    call_completed BOOLEAN DEFAULT false,
+    updated_at TIMESTAMP
+);
+
+CREATE TABLE user_courses (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    course_start_date DATE NOT NULL,
+    course_end_date DATE NOT NULL,
+    is_active BOOLEAN DEFAULT true
+);
+
+CREATE TABLE daily_progress (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    course_id INTEGER NOT NULL,
+    week_number INTEGER NOT NULL,
+    day_number INTEGER NOT NULL,
+    progress_date DATE NOT NULL,
+    speaking_completed BOOLEAN NOT NULL DEFAULT false,
+    speaking_started_at TIMESTAMP,
+    speaking_ended_at TIMESTAMP,
+    speaking_duration_seconds INTEGER DEFAULT 0,
+    roleplay_completed BOOLEAN NOT NULL DEFAULT false,
+    roleplay_duration_seconds INTEGER DEFAULT 0,
+    roleplay_started_at TIMESTAMP,
+    roleplay_ended_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (user_id, progress_date)
+);
+
+CREATE TABLE agent_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    call_id VARCHAR(255),
+    state VARCHAR(32) NOT NULL,
+    message TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC')
+);
+
+CREATE TABLE subscription_plans (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    plan_type VARCHAR NOT NULL DEFAULT 'Basic'
+);
+
+CREATE TABLE subscriptions (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    plan_id INTEGER NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'pending',
+    start_date TIMESTAMP,
+    end_date TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_free_trial BOOLEAN NOT NULL DEFAULT false,
+    free_trial_started_at TIMESTAMP
+);
@@ -0,0 +1,111 @@
+"""
+Tests for the session event channel against the stand-in server.
+"""
+
+import asyncio
+
+from config import SESSION_STATE_SAVED, SESSION_STATE_SAVING
+from services.event_channel import SessionEventChannel, serve_stand_in
+from services.session_events import SessionStateDispatcher
+
+# Never reached: every event goes over the channel
+API_URL = "http://127.0.0.1:9"
+
+
+async def _connect(address: str, secret: str) -> SessionEventChannel:
+    channel = SessionEventChannel(address, secret, ack_timeout=1.0)
+    channel.start()
+    for _ in range(50):
+        if channel.connected:
+            break
+        await asyncio.sleep(0.02)
+    return channel
+
+
+def test_channel_with_matching_secret_delivers(tmp_path):
+    """A client presenting the server's secret gets its events acked."""
+    address = str(tmp_path / "events.sock")
+
+    async def scenario() -> None:
+        server = asyncio.create_task(serve_stand_in(address, secret="s3cret"))
+        await asyncio.sleep(0.1)
+        channel = await _connect(address, "s3cret")
+        try:
+            assert channel.connected
+            assert await channel.send(1, "SESSION_SAVED", "room-1") is True
+        finally:
+            await channel.aclose()
+            server.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_channel_with_wrong_secret_is_refused(tmp_path):
+    """A client with the wrong secret never connects, so events fall back to HTTP."""
+    address = str(tmp_path / "events.sock")
+
+    async def scenario() -> None:
+        server = asyncio.create_task(serve_stand_in(address, secret="s3cret"))
+        await asyncio.sleep(0.1)
+        channel = await _connect(address, "wrong")
+        try:
+            assert not channel.connected
+            assert await channel.send(1, "SESSION_SAVED", "room-1") is None
+        finally:
+            await channel.aclose()
+            server.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_dispatcher_pipelines_a_users_events(tmp_path):
+    """SESSION_SAVED is written behind SAVING_CONVERSATION without waiting for its ack."""
+    address = str(tmp_path / "events.sock")
+
+    async def scenario() -> None:
+        server = asyncio.create_task(serve_stand_in(address, ack_delay=0.3))
+        await asyncio.sleep(0.1)
+        channel = await _connect(address, "")
+        dispatcher = SessionStateDispatcher()
+        dispatcher.use_channel(channel)
+        try:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            saving = dispatcher.dispatch(1, SESSION_STATE_SAVING, API_URL, "room-1")
+            await asyncio.sleep(0.05)
+            saved = dispatcher.dispatch(1, SESSION_STATE_SAVED, API_URL, "room-1")
+            assert await saved is True
+            assert await saving is True
+            # Waiting for each ack in turn would take two 0.3s round trips
+            assert loop.time() - started < 0.5
+            assert dispatcher.stats["pipelined"] == 2
+            assert dispatcher.stats["via_channel"] == 2
+        finally:
+            await channel.aclose()
+            server.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_dispatcher_retries_refused_pipelined_event(tmp_path):
+    """An event Node refuses goes back on its lane and is dropped after max_attempts."""
+    address = str(tmp_path / "events.sock")
+
+    async def scenario() -> None:
+        server = asyncio.create_task(serve_stand_in(address, ok=False))
+        await asyncio.sleep(0.1)
+        channel = await _connect(address, "")
+        dispatcher = SessionStateDispatcher(max_attempts=3, retry_base=0.01, retry_max=0.02)
+        dispatcher.use_channel(channel)
+        try:
+            assert await dispatcher.dispatch(2, SESSION_STATE_SAVING, API_URL, "room-2") is False
+            assert dispatcher.stats["pipelined"] == 3
+            assert dispatcher.stats["retries"] == 2
+            assert dispatcher.stats["dropped_exhausted"] == 1
+            await dispatcher.drain(1.0)
+            assert dispatcher.get_stats()["unacked"] == 0
+        finally:
+            await channel.aclose()
+            server.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+"""
+Tests for the greeting cache.
+"""
+
+import asyncio
+import builtins
+import json
+
+from core.greeting_cache import GreetingCache
+
+
+def _generator(text: str):
+    async def generate() -> str:
+        return text
+    return generate
+
+
+def test_get_does_no_file_io(tmp_path, monkeypatch):
+    """Lookups are served from memory; reading the file happens in load() or a thread."""
+    path = tmp_path / "greetings.json"
+    writer = GreetingCache(str(path), pool_size=1)
+
+    async def fill() -> None:
+        assert writer.get("practice", "Topic: travel", _generator("Hi, let's talk travel!")) is None
+        await asyncio.sleep(0.05)
+
+    asyncio.run(fill())
+    assert path.exists()
+
+    reader = GreetingCache(str(path), pool_size=1)
+    reader.load()
+
+    def no_open(*args, **kwargs):
+        raise AssertionError("get() opened a file")
+
+    async def lookup() -> str:
+        monkeypatch.setattr(builtins, "open", no_open)
+        try:
+            return reader.get("practice", "Topic: travel", _generator("unused"))
+        finally:
+            monkeypatch.undo()
+
+    assert asyncio.run(lookup()) == "Hi, let's talk travel!"
+
+
+def test_persisted_keys_are_capped_by_last_use(tmp_path):
+    """Only the most recently used pools are kept in memory and on disk."""
+    path = tmp_path / "greetings.json"
+    cache = GreetingCache(str(path), pool_size=1, max_keys=3)
+
+    async def fill() -> None:
+        for index in range(5):
+            cache.get("practice", f"Topic {index}", _generator(f"Line {index}"))
+            await asyncio.sleep(0.02)
+        # Topic 0 is used again, so it outlives topics 1 and 2
+        cache.get("practice", "Topic 0", _generator("Line 0"))
+        cache.get("practice", "Topic 5", _generator("Line 5"))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(fill())
+
+    expected = {GreetingCache.fingerprint("practice", f"Topic {index}") for index in (0, 4, 5)}
+    persisted = json.loads(path.read_text())
+    assert set(persisted["pools"]) == expected
+    assert set(persisted["used"]) == expected
+    assert set(cache._pools) == expected
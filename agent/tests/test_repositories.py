@@ -0,0 +1,112 @@
+"""
+Tests for the repositories against a real database (see conftest.py).
+"""
+
+from datetime import date, timedelta
+
+import asyncpg
+
+from database import CourseContext, CourseRepository, QuotaRepository, subscription_cache
+from utils.timezone import get_utc_now, get_utc_today
+
+
+def test_get_active_course_returns_latest_active(db, run):
+    async def scenario():
+        repo = CourseRepository(db)
+        async with db.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO user_courses (user_id, course_start_date, course_end_date, is_active)
+                VALUES (1, '2026-01-01', '2026-04-01', true),
+                       (1, '2026-02-01', '2026-05-01', true),
+                       (1, '2026-03-01', '2026-06-01', false)
+                """
+            )
+            latest = await conn.fetchval("SELECT MAX(id) FROM user_courses WHERE is_active")
+
+        course = await repo.get_active_course(1)
+        assert course == CourseContext(course_id=latest, course_start_date=date(2026, 2, 1))
+        assert await repo.get_active_course(2) is None
+
+    run(scenario())
+
+
+def test_update_speaking_progress_with_course_context(db, run):
+    async def scenario():
+        repo = CourseRepository(db)
+        today = get_utc_today()
+        course = CourseContext(course_id=77, course_start_date=today)
+        async with db.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO daily_progress (
+                    user_id, course_id, week_number, day_number, progress_date,
+                    speaking_duration_seconds, roleplay_duration_seconds
+                )
+                VALUES (3, 77, 1, 1, $1, 200, 150)
+                """,
+                today,
+            )
+
+        assert await repo.update_speaking_progress(3, course)
+
+        async with db.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM daily_progress WHERE user_id = 3")
+        assert row["speaking_completed"] is True
+        assert row["speaking_duration_seconds"] == 350
+        assert (row["week_number"], row["day_number"]) == (1, 1)
+
+    run(scenario())
+
+
+def test_get_snapshots_loads_subscriptions_in_the_usage_query(db, run, monkeypatch):
+    """A subscription cache miss costs no query beyond the snapshot's own."""
+    async def scenario():
+        repo = QuotaRepository(db)
+        subscription_cache.clear()
+        end_date = (get_utc_now() + timedelta(days=30)).replace(tzinfo=None)
+        async with db.acquire() as conn:
+            plan_id = await conn.fetchval(
+                "INSERT INTO subscription_plans (name, plan_type) VALUES ('Pro', 'Pro') RETURNING id"
+            )
+            await conn.execute(
+                """
+                INSERT INTO subscriptions (user_id, plan_id, status, start_date, end_date)
+                VALUES (20, $1, 'active', $2::timestamp - interval '30 days', $2)
+                """,
+                plan_id,
+                end_date,
+            )
+            await conn.execute(
+                """
+                INSERT INTO daily_progress (user_id, course_id, week_number, day_number, progress_date, speaking_duration_seconds)
+                VALUES (20, 1, 1, 1, $1, 120)
+                """,
+                get_utc_today(),
+            )
+
+        queries = []
+        fetch = asyncpg.connection.Connection.fetch
+
+        async def counting_fetch(self, query, *args, **kwargs):
+            queries.append(query)
+            return await fetch(self, query, *args, **kwargs)
+
+        monkeypatch.setattr(asyncpg.connection.Connection, "fetch", counting_fetch)
+
+        # Miss: the subscription comes with the usage, and a user without one is cached as None
+        snapshots = await repo.get_snapshots([20, 21])
+        assert len(queries) == 1
+        assert snapshots[20].plan_type == "Pro"
+        assert snapshots[20].subscription_end_date == end_date
+        assert snapshots[20].practice_used_seconds == 120
+        assert snapshots[21].plan_type is None
+
+        # Hit: the same single query, without the subscription lookup
+        snapshots = await repo.get_snapshots([20, 21])
+        assert len(queries) == 2
+        assert snapshots[20].plan_type == "Pro"
+        assert subscription_cache.get_stats()["hits"] >= 2
+        subscription_cache.clear()
+
+    run(scenario())
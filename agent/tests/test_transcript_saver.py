@@ -0,0 +1,315 @@
+"""
+Tests for TranscriptService against a real database (see conftest.py).
+"""
+
+import asyncio
+from datetime import timedelta
+
+from database import CourseContext, SessionSave
+from services.transcript_saver import TranscriptService
+from utils.timezone import get_utc_now, get_utc_today
+
+TRANSCRIPT = {"items": [{"role": "user", "content": "Hello"}]}
+COURSE_DAYS_AGO = 10
+
+
+async def _add_course(conn, user_id: int) -> int:
+    return await conn.fetchval(
+        """
+        INSERT INTO user_courses (user_id, course_start_date, course_end_date)
+        VALUES ($1, $2::date, $2::date + 90)
+        RETURNING id
+        """,
+        user_id,
+        get_utc_today() - timedelta(days=COURSE_DAYS_AGO),
+    )
+
+
+async def _count(conn, table: str, user_id: int) -> int:
+    return await conn.fetchval(f"SELECT COUNT(*) FROM {table} WHERE user_id = $1", user_id)
+
+
+def test_overlapping_saves_accumulate_daily_progress(db, run):
+    """Two overlapping saves of the same user and day both add their duration."""
+    async def scenario():
+        service = TranscriptService(db)
+        async with db.acquire() as conn:
+            course_id = await _add_course(conn, 3)
+
+        # The first save's upsert is still uncommitted when the second one runs
+        async with db.transaction() as first:
+            assert await service._update_daily_progress_for_practice(
+                first, user_id=3, duration_seconds=200,
+            )
+            second = asyncio.create_task(service.save_session_transcript(
+                user_id=3, room_name="room-practice", session_type="practice",
+                transcript=TRANSCRIPT, duration_seconds=150,
+            ))
+            await asyncio.sleep(0.2)
+            assert not second.done()
+
+        assert await second
+        async with db.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM daily_progress WHERE user_id = 3")
+        assert row["speaking_duration_seconds"] == 350
+        # 350s reaches the 300s practice cap only once both sessions are counted
+        assert row["speaking_completed"] is True
+        assert row["course_id"] == course_id
+        assert (row["week_number"], row["day_number"]) == (2, 4)
+        assert row["progress_date"] == get_utc_today()
+
+    run(scenario())
+
+
+def test_concurrent_saves_lose_no_time(db, run):
+    """Many concurrent practice saves of one user add up exactly."""
+    async def scenario():
+        service = TranscriptService(db)
+        async with db.acquire() as conn:
+            await _add_course(conn, 4)
+
+        results = await asyncio.gather(*(
+            service.save_session_transcript(
+                user_id=4, room_name=f"room-{index}", session_type="practice",
+                transcript=TRANSCRIPT, duration_seconds=30,
+            )
+            for index in range(8)
+        ))
+        assert all(results)
+
+        async with db.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM daily_progress WHERE user_id = 4")
+        assert row["speaking_duration_seconds"] == 240
+        assert row["speaking_completed"] is False
+
+    run(scenario())
+
+
+def test_progress_update_is_one_statement(db, run):
+    """The course lookup, the accumulation and the completed flag cost one statement."""
+    async def scenario():
+        service = TranscriptService(db)
+        async with db.acquire() as conn:
+            await _add_course(conn, 10)
+
+        statements = []
+        async with db.transaction() as conn:
+            conn.add_query_logger(lambda record: statements.append(record.query))
+            for _ in range(2):
+                assert await service._update_daily_progress_for_practice(
+                    conn, user_id=10, duration_seconds=60,
+                )
+            # Query loggers are called soon after each query, not inline
+            await asyncio.sleep(0)
+            # Insert, then accumulate into the existing row (each inside its own savepoint)
+            assert len([query for query in statements if "daily_progress" in query]) == 2
+            assert not any("user_courses" in query and "daily_progress" not in query for query in statements)
+
+    run(scenario())
+
+
+def test_progress_skipped_without_active_course(db, run):
+    """Without an active course no daily_progress row is written, and the save succeeds."""
+    async def scenario():
+        service = TranscriptService(db)
+        assert await service.save_session_transcript(
+            user_id=5, room_name="room-practice", session_type="practice",
+            transcript=TRANSCRIPT, duration_seconds=60,
+        )
+        async with db.acquire() as conn:
+            assert await _count(conn, "conversations", 5) == 1
+            assert await _count(conn, "daily_progress", 5) == 0
+
+    run(scenario())
+
+
+def _session(user_id, room_name, session_type, duration_seconds, **kwargs) -> SessionSave:
+    return SessionSave(
+        user_id=user_id, room_name=room_name, session_type=session_type,
+        transcript=TRANSCRIPT, duration_seconds=duration_seconds, **kwargs
+    )
+
+
+def test_mixed_batch_accumulates_daily_progress(db, run):
+    """A batch of practice, roleplay and call saves writes every table with the right totals."""
+    async def scenario():
+        service = TranscriptService(db)
+        ended_at = get_utc_now()
+        async with db.acquire() as conn:
+            await _add_course(conn, 6)
+            await _add_course(conn, 7)
+
+        saves = [
+            _session(6, "b-practice-1", "practice", 60, ended_at=ended_at),
+            _session(6, "b-roleplay-1", "roleplay", 100, ended_at=ended_at, roleplay_cap=120),
+            _session(6, "b-practice-2", "practice", 90, ended_at=ended_at),
+            _session(6, "b-call-1", "call", 100, ended_at=ended_at,
+                     call_started_at=ended_at - timedelta(seconds=100)),
+            _session(6, "b-roleplay-2", "roleplay", 50, ended_at=ended_at, roleplay_cap=120),
+            _session(7, "b-call-2", "call", 400, ended_at=ended_at),
+        ]
+        async with db.transaction() as conn:
+            assert await service._write_batch(conn, saves) == len(saves)
+        # Replaying the batch writes nothing
+        async with db.transaction() as conn:
+            assert await service._write_batch(conn, saves) == 0
+
+        async with db.acquire() as conn:
+            progress = {
+                row["user_id"]: row
+                for row in await conn.fetch("SELECT * FROM daily_progress ORDER BY user_id")
+            }
+            assert await conn.fetchval("SELECT COUNT(*) FROM conversations") == len(saves)
+            assert await conn.fetchval("SELECT COUNT(*) FROM call_sessions") == 2
+            assert await conn.fetchval("SELECT total_seconds FROM user_call_usage WHERE user_id = 7") == 400
+
+        assert progress[6]["speaking_duration_seconds"] == 60 + 90 + 100
+        assert progress[6]["speaking_completed"] is False
+        assert progress[6]["roleplay_duration_seconds"] == 150
+        assert progress[6]["roleplay_completed"] is True
+        assert (progress[6]["week_number"], progress[6]["day_number"]) == (2, 4)
+        # 400s is past the lifetime call limit, which completes the day's speaking
+        assert progress[7]["speaking_duration_seconds"] == 400
+        assert progress[7]["speaking_completed"] is True
+
+    run(scenario())
+
+
+def test_batch_locks_progress_rows_in_user_order(db, run):
+    """A batch waits for rows in user order, so a writer taking the same order cannot deadlock with it."""
+    async def scenario():
+        service = TranscriptService(db)
+        async with db.acquire() as conn:
+            await _add_course(conn, 11)
+            await _add_course(conn, 12)
+
+        async def write(saves) -> int:
+            async with db.transaction() as conn:
+                return await service._write_batch(conn, saves)
+
+        # Listed in reverse user order: the batch must still lock user 11 first
+        saves = [_session(12, "lock-12", "practice", 60), _session(11, "lock-11", "practice", 60)]
+        async with db.transaction() as other:
+            assert await service._update_daily_progress_for_practice(other, user_id=11, duration_seconds=30)
+            batch = asyncio.create_task(write(saves))
+            await asyncio.sleep(0.2)
+            assert not batch.done()
+            # Would deadlock if the batch had locked user 12 while waiting for user 11
+            assert await service._update_daily_progress_for_practice(other, user_id=12, duration_seconds=30)
+
+        assert await batch == 2
+        async with db.acquire() as conn:
+            totals = await conn.fetch(
+                "SELECT user_id, speaking_duration_seconds FROM daily_progress ORDER BY user_id"
+            )
+        assert [tuple(row) for row in totals] == [(11, 90), (12, 90)]
+
+    run(scenario())
+
+
+def test_course_context_is_used_without_lookup(db, run):
+    """A course resolved at admission is written as is; user_courses is not consulted."""
+    async def scenario():
+        service = TranscriptService(db)
+        ended_at = get_utc_now()
+        async with db.acquire() as conn:
+            # A different active course: it must not be picked up
+            await _add_course(conn, 8)
+        course = CourseContext(course_id=999, course_start_date=get_utc_today() - timedelta(days=15))
+
+        assert await service.save_session_transcript(
+            user_id=8, room_name="room-course", session_type="practice",
+            transcript=TRANSCRIPT, duration_seconds=45,
+            session_info={"course_context": course}, ended_at=ended_at,
+        )
+
+        async with db.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM daily_progress WHERE user_id = 8")
+        assert row["course_id"] == 999
+        assert (row["week_number"], row["day_number"]) == course.week_and_day(ended_at.date())
+        assert row["speaking_duration_seconds"] == 45
+
+    run(scenario())
+
+
+def test_without_course_context_latest_active_course_is_used(db, run):
+    """Without a course context the newest active user_courses row is looked up in SQL."""
+    async def scenario():
+        service = TranscriptService(db)
+        async with db.acquire() as conn:
+            await _add_course(conn, 9)
+            latest = await _add_course(conn, 9)
+            await conn.execute(
+                """
+                INSERT INTO user_courses (user_id, course_start_date, course_end_date, is_active)
+                VALUES (9, $1::date, $1::date + 90, false)
+                """,
+                get_utc_today() - timedelta(days=5),
+            )
+
+        assert await service.save_session_transcript(
+            user_id=9, room_name="room-fallback", session_type="roleplay",
+            transcript=TRANSCRIPT, duration_seconds=45,
+            session_info={"roleplay_cap": 300, "course_context": None},
+        )
+
+        async with db.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM daily_progress WHERE user_id = 9")
+        assert row["course_id"] == latest
+        assert (row["week_number"], row["day_number"]) == (2, 4)
+        assert row["roleplay_duration_seconds"] == 45
+
+    run(scenario())
+
+
+def test_failed_progress_write_keeps_transcript(db, run):
+    """A failing daily_progress write is rolled back alone; the rest of the save commits."""
+    async def scenario():
+        service = TranscriptService(db)
+        async with db.acquire() as conn:
+            await _add_course(conn, 1)
+            # Every daily_progress write now fails inside Postgres
+            await conn.execute(
+                "ALTER TABLE daily_progress ADD CONSTRAINT reject_all CHECK (user_id < 0)"
+            )
+
+        saved_call = await service.save_session_transcript(
+            user_id=1, room_name="room-call", session_type="call",
+            transcript=TRANSCRIPT, duration_seconds=120,
+        )
+        saved_practice = await service.save_session_transcript(
+            user_id=1, room_name="room-practice", session_type="practice",
+            transcript=TRANSCRIPT, duration_seconds=60,
+        )
+        assert saved_call and saved_practice
+
+        async with db.acquire() as conn:
+            assert await _count(conn, "conversations", 1) == 2
+            assert await _count(conn, "call_sessions", 1) == 1
+            assert await conn.fetchval("SELECT total_seconds FROM user_call_usage WHERE user_id = 1") == 120
+            assert await _count(conn, "agent_outbox", 1) == 2
+            assert await _count(conn, "daily_progress", 1) == 0
+
+    run(scenario())
+
+
+def test_failed_call_session_write_keeps_transcript(db, run):
+    """A failing call_sessions write is rolled back alone; the transcript and event commit."""
+    async def scenario():
+        service = TranscriptService(db)
+        async with db.acquire() as conn:
+            await conn.execute("ALTER TABLE call_sessions ADD CONSTRAINT reject_all CHECK (user_id < 0)")
+
+        assert await service.save_session_transcript(
+            user_id=2, room_name="room-call", session_type="call",
+            transcript=TRANSCRIPT, duration_seconds=90,
+        )
+
+        async with db.acquire() as conn:
+            assert await _count(conn, "conversations", 2) == 1
+            assert await _count(conn, "agent_outbox", 2) == 1
+            assert await _count(conn, "call_sessions", 2) == 0
+            # The lifetime counter was in the same statement, so it rolled back too
+            assert await _count(conn, "user_call_usage", 2) == 0
+
+    run(scenario())
@@ -0,0 +1,71 @@
+"""
+Tests for the transcript spool flusher against a real database (see conftest.py).
+"""
+
+import json
+import os
+
+from config import SPOOL_MAX_ATTEMPTS
+from services.transcript_spool import TranscriptSpool, TranscriptSpoolFlusher, build_spool_record
+from utils.timezone import get_utc_now
+
+TRANSCRIPT = {"items": [{"role": "user", "content": "Hello"}]}
+
+
+def _record(user_id: int, room_name: str) -> dict:
+    return build_spool_record(
+        user_id=user_id, room_name=room_name, session_type="practice", transcript=TRANSCRIPT,
+        duration_seconds=60, ended_at=get_utc_now(), session_info={},
+    )
+
+
+def _read_lines(path) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_submitted_record_is_saved(db, run, tmp_path):
+    """A submitted record is on disk before submit returns, and its future resolves once saved."""
+    async def scenario():
+        flusher = TranscriptSpoolFlusher(TranscriptSpool(str(tmp_path)), db)
+        try:
+            spooled = await flusher.submit(_record(20, "spool-saved"))
+            assert flusher.spool.pending_segments() == 1
+            assert await spooled is True
+        finally:
+            await flusher.aclose()
+
+        assert flusher.spool.pending_segments() == 0
+        async with db.acquire() as conn:
+            assert await conn.fetchval("SELECT COUNT(*) FROM conversations WHERE user_id = 20") == 1
+
+    run(scenario())
+
+
+def test_records_past_max_attempts_are_dead_lettered(db, run, tmp_path):
+    """A record failing its last attempt, and a malformed one, move to the dead file; the rest stay pending."""
+    async def scenario():
+        async with db.acquire() as conn:
+            # Every conversations write now fails inside Postgres
+            await conn.execute("ALTER TABLE conversations ADD CONSTRAINT reject_all CHECK (user_id < 0)")
+
+        spool = TranscriptSpool(str(tmp_path))
+        exhausted = {**_record(21, "spool-exhausted"), "attempts": SPOOL_MAX_ATTEMPTS - 1}
+        malformed = {"room_name": "spool-malformed", "user_id": 21}
+        retried = _record(21, "spool-retried")
+        for record in (exhausted, malformed, retried):
+            spool.append(record)
+        segment = spool._active_path
+
+        flusher = TranscriptSpoolFlusher(spool, db)
+        assert await flusher.flush() == 1
+
+        assert [record["room_name"] for record in _read_lines(segment)] == ["spool-retried"]
+        dead = _read_lines(segment[:-len(".jsonl")] + ".dead")
+        assert sorted(record["room_name"] for record in dead) == ["spool-exhausted", "spool-malformed"]
+        assert flusher.stats["dead_lettered"] == 2
+        # The dead file is never claimed again
+        assert spool.pending_segments() == 1
+        assert len(os.listdir(tmp_path)) == 2
+
+    run(scenario())
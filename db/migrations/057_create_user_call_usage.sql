@@ -0,0 +1,23 @@
+-- Migration 057: Materialized per-user lifetime call usage counter
+-- The agent reads lifetime call usage on every admission and call save.
+-- Instead of SUM(call_duration_seconds) over call_sessions, it keeps one row
+-- per user, incremented in the same statement as the call_sessions insert.
+-- Repair/recompute with: npm run db:repair-call-usage
+
+CREATE TABLE IF NOT EXISTS user_call_usage (
+    user_id INTEGER PRIMARY KEY,
+    total_seconds INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Backfill from existing call sessions (idempotent: recomputes totals)
+INSERT INTO user_call_usage (user_id, total_seconds, updated_at)
+SELECT user_id, COALESCE(SUM(call_duration_seconds), 0), (NOW() AT TIME ZONE 'UTC')
+FROM call_sessions
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE SET
+    total_seconds = EXCLUDED.total_seconds,
+    updated_at = EXCLUDED.updated_at;
+
+COMMENT ON TABLE user_call_usage IS 'Lifetime call seconds per user, maintained by the agent alongside call_sessions inserts';
@@ -0,0 +1,15 @@
+-- Migration 058: Compressed cold archive of full conversation transcripts
+-- conversations.transcript keeps the compact turn schema that readers query.
+-- When TRANSCRIPT_ARCHIVE is enabled, the agent also stores the full chat
+-- history compressed (zstd, or zlib if zstandard is not installed) here.
+-- Decode with TranscriptRepository.get_archive / decode_archive.
+
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS transcript_archive BYTEA,
+    ADD COLUMN IF NOT EXISTS transcript_archive_codec VARCHAR(16);
+
+-- Payload is already compressed: store it out of line without TOAST recompression
+ALTER TABLE conversations ALTER COLUMN transcript_archive SET STORAGE EXTERNAL;
+
+COMMENT ON COLUMN conversations.transcript_archive IS 'Compressed full chat history (JSON), see transcript_archive_codec';
+COMMENT ON COLUMN conversations.transcript_archive_codec IS 'Compression codec of transcript_archive: zstd or zlib';
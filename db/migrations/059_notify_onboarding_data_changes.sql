@@ -0,0 +1,25 @@
+-- Migration 059: NOTIFY the voice agent when onboarding_data changes
+-- The agent caches onboarding profiles per process and LISTENs on
+-- 'onboarding_data_changed' (payload: user_id) to evict stale entries.
+
+CREATE OR REPLACE FUNCTION notify_onboarding_data_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('onboarding_data_changed', OLD.user_id::text);
+        RETURN OLD;
+    END IF;
+
+    PERFORM pg_notify('onboarding_data_changed', NEW.user_id::text);
+    IF TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+        PERFORM pg_notify('onboarding_data_changed', OLD.user_id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_onboarding_data_notify ON onboarding_data;
+CREATE TRIGGER trg_onboarding_data_notify
+    AFTER INSERT OR UPDATE OR DELETE ON onboarding_data
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_onboarding_data_changed();
@@ -0,0 +1,43 @@
+-- Migration 060: NOTIFY the voice agent when subscriptions or plans change
+-- The agent caches each user's active subscription (until its end_date) and
+-- the whole subscription_plans table. Every writer (payment callbacks, free
+-- trials, admin changes) goes through these triggers, so the caches and the
+-- running sessions' quota ledgers are invalidated on commit.
+--   subscription_changed        payload: user_id
+--   subscription_plans_changed  payload: plan id
+
+CREATE OR REPLACE FUNCTION notify_subscription_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('subscription_changed', OLD.user_id::text);
+        RETURN OLD;
+    END IF;
+
+    PERFORM pg_notify('subscription_changed', NEW.user_id::text);
+    IF TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+        PERFORM pg_notify('subscription_changed', OLD.user_id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_subscriptions_notify ON subscriptions;
+CREATE TRIGGER trg_subscriptions_notify
+    AFTER INSERT OR UPDATE OR DELETE ON subscriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_subscription_changed();
+
+CREATE OR REPLACE FUNCTION notify_subscription_plans_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('subscription_plans_changed', COALESCE(NEW.id, OLD.id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_subscription_plans_notify ON subscription_plans;
+CREATE TRIGGER trg_subscription_plans_notify
+    AFTER INSERT OR UPDATE OR DELETE ON subscription_plans
+    FOR EACH ROW
+    EXECUTE FUNCTION notify_subscription_plans_changed();
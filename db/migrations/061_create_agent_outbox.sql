@@ -0,0 +1,39 @@
+-- Migration 061: Outbox of session state events written by the voice agent
+-- The agent inserts the SESSION_SAVED event in the same transaction as the
+-- transcript, so a saved session always has its event and a rolled back save
+-- never does. A relay in every agent process claims rows in batches
+-- (FOR UPDATE SKIP LOCKED, with a lease), delivers them to the frontend and
+-- deletes them; rows whose lease expires undelivered are claimed again.
+-- Inserts NOTIFY 'agent_outbox' so relays wake up without polling.
+
+CREATE TABLE IF NOT EXISTS agent_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    call_id VARCHAR(255),
+    state VARCHAR(32) NOT NULL,
+    message TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Relays claim the oldest available rows
+CREATE INDEX IF NOT EXISTS idx_agent_outbox_available ON agent_outbox (available_at, id);
+
+CREATE OR REPLACE FUNCTION notify_agent_outbox()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('agent_outbox', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Once per statement: a batch save wakes the relays once
+DROP TRIGGER IF EXISTS trg_agent_outbox_notify ON agent_outbox;
+CREATE TRIGGER trg_agent_outbox_notify
+    AFTER INSERT ON agent_outbox
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION notify_agent_outbox();
+
+COMMENT ON TABLE agent_outbox IS 'Session state events committed with transcript saves, delivered and deleted by the agent outbox relay';
@@ -0,0 +1,52 @@
+/*
+ Recompute user_call_usage lifetime counters from call_sessions.
+ - Upserts the SUM(call_duration_seconds) for every user with call sessions
+ - Resets counters of users whose call sessions no longer exist
+ - Optionally limited to a single user
+ Usage:
+   node db/repair_user_call_usage.js [userId]
+*/
+
+const { pool } = require('./index');
+
+async function repair() {
+  const userId = process.argv[2] ? parseInt(process.argv[2], 10) : null;
+  const client = await pool.connect();
+  try {
+    console.log(`🔄 Repairing user_call_usage${userId ? ` for user ${userId}` : ''}...`);
+    await client.query('BEGIN');
+
+    const upserted = await client.query(
+      `INSERT INTO user_call_usage (user_id, total_seconds, updated_at)
+       SELECT user_id, COALESCE(SUM(call_duration_seconds), 0), (NOW() AT TIME ZONE 'UTC')
+       FROM call_sessions
+       WHERE $1::int IS NULL OR user_id = $1
+       GROUP BY user_id
+       ON CONFLICT (user_id) DO UPDATE SET
+          total_seconds = EXCLUDED.total_seconds,
+          updated_at = EXCLUDED.updated_at
+       WHERE user_call_usage.total_seconds IS DISTINCT FROM EXCLUDED.total_seconds`,
+      [userId]
+    );
+
+    const reset = await client.query(
+      `UPDATE user_call_usage u
+       SET total_seconds = 0, updated_at = (NOW() AT TIME ZONE 'UTC')
+       WHERE ($1::int IS NULL OR u.user_id = $1)
+         AND u.total_seconds <> 0
+         AND NOT EXISTS (SELECT 1 FROM call_sessions cs WHERE cs.user_id = u.user_id)`,
+      [userId]
+    );
+
+    await client.query('COMMIT');
+    console.log(`✅ Repaired ${upserted.rowCount} counter(s), reset ${reset.rowCount} orphaned counter(s).`);
+  } catch (err) {
+    try { await client.query('ROLLBACK'); } catch {}
+    console.error('❌ Repair error:', err);
+    process.exitCode = 1;
+  } finally {
+    try { client.release(); } catch {}
+  }
+}
+
+repair();
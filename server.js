@@ -7,6 +7,7 @@ const http = require('http');
 const { initSocket } = require('./src/core/socket/socketService');
 const db = require('./db');
 const app = require('./src/app');
+const { startAgentChannel } = require('./src/modules/agent');
 
 // Configuration
 const port = process.env.API_PORT || 8082;
@@ -31,7 +32,9 @@ const validateEnvironmentVariables = () => {
     'ADMIN_SETUP_TOKEN',
     'JWT_EXPIRE',
     'API_PORT',
-    'NODE_ENV'
+    'NODE_ENV',
+    'AGENT_EVENT_SOCKET',
+    'AGENT_EVENT_SECRET'
   ];
 
   const missingRequired = [];
@@ -186,6 +189,9 @@ const startServer = async () => {
       console.log(`   - /api/connection/*`);
       console.log(`   - /api/lifecycle/*\n`);
     });
+
+    // Optional persistent channel for agent session state events
+    startAgentChannel();
   } catch (err) {
     console.error('❌ Server startup failed:', err);
     console.error('Error stack:', err.stack);
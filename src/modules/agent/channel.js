@@ -0,0 +1,232 @@
+/**
+ * Agent Event Channel
+ * Persistent socket the Python agent streams session state events over,
+ * as an alternative to one POST /api/agent/session-state per event.
+ *
+ * Frames are newline-delimited JSON. The agent sends
+ *   {"id": 7, "user_id": 42, "state": "SESSION_SAVED", "call_id": "...", "message": "..."}
+ * and every frame is answered with an ack carrying the same id:
+ *   {"ack": 7, "ok": true}  or  {"ack": 7, "ok": false, "error": "..."}
+ * Events of all sessions share the connection; acks may arrive out of order.
+ * The agent does not wait for an ack before writing a user's next frame, so
+ * each user's frames are handled one after another, in arrival order.
+ *
+ * With AGENT_EVENT_SECRET set, a connection must first authenticate with
+ *   {"auth": "<secret>"}  answered by  {"auth": true}
+ * and is closed otherwise. Without it, TCP is only served on loopback
+ * addresses; a Unix socket is protected by its file permissions.
+ */
+
+const crypto = require('crypto');
+const fs = require('fs');
+const net = require('net');
+const agentService = require('./service');
+
+// Frames are small; anything longer is a protocol error
+const MAX_FRAME_BYTES = 64 * 1024;
+
+const LOOPBACK_HOSTS = ['127.0.0.1', '::1', 'localhost'];
+
+/**
+ * Parse AGENT_EVENT_SOCKET: a Unix socket path, or host:port for TCP
+ * @param {string} address - Channel address
+ * @returns {Object} { path } or { host, port }
+ */
+function parseChannelAddress(address) {
+  if (address.includes('/')) {
+    return { path: address.replace(/^unix:/, '') };
+  }
+  const separator = address.lastIndexOf(':');
+  return {
+    host: separator > 0 ? address.slice(0, separator) : '127.0.0.1',
+    port: parseInt(address.slice(separator + 1), 10),
+  };
+}
+
+/**
+ * Check a connection's hello frame against the shared secret
+ * @param {string} line - First frame of the connection
+ * @param {string} secret - AGENT_EVENT_SECRET
+ * @returns {boolean} True if the frame carries the secret
+ */
+function isAuthorized(line, secret) {
+  let frame;
+  try {
+    frame = JSON.parse(line);
+  } catch (error) {
+    return false;
+  }
+  if (!frame || typeof frame.auth !== 'string') {
+    return false;
+  }
+  const expected = Buffer.from(secret);
+  const given = Buffer.from(frame.auth);
+  return expected.length === given.length && crypto.timingSafeEqual(expected, given);
+}
+
+/**
+ * Parse one event frame
+ * @param {string} line - Frame without the trailing newline
+ * @returns {Object|null} Frame, or null if it cannot be answered
+ */
+function parseFrame(line) {
+  let frame;
+  try {
+    frame = JSON.parse(line);
+  } catch (error) {
+    console.warn('⚠️  Agent channel: ignoring malformed frame');
+    return null;
+  }
+
+  // Without an id the agent cannot match the ack, so it would time out and resend over HTTP
+  if (!frame || !Number.isInteger(frame.id)) {
+    console.warn('⚠️  Agent channel: ignoring frame without an id');
+    return null;
+  }
+  return frame;
+}
+
+/**
+ * Answer one event frame
+ * @param {net.Socket} socket - Agent connection
+ * @param {Object} frame - Parsed frame
+ */
+async function handleFrame(socket, frame) {
+  const ack = { ack: frame.id, ok: false };
+  const validationError = agentService.validateSessionState(frame);
+  if (validationError) {
+    ack.error = validationError;
+  } else {
+    try {
+      ack.ok = await agentService.emitSessionStateToUser({
+        userId: frame.user_id,
+        state: frame.state,
+        callId: frame.call_id,
+        message: frame.message,
+      });
+      if (!ack.ok) {
+        ack.error = 'user not connected';
+      }
+    } catch (error) {
+      ack.error = error.message;
+    }
+  }
+
+  if (!socket.destroyed) {
+    socket.write(`${JSON.stringify(ack)}\n`);
+  }
+}
+
+/**
+ * Serve one agent connection until it closes
+ * @param {net.Socket} socket - Agent connection
+ * @param {string} [secret] - Shared secret the connection must present first
+ */
+function handleConnection(socket, secret) {
+  let buffer = '';
+  let authenticated = !secret;
+  // Per user: the last frame being handled, so the next one waits for it
+  const userChains = new Map();
+  socket.setEncoding('utf8');
+  socket.setNoDelay(true);
+  console.log('✅ Agent event channel connected');
+
+  socket.on('data', (chunk) => {
+    buffer += chunk;
+    let newline;
+    while ((newline = buffer.indexOf('\n')) !== -1) {
+      if (socket.destroyed || socket.writableEnded) {
+        return;
+      }
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      if (!line.trim()) {
+        continue;
+      }
+      if (!authenticated) {
+        if (!isAuthorized(line, secret)) {
+          console.error('❌ Agent channel: connection failed authentication, closing');
+          socket.end(`${JSON.stringify({ auth: false, error: 'unauthorized' })}\n`);
+          return;
+        }
+        authenticated = true;
+        socket.write(`${JSON.stringify({ auth: true })}\n`);
+        continue;
+      }
+      const frame = parseFrame(line);
+      if (!frame) {
+        continue;
+      }
+      const previous = userChains.get(frame.user_id) || Promise.resolve();
+      const current = previous
+        .then(() => handleFrame(socket, frame))
+        .catch((error) => console.error('❌ Agent channel: error handling frame:', error));
+      userChains.set(frame.user_id, current);
+      current.then(() => {
+        if (userChains.get(frame.user_id) === current) {
+          userChains.delete(frame.user_id);
+        }
+      });
+    }
+    if (buffer.length > MAX_FRAME_BYTES) {
+      console.error('❌ Agent channel: frame too large, closing connection');
+      socket.destroy();
+    }
+  });
+
+  socket.on('error', (error) => {
+    console.warn('⚠️  Agent event channel error:', error.message);
+  });
+
+  socket.on('close', () => {
+    console.log('ℹ️  Agent event channel disconnected');
+  });
+}
+
+/**
+ * Start listening for agent connections
+ * @param {string} [address] - Unix socket path or host:port (defaults to AGENT_EVENT_SOCKET)
+ * @param {string} [secret] - Shared secret agents must present (defaults to AGENT_EVENT_SECRET)
+ * @returns {net.Server|null} Server, or null if the channel is not configured (or not allowed)
+ */
+function startAgentChannel(
+  address = process.env.AGENT_EVENT_SOCKET,
+  secret = process.env.AGENT_EVENT_SECRET
+) {
+  if (!address) {
+    return null;
+  }
+
+  const target = parseChannelAddress(address);
+  if (!target.path && !secret && !LOOPBACK_HOSTS.includes(target.host)) {
+    // Anyone reaching the port could push session states to any user
+    console.error(
+      `❌ Agent event channel not started: ${address} is not a loopback address and AGENT_EVENT_SECRET is not set`
+    );
+    return null;
+  }
+  if (target.path) {
+    // A socket file left behind by a previous run would make listen() fail
+    try {
+      fs.unlinkSync(target.path);
+    } catch (error) {
+      if (error.code !== 'ENOENT') {
+        throw error;
+      }
+    }
+  }
+
+  const server = net.createServer((socket) => handleConnection(socket, secret));
+  server.on('error', (error) => {
+    console.error('❌ Agent event channel server error:', error);
+  });
+  server.listen(target.path ? target.path : { host: target.host, port: target.port }, () => {
+    console.log(`✅ Agent event channel listening on ${address}`);
+  });
+  return server;
+}
+
+module.exports = {
+  startAgentChannel,
+  parseChannelAddress,
+};
@@ -15,15 +15,10 @@ const agentController = {
     try {
       const { user_id, state, call_id, message } = req.body;
 
-      // Validate required fields
-      if (!user_id || !state) {
-        return sendError(res, 'user_id and state are required', 400);
-      }
-
-      // Validate state values
-      const validStates = ['SAVING_CONVERSATION', 'SESSION_SAVED', 'SESSION_SAVE_FAILED'];
-      if (!validStates.includes(state)) {
-        return sendError(res, `Invalid state. Must be one of: ${validStates.join(', ')}`, 400);
+      // Validate required fields and state value
+      const validationError = agentService.validateSessionState(req.body);
+      if (validationError) {
+        return sendError(res, validationError, 400);
       }
 
       // Emit Socket.IO event to user's connected socket
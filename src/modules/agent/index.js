@@ -6,9 +6,11 @@
 const router = require('./router');
 const agentController = require('./controller');
 const agentService = require('./service');
+const { startAgentChannel } = require('./channel');
 
 module.exports = {
   router,
   agentController,
   agentService,
+  startAgentChannel,
 };
@@ -5,71 +5,150 @@
 
 const { getIO, getUserSocketMap } = require('../../core/socket/socketService');
 
+const VALID_SESSION_STATES = ['SAVING_CONVERSATION', 'SESSION_SAVED', 'SESSION_SAVE_FAILED'];
+
+// The agent delivers session states at least once (outbox leases, HTTP fallback
+// after a channel timeout), so repeats of a call's state are dropped here
+const EMITTED_STATE_TTL_MS = 10 * 60 * 1000; // 10 minutes
+const MAX_EMITTED_STATES = 10000;
+
+// "userId:callId:state" -> { at, delivery } of the first emit, oldest first
+const emittedStates = new Map();
+
+/**
+ * Remember an emit, dropping entries past the TTL or over the cap
+ * @param {string} key - Dedupe key
+ * @param {Promise<boolean>} delivery - Outcome of the emit
+ */
+function rememberEmittedState(key, delivery) {
+  const now = Date.now();
+  // Re-inserting moves the key to the end, keeping the map ordered by emit time
+  emittedStates.delete(key);
+  emittedStates.set(key, { at: now, delivery });
+  for (const [oldKey, entry] of emittedStates) {
+    if (emittedStates.size <= MAX_EMITTED_STATES && now - entry.at < EMITTED_STATE_TTL_MS) {
+      break;
+    }
+    emittedStates.delete(oldKey);
+  }
+}
+
+/**
+ * Emit a session_state payload to every connected socket of a user
+ * @param {number} userId - User ID
+ * @param {Object} payload - Event payload
+ * @returns {Promise<boolean>} True if emitted, false if the user is not connected
+ */
+async function emitToUserSockets(userId, payload) {
+  const io = getIO();
+
+  if (!io) {
+    console.error('❌ Socket.IO not initialized');
+    return false;
+  }
+
+  try {
+    // Use user socket map for efficient O(1) lookup
+    const userSocketMap = getUserSocketMap();
+    const userSocketIds = userSocketMap.get(userId);
+
+    if (!userSocketIds || userSocketIds.size === 0) {
+      console.warn(`⚠️  No connected sockets found for user ${userId}`);
+      return false;
+    }
+
+    // Get socket instances from socket IDs
+    const userSockets = [];
+    const sockets = await io.fetchSockets();
+
+    for (const socket of sockets) {
+      if (userSocketIds.has(socket.id)) {
+        userSockets.push(socket);
+      }
+    }
+
+    if (userSockets.length === 0) {
+      console.warn(`⚠️  No active socket instances found for user ${userId} (map had ${userSocketIds.size} socket ID(s))`);
+      return false;
+    }
+
+    // Emit to all of user's connected sockets
+    userSockets.forEach(socket => {
+      socket.emit('session_state', payload);
+    });
+
+    console.log(
+      `✅ Emitted session_state event to user ${userId} (${userSockets.length} socket(s)):`,
+      payload
+    );
+
+    return true;
+  } catch (error) {
+    console.error(`❌ Error emitting session state to user ${userId}:`, error);
+    return false;
+  }
+}
+
 const agentService = {
   /**
-   * Emit session state event to a specific user's connected Socket.IO client
+   * Validate a session state event received from the Python agent
+   * (HTTP endpoint and event channel alike)
+   * @param {Object} event - Event as sent by the agent
+   * @param {number} event.user_id - User ID
+   * @param {string} event.state - Session state
+   * @returns {string|null} Error message, or null if the event is valid
+   */
+  validateSessionState({ user_id, state } = {}) {
+    if (!user_id || !state) {
+      return 'user_id and state are required';
+    }
+    if (!VALID_SESSION_STATES.includes(state)) {
+      return `Invalid state. Must be one of: ${VALID_SESSION_STATES.join(', ')}`;
+    }
+    return null;
+  },
+
+  /**
+   * Emit session state event to a specific user's connected Socket.IO client.
+   * A state already emitted for the same user and call within the last
+   * 10 minutes is not emitted again; the repeat gets the first emit's outcome.
+   * Together with the agent's at-least-once delivery, each state of a call
+   * reaches the frontend once (per Node process).
    * @param {Object} params - Event parameters
    * @param {number} params.userId - User ID to send event to
    * @param {string} params.state - Session state (SAVING_CONVERSATION, SESSION_SAVED, SESSION_SAVE_FAILED)
-   * @param {string} [params.callId] - Optional call/room identifier
+   * @param {string} [params.callId] - Optional call/room identifier (events without one are not deduplicated)
    * @param {string} [params.message] - Optional message to display
    * @returns {boolean} True if event was emitted, false if user not connected
    */
   async emitSessionStateToUser({ userId, state, callId, message }) {
-    const io = getIO();
-    
-    if (!io) {
-      console.error('❌ Socket.IO not initialized');
-      return false;
-    }
-
-    try {
-      // Use user socket map for efficient O(1) lookup
-      const userSocketMap = getUserSocketMap();
-      const userSocketIds = userSocketMap.get(userId);
-      
-      if (!userSocketIds || userSocketIds.size === 0) {
-        console.warn(`⚠️  No connected sockets found for user ${userId}`);
-        return false;
-      }
+    // Prepare event payload
+    const payload = {
+      state,
+      message,
+      call_id: callId,
+    };
 
-      // Get socket instances from socket IDs
-      const userSockets = [];
-      const sockets = await io.fetchSockets();
-      
-      for (const socket of sockets) {
-        if (userSocketIds.has(socket.id)) {
-          userSockets.push(socket);
-        }
-      }
+    if (!callId) {
+      return emitToUserSockets(userId, payload);
+    }
 
-      if (userSockets.length === 0) {
-        console.warn(`⚠️  No active socket instances found for user ${userId} (map had ${userSocketIds.size} socket ID(s))`);
-        return false;
-      }
+    const key = `${userId}:${callId}:${state}`;
+    const previous = emittedStates.get(key);
+    if (previous && Date.now() - previous.at < EMITTED_STATE_TTL_MS) {
+      console.log(`ℹ️  Dropping repeated session_state ${state} for user ${userId} (call_id=${callId})`);
+      return previous.delivery;
+    }
 
-      // Prepare event payload
-      const payload = {
-        state,
-        message,
-        call_id: callId,
-      };
-
-      // Emit to all of user's connected sockets
-      userSockets.forEach(socket => {
-        socket.emit('session_state', payload);
-      });
-
-      console.log(
-        `✅ Emitted session_state event to user ${userId} (${userSockets.length} socket(s)):`,
-        payload
-      );
-
-      return true;
-    } catch (error) {
-      console.error(`❌ Error emitting session state to user ${userId}:`, error);
-      return false;
+    // Registered before the emit settles, so a concurrent repeat waits on it
+    const delivery = emitToUserSockets(userId, payload);
+    rememberEmittedState(key, delivery);
+    const delivered = await delivery;
+    if (!delivered && emittedStates.get(key)?.delivery === delivery) {
+      // Not emitted: a later delivery of the same state must get through
+      emittedStates.delete(key);
     }
+    return delivered;
   },
 };
 
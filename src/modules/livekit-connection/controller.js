@@ -20,6 +20,8 @@ const livekitConnectionController = {
    * - firstPrompt (optional): First prompt to send to user
    * - userLevel (optional): User level (default: 'beginner')
    * - ttlMinutes (optional): Token TTL in minutes (default: 60)
+   * - prepareRoom (optional): 'true' if the client joins right away; the room is then
+   *   created before it does, so the agent prepares its greeting meanwhile
    */
   async getConnectionDetails(req, res, next) {
     try {
@@ -10,7 +10,9 @@ const {
   buildSessionMetadata,
   generateRoomName,
   createParticipantToken,
+  createSessionRoom,
   normalizeUrl,
+  isPrepareRoomRequested,
   DEFAULT_TTL_MINUTES,
 } = require('./utils');
 const { ValidationError } = require('../../core/error/errors');
@@ -115,6 +117,28 @@ const livekitConnectionService = {
     // Build metadata
     const metadata = buildSessionMetadata(userId, topic, { sessionType, ...params });
 
+    // Only a client about to join (prepareRoom=true) gets its room created up front, so the
+    // agent can prepare its greeting meanwhile; a token fetched ahead of time must not
+    // dispatch an agent. Not awaited: the token must not wait on a RoomService round trip,
+    // and if the participant gets there first, the agent reads the participant metadata.
+    if (isPrepareRoomRequested(params)) {
+      createSessionRoom(
+        config.LIVEKIT_URL,
+        config.LIVEKIT_API_KEY,
+        config.LIVEKIT_API_SECRET,
+        roomName,
+        metadata
+      ).then(
+        () => console.log(`🏠 [LiveKit Service] Pre-created room ${roomName} for user ${userId}`),
+        (error) => {
+          // Not fatal: the room is created when the participant joins, without the early greeting
+          console.error(
+            `❌ [LiveKit Service] Could not pre-create room ${roomName} for user ${userId}: ${error.message}`
+          );
+        }
+      );
+    }
+
     console.log(`🎫 [LiveKit Service] Generating token for user ${userId} | room: ${roomName} | sessionType: ${sessionType}`);
 
     // Create token
@@ -3,7 +3,7 @@
  * Provides token generation, validation, and metadata building for LiveKit connections
  */
 
-const { AccessToken, VideoGrant } = require('livekit-server-sdk');
+const { AccessToken, VideoGrant, RoomServiceClient } = require('livekit-server-sdk');
 
 // Constants
 const VALID_SESSION_TYPES = ['call', 'practice', 'roleplay'];
@@ -11,6 +11,8 @@ const DEFAULT_SESSION_TYPE = 'call';
 const DEFAULT_USER_LEVEL = 'beginner';
 const DEFAULT_LANGUAGE = 'en';
 const DEFAULT_TTL_MINUTES = 60;
+// A pre-created room nobody joins is closed (and its agent job ended) after this long
+const ROOM_EMPTY_TIMEOUT_SECONDS = 20;
 
 /**
  * Validate required LiveKit environment variables
@@ -159,6 +161,30 @@ async function createParticipantToken(apiKey, apiSecret, identity, roomName, met
   }
 }
 
+/**
+ * Create the session room with the session metadata before the participant joins.
+ * The agent is dispatched when the room is created and reads this metadata at
+ * connect, so it can prepare its greeting while the client is still connecting.
+ * Only for clients about to join: the room (and the agent's speculative work)
+ * lasts ROOM_EMPTY_TIMEOUT_SECONDS if nobody does.
+ * @param {string} livekitUrl - LiveKit WebSocket URL
+ * @param {string} apiKey - LiveKit API Key
+ * @param {string} apiSecret - LiveKit API Secret
+ * @param {string} roomName - Room name
+ * @param {Object} metadata - Session metadata (same as the participant token's)
+ * @returns {Promise<Object>} Created room
+ */
+async function createSessionRoom(livekitUrl, apiKey, apiSecret, roomName, metadata) {
+  // RoomService is HTTP; LIVEKIT_URL is the WebSocket URL
+  const host = normalizeUrl(livekitUrl).replace(/^ws(s?):\/\//, 'http$1://');
+  const roomService = new RoomServiceClient(host, apiKey, apiSecret);
+  return roomService.createRoom({
+    name: roomName,
+    metadata: JSON.stringify(metadata),
+    emptyTimeout: ROOM_EMPTY_TIMEOUT_SECONDS,
+  });
+}
+
 /**
  * Normalize LiveKit URL (remove trailing slashes)
  * @param {string} url - LiveKit URL
@@ -168,6 +194,15 @@ function normalizeUrl(url) {
   return url.replace(/\/+$/, '');
 }
 
+/**
+ * Check whether the client asked for the room to be created ahead of its join
+ * @param {Object} params - Request parameters
+ * @returns {boolean} True if params.prepareRoom is true or 'true'
+ */
+function isPrepareRoomRequested(params) {
+  return params.prepareRoom === true || params.prepareRoom === 'true';
+}
+
 module.exports = {
   validateEnvironment,
   extractUserId,
@@ -176,7 +211,9 @@ module.exports = {
   buildSessionMetadata,
   generateRoomName,
   createParticipantToken,
+  createSessionRoom,
   normalizeUrl,
+  isPrepareRoomRequested,
   VALID_SESSION_TYPES,
   DEFAULT_SESSION_TYPE,
   DEFAULT_USER_LEVEL,